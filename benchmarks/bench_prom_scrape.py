@@ -0,0 +1,77 @@
+"""
+Benchmark a full Prometheus scrape of a large fleet.
+
+Builds a RealtimeState with AGENTS x WORKERS workers, then times
+`PromMetricsExporter.collect()` plus text rendering, and reports peak
+allocations measured with tracemalloc.
+
+Usage:
+    python benchmarks/bench_prom_scrape.py [--agents 1000] [--workers 32] [--rounds 5]
+"""
+
+import argparse
+import statistics
+import time
+import tracemalloc
+
+from prometheus_client import CollectorRegistry, generate_latest
+
+from dashcorn.dashboard.prom_metrics_exporter import PromMetricsExporter
+from dashcorn.dashboard.realtime_metrics import RealtimeState
+
+
+def build_state(agents: int, workers: int) -> RealtimeState:
+    state = RealtimeState(worker_ttl=3600, workers_maxlen=workers, master_ttl=3600)
+    now = time.time()
+    for a in range(agents):
+        state.update("server", {
+            "agent_id": f"agent-{a:04d}",
+            "master": {"pid": 1, "start_time": now - 1000},
+            "workers": {
+                str(1000 + w): {
+                    "pid": 1000 + w,
+                    "cpu": 1.5,
+                    "memory": 50 * 1024 * 1024,
+                    "num_threads": 8,
+                    "start_time": now - 500,
+                }
+                for w in range(workers)
+            },
+        })
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    state = build_state(args.agents, args.workers)
+    exporter = PromMetricsExporter(state_provider=lambda: state)
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(exporter)
+
+    durations = []
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        families = list(exporter.collect())
+        body = generate_latest(registry)
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    list(exporter.collect())
+    generate_latest(registry)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"agents={args.agents} workers={args.workers} series={args.agents * args.workers}")
+    print(f"families={len(families)} payload={len(body) / 1024:.0f} KiB")
+    print(f"scrape median={statistics.median(durations) * 1000:.1f} ms "
+          f"min={min(durations) * 1000:.1f} ms")
+    print(f"peak allocations={peak / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark RefreshOnSetCache expiry on a large cache.
+
+Fills a cache with KEYS entries, marks the oldest EXPIRED of them as past
+their TTL, then times the cleanup triggered by `len()`. Each round refills the
+expired entries, so every measurement expires exactly EXPIRED keys while the
+remaining ones stay live; the cost should follow EXPIRED, not KEYS.
+
+Usage:
+    python benchmarks/bench_refresh_on_set_cache.py [--keys 100000] [--rounds 20]
+"""
+
+import argparse
+import statistics
+import time
+
+from dashcorn.utils.cache import RefreshOnSetCache
+
+
+def measure(keys: int, expired: int, rounds: int) -> float:
+    ttl = 3600.0
+    cache = RefreshOnSetCache(ttl=ttl)
+    for i in range(keys):
+        cache[i] = i
+
+    durations = []
+    for _ in range(rounds):
+        # Age the oldest `expired` entries in place, keeping set-time order
+        stale = time.monotonic() - ttl - 1
+        for key in list(cache._store)[:expired]:
+            cache._store[key] = (cache._store[key][0], stale)
+        start = time.perf_counter()
+        len(cache)
+        durations.append(time.perf_counter() - start)
+        for key in range(expired):
+            cache[("refill", key, len(durations))] = key
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"keys={args.keys}")
+    for expired in (0, 10, 100, 1_000, 10_000):
+        median = measure(args.keys, expired, args.rounds)
+        print(f"expired={expired:>6} cleanup median={median * 1e6:9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark hub ingest throughput with one collector thread versus N shards.
+
+PUSHERS processes send MESSAGES pre-encoded HTTP events each to the hub's
+PULL endpoint. The clock runs from the first send until the collector reports
+every message as received (and, for shards, merged). On a single core the
+shards only add overhead; the gain shows when cores are available to them.
+
+Usage:
+    python benchmarks/bench_sharded_ingest.py [--messages 100000] [--pushers 4] [--shards 1,2,4]
+"""
+
+import argparse
+import multiprocessing
+import socket
+import time
+
+import zmq
+
+from dashcorn.dashboard.metrics_collector import MetricsCollector
+from dashcorn.dashboard.prom_metrics_exporter import PromMetricsExporter
+from dashcorn.dashboard.realtime_metrics import RealtimeState
+from dashcorn.dashboard.sharded_collector import ShardedMetricsCollector
+from dashcorn.utils import json_util
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def push(endpoint: str, messages: int, agent: int, ready, go):
+    frames = [json_util.dumps(dict(type="http", agent_id=f"agent-{agent}", method="GET",
+        path=f"/items/{i % 50}", status=200, duration=0.002 * (i % 10), time=time.time(), pid=i % 8))
+        for i in range(100)]
+    context = zmq.Context()
+    sock = context.socket(zmq.PUSH)
+    sock.connect(endpoint)
+    ready.release()
+    go.wait()
+    for i in range(messages):
+        sock.send(frames[i % 100])
+    sock.close(linger=-1)
+    context.term()
+
+
+def measure(shards: int, messages: int, pushers: int) -> float:
+    port = _free_port()
+    state = RealtimeState()
+    exporter = PromMetricsExporter(state_provider=lambda: state)
+    if shards:
+        collector = ShardedMetricsCollector(address=f"127.0.0.1:{port}", state_store=state,
+            exporter=exporter, shards=shards)
+    else:
+        collector = MetricsCollector(address=f"127.0.0.1:{port}", state_store=state)
+        state.add_http_listener(exporter.observe)
+    collector.start()
+
+    spawn = multiprocessing.get_context("spawn")
+    ready, go = spawn.Semaphore(0), spawn.Event()
+    processes = [spawn.Process(target=push, args=(f"tcp://127.0.0.1:{port}", messages, agent, ready, go))
+        for agent in range(pushers)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+    # Let the shards connect before the clock starts
+    time.sleep(1.0)
+
+    total = messages * pushers
+    start = time.perf_counter()
+    go.set()
+    while collector.stats()["received"] < total:
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+    collector.stop()
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100_000, help="messages per pusher")
+    parser.add_argument("--pushers", type=int, default=4)
+    parser.add_argument("--shards", default="1,2,4")
+    args = parser.parse_args()
+
+    print(f"messages={args.messages * args.pushers} pushers={args.pushers} cpus={multiprocessing.cpu_count()}")
+    for shards in [0] + [int(s) for s in args.shards.split(",")]:
+        rate = measure(shards, args.messages, args.pushers)
+        label = f"shards={shards}" if shards else "thread"
+        print(f"{label:>9} {rate:12,.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import threading
 
 from typing import Optional
 
+from dashcorn.commons import consts
+
 from .config import AgentConfig
 from .worker_sender import MetricsSender
 from .settings_store import SettingsStore
@@ -44,7 +46,7 @@ def _start_dashcorn_agent_in_safe(config: Optional[AgentConfig] = None):
 
     global _worker_reporter
     if _worker_reporter is None:
-        _worker_reporter = WorkerReporter(interval=4.0,
+        _worker_reporter = WorkerReporter(interval=consts.WORKER_REPORT_INTERVAL,
             settings_store=_settings_store,
             metrics_sender=_metrics_sender)
         _worker_reporter.start()
@@ -1,5 +1,8 @@
+import os
 import zmq
+import time
 import logging
+import itertools
 
 from typing import Optional
 
@@ -16,6 +19,11 @@ class MetricsSender:
     JSON metrics to the central dashboard. It uses the ZeroMQ PUSH socket pattern,
     designed to be fire-and-forget with minimal overhead.
 
+    Every payload is stamped with the sender's `seq` (a counter starting at 0),
+    `sent_at` (epoch seconds) and, unless already set, `pid`. The hub uses them
+    to detect messages lost, duplicated or reordered on the way, per
+    (agent_id, pid), and to measure the pipeline latency.
+
     Attributes:
         host (str): The hostname of the dashboard (default "127.0.0.1").
         port (int): The port of the dashboard's ZMQ PULL socket.
@@ -52,6 +60,9 @@ class MetricsSender:
         self._context = context or zmq.Context()
         self._socket = self._context.socket(zmq.PUSH)
         self._logging_enabled = logging_enabled
+        # next() on a count is atomic under the GIL, senders are shared by threads
+        self._seq = itertools.count()
+        self._pid = os.getpid()
 
         try:
             self._socket.connect(self._endpoint)
@@ -65,11 +76,15 @@ class MetricsSender:
         Send a metric payload to the dashboard.
 
         The payload should be a serializable dictionary. This method will attempt
-        to encode it as JSON and send it over the ZMQ PUSH socket.
+        to encode it as JSON and send it over the ZMQ PUSH socket. The sequence
+        fields are added to `data` in place.
 
         Args:
             data (dict): The dictionary containing metric data to send.
         """
+        data["seq"] = next(self._seq)
+        data["sent_at"] = time.time()
+        data.setdefault("pid", self._pid)
         try:
             self._socket.send_json(data)
             if self._logging_enabled:
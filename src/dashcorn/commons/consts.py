@@ -3,3 +3,6 @@ ZMQ_CONNECTION_CONTROL_PORT=5557
 
 ZMQ_CONNECTION_METRICS_HOST="127.0.0.1"
 ZMQ_CONNECTION_METRICS_PORT=5556
+
+# Seconds between two worker status reports of an agent
+WORKER_REPORT_INTERVAL=4.0
@@ -0,0 +1,220 @@
+import time
+import weakref
+import threading
+import logging
+
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from dashcorn.utils.cache import get_timing_wheel
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = "active"
+STALE = "stale"
+GONE = "gone"
+
+# Membership event kinds
+JOINED = "joined"
+RETURNED = "returned"
+BECAME_STALE = "stale"
+BECAME_GONE = "gone"
+REMOVED = "removed"
+
+@dataclass(frozen=True)
+class MembershipEvent:
+    seq: int
+    agent_id: str
+    kind: str
+    time: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(seq=self.seq, agent_id=self.agent_id, kind=self.kind, time=self.time)
+
+
+class AgentRecord:
+    __slots__ = ("agent_id", "first_seen", "last_seen", "state", "gone_at")
+
+    def __init__(self, agent_id: str, now: float):
+        self.agent_id = agent_id
+        self.first_seen = now
+        self.last_seen = now
+        self.state = ACTIVE
+        self.gone_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(agent_id=self.agent_id, state=self.state,
+            first_seen=self.first_seen, last_seen=self.last_seen)
+
+
+MembershipListener = Callable[[MembershipEvent], None]
+
+class AgentRegistry:
+    """
+    Lifecycle of the agents reporting to the hub.
+
+    An agent is `active` while it reports, becomes `stale` after `stale_after`
+    seconds of silence and `gone` after `gone_after`. A gone agent is removed
+    `grace_period` seconds later unless it comes back; listeners use the
+    `removed` event to reclaim its state.
+
+    Records are kept ordered by last report, so `sweep()` stops at the first
+    agent that is still active and costs O(non-active agents). With
+    `sweep_interval`, sweeps run on the shared timing wheel, whose thread also
+    runs the listeners; they must be quick.
+
+    Args:
+        event_log_size: Number of recent membership events kept for `events()`.
+    """
+
+    def __init__(self,
+            stale_after: float = 10.0,
+            gone_after: float = 60.0,
+            grace_period: float = 300.0,
+            sweep_interval: Optional[float] = None,
+            event_log_size: int = 1024):
+        if not 0 < stale_after <= gone_after:
+            raise ValueError("AgentRegistry needs 0 < stale_after <= gone_after")
+        self._stale_after = stale_after
+        self._gone_after = gone_after
+        self._grace_period = grace_period
+        self._records: OrderedDict[str, AgentRecord] = OrderedDict()
+        self._events: Deque[MembershipEvent] = deque(maxlen=event_log_size)
+        self._event_seq = 0
+        self._listeners: List[MembershipListener] = []
+        self._lock = threading.Lock()
+        self._sweep_timer = None
+        if sweep_interval:
+            ref = weakref.ref(self)
+            self._sweep_timer = get_timing_wheel().schedule_repeating(
+                sweep_interval, lambda: _run_scheduled_sweep(ref))
+
+    def add_listener(self, listener: MembershipListener) -> None:
+        self._listeners.append(listener)
+
+    def touch(self, agent_id: str, now: Optional[float] = None) -> AgentRecord:
+        """
+        Record a report from `agent_id`.
+        """
+        now = time.time() if now is None else now
+        events = []
+        with self._lock:
+            record = self._records.get(agent_id)
+            if record is None:
+                record = self._records[agent_id] = AgentRecord(agent_id, now)
+                events.append(self._event(agent_id, JOINED, now))
+            else:
+                self._records.move_to_end(agent_id)
+                if record.state != ACTIVE:
+                    record.state = ACTIVE
+                    record.gone_at = None
+                    events.append(self._event(agent_id, RETURNED, now))
+                record.last_seen = now
+        self._notify(events)
+        return record
+
+    def sweep(self, now: Optional[float] = None) -> List[MembershipEvent]:
+        """
+        Advance silent agents through stale, gone and removed.
+        """
+        now = time.time() if now is None else now
+        events = []
+        with self._lock:
+            removed = []
+            for agent_id, record in self._records.items():
+                idle = now - record.last_seen
+                if idle <= self._stale_after:
+                    break
+                if record.state == ACTIVE:
+                    record.state = STALE
+                    events.append(self._event(agent_id, BECAME_STALE, now))
+                if record.state == STALE and idle > self._gone_after:
+                    record.state = GONE
+                    record.gone_at = now
+                    events.append(self._event(agent_id, BECAME_GONE, now))
+                if record.state == GONE and now - record.gone_at >= self._grace_period:
+                    removed.append(agent_id)
+            for agent_id in removed:
+                del self._records[agent_id]
+                events.append(self._event(agent_id, REMOVED, now))
+        self._notify(events)
+        return events
+
+    def _event(self, agent_id: str, kind: str, now: float) -> MembershipEvent:
+        # Called with _lock held
+        self._event_seq += 1
+        event = MembershipEvent(self._event_seq, agent_id, kind, now)
+        self._events.append(event)
+        return event
+
+    def _notify(self, events: List[MembershipEvent]) -> None:
+        for event in events:
+            logger.debug(f"[{self.__class__.__name__}] agent {event.agent_id} {event.kind}")
+            for listener in self._listeners:
+                try:
+                    listener(event)
+                except Exception as e:
+                    logger.warning(f"[{self.__class__.__name__}] listener {listener} failed: {e}")
+
+    def events(self, since: int = 0) -> Tuple[List[MembershipEvent], int]:
+        """
+        Return logged events with a `seq` greater than `since`, and the next `since`.
+        """
+        with self._lock:
+            events = [event for event in self._events if event.seq > since]
+            return events, self._event_seq
+
+    def live(self) -> List[str]:
+        """
+        Agent ids currently in the active state, least recently seen first.
+
+        Sweeps leave every non-active record in front of the active ones, so
+        this walks the active suffix only.
+        """
+        live = []
+        with self._lock:
+            for agent_id, record in reversed(self._records.items()):
+                if record.state != ACTIVE:
+                    break
+                live.append(agent_id)
+        live.reverse()
+        return live
+
+    def is_live(self, agent_id: str) -> bool:
+        record = self._records.get(agent_id)
+        return record is not None and record.state == ACTIVE
+
+    def get(self, agent_id: str) -> Optional[AgentRecord]:
+        return self._records.get(agent_id)
+
+    def records(self) -> List[AgentRecord]:
+        with self._lock:
+            return list(self._records.values())
+
+    def counts(self) -> Dict[str, int]:
+        counts = {ACTIVE: 0, STALE: 0, GONE: 0}
+        with self._lock:
+            for record in self._records.values():
+                counts[record.state] += 1
+        return counts
+
+    def close(self) -> None:
+        if self._sweep_timer is not None:
+            self._sweep_timer.cancel()
+            self._sweep_timer = None
+
+    def __del__(self):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, agent_id: str) -> bool:
+        return agent_id in self._records
+
+
+def _run_scheduled_sweep(ref: "weakref.ref[AgentRegistry]") -> None:
+    registry = ref()
+    if registry is not None:
+        registry.sweep()
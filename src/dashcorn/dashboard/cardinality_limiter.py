@@ -0,0 +1,150 @@
+import threading
+import logging
+
+from operator import itemgetter
+from typing import Dict, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+OTHER = "__other__"
+
+DEFAULT_LABEL_BUDGETS: Dict[str, int] = {
+    "agent_id": 1000,
+    "method": 32,
+    "path": 500,
+    "status": 64,
+    "pid": 4096,
+}
+
+class LabelBudget:
+    """
+    Admission control for the values of a single label.
+
+    The first `max_values` distinct values are retained; anything beyond that is
+    reported as OTHER. Overflow values are counted in a bounded space-saving
+    table so that `rebalance()` can promote a value that became hot (top-K
+    retention) by evicting the least active retained one.
+    """
+
+    def __init__(self, name: str, max_values: int,
+            candidate_slots: int = 64,
+            hysteresis: float = 2.0):
+        self.name = name
+        self.max_values = max_values
+        self.dropped = 0
+        self._candidate_slots = candidate_slots
+        self._hysteresis = hysteresis
+        self._retained: Dict[str, int] = {}
+        # value -> [count, overestimation inherited from the replaced counter]
+        self._candidates: Dict[str, List[int]] = {}
+
+    def admit(self, value: str, count: int = 1) -> str:
+        """
+        Map `value` to itself or OTHER, for `count` observations of it.
+        """
+        hits = self._retained.get(value)
+        if hits is not None:
+            self._retained[value] = hits + count
+            return value
+        if len(self._retained) < self.max_values:
+            self._retained[value] = count
+            return value
+        if count:
+            self.dropped += count
+            self._count_candidate(value, count)
+        return OTHER
+
+    def _count_candidate(self, value: str, count: int) -> None:
+        candidates = self._candidates
+        counter = candidates.get(value)
+        if counter is not None:
+            counter[0] += count
+        elif len(candidates) < self._candidate_slots:
+            candidates[value] = [count, 0]
+        else:
+            # Space-saving: replace the smallest counter, inheriting its count
+            victim, (smallest, _) = min(candidates.items(), key=lambda kv: kv[1][0])
+            del candidates[victim]
+            candidates[value] = [smallest + count, smallest]
+
+    def rebalance(self) -> List[str]:
+        """
+        Swap hot overflow values in for cold retained ones.
+
+        Returns:
+            Retained values that were evicted (now reported as OTHER).
+        """
+        evicted = []
+        if self._candidates and self._retained:
+            ranked = sorted(self._retained.items(), key=itemgetter(1))
+            # Rank by guaranteed count so space-saving overestimates never promote noise
+            hot = sorted(
+                ((value, count - error) for value, (count, error) in self._candidates.items()),
+                key=itemgetter(1), reverse=True)
+            for (value, count), (victim, victim_hits) in zip(hot, ranked):
+                if count <= victim_hits * self._hysteresis:
+                    break
+                del self._retained[victim]
+                self._retained[value] = count
+                evicted.append(victim)
+        self._candidates.clear()
+        # Decay hit counts so retention follows recent traffic
+        for value in self._retained:
+            self._retained[value] >>= 1
+        return evicted
+
+    def __len__(self) -> int:
+        return len(self._retained)
+
+    def __contains__(self, value: str) -> bool:
+        return value in self._retained
+
+
+class CardinalityLimiter:
+    """
+    Per-label cardinality budgets for metric series.
+
+    Labels without a budget are passed through unchanged.
+    """
+
+    def __init__(self,
+            budgets: Optional[Mapping[str, int]] = None,
+            candidate_slots: int = 64):
+        self._budgets: Dict[str, LabelBudget] = {
+            name: LabelBudget(name, max_values, candidate_slots=candidate_slots)
+            for name, max_values in (DEFAULT_LABEL_BUDGETS if budgets is None else budgets).items()
+        }
+        self._lock = threading.Lock()
+
+    def admit(self, label: str, value: str, count: int = 1) -> str:
+        budget = self._budgets.get(label)
+        if budget is None:
+            return value
+        with self._lock:
+            return budget.admit(value, count)
+
+    def rebalance(self) -> Dict[str, List[str]]:
+        """
+        Rebalance every label budget.
+
+        Returns:
+            Mapping of label name to the values that were evicted from it.
+        """
+        with self._lock:
+            evicted = {name: budget.rebalance() for name, budget in self._budgets.items()}
+        evicted = {name: values for name, values in evicted.items() if values}
+        if evicted:
+            logger.debug(f"[{self.__class__.__name__}] evicted label values: {evicted}")
+        return evicted
+
+    def dropped(self) -> Dict[str, int]:
+        """
+        Number of observations (events) collapsed into OTHER, per label.
+        """
+        return {name: budget.dropped for name, budget in self._budgets.items()}
+
+    def tracked(self) -> Dict[str, int]:
+        """
+        Number of retained distinct values, per label.
+        """
+        return {name: len(budget) for name, budget in self._budgets.items()}
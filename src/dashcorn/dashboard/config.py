@@ -20,6 +20,35 @@ class DashboardConfig:
         os.getenv("DASHCORN_ZMQ_CERT_DIR"))
     leader_rotation_interval: float = field(default_factory=lambda:
         float(os.getenv("DASHCORN_LEADER_ROTATE_INTERVAL", "5.0")))
+    http_events_budget: int = field(default_factory=lambda:
+        int(os.getenv("DASHCORN_HTTP_EVENTS_BUDGET", "10000")))
+    http_event_weights: str = field(default_factory=lambda:
+        os.getenv("DASHCORN_HTTP_EVENT_WEIGHTS", ""))
+    # Must match the agents' report interval; an agent missing this many reports is stale
+    agent_report_interval: float = field(default_factory=lambda:
+        float(os.getenv("DASHCORN_AGENT_REPORT_INTERVAL", str(consts.WORKER_REPORT_INTERVAL))))
+    agent_stale_after_reports: float = field(default_factory=lambda:
+        float(os.getenv("DASHCORN_AGENT_STALE_AFTER_REPORTS", "3")))
+    # Bytes for all hub state, e.g. "64M", on top of the events count cap; empty for the cap only
+    hub_memory_budget: str = field(default_factory=lambda:
+        os.getenv("DASHCORN_HUB_MEMORY_BUDGET", "64M"))
+    # Decoder processes for sharded ingestion, 0 to ingest in a single thread
+    ingest_shards: int = field(default_factory=lambda:
+        int(os.getenv("DASHCORN_INGEST_SHARDS", "0")))
+    # "threads" runs each hub loop on its own thread, "asyncio" runs the collector,
+    # leader election and process manager as coroutines on the web app's loop
+    hub_runtime: str = field(default_factory=lambda:
+        os.getenv("DASHCORN_HUB_RUNTIME", "threads").lower())
+    prom_histogram_buckets: str = field(default_factory=lambda:
+        os.getenv("DASHCORN_PROM_HISTOGRAM_BUCKETS", ""))
+    prom_remote_write_url: Optional[str] = field(default_factory=lambda:
+        os.getenv("DASHCORN_PROM_REMOTE_WRITE_URL"))
+    prom_remote_write_interval: float = field(default_factory=lambda:
+        float(os.getenv("DASHCORN_PROM_REMOTE_WRITE_INTERVAL", "15.0")))
+    otlp_metrics_endpoint: Optional[str] = field(default_factory=lambda:
+        os.getenv("DASHCORN_OTLP_METRICS_ENDPOINT"))
+    otlp_export_interval: float = field(default_factory=lambda:
+        float(os.getenv("DASHCORN_OTLP_EXPORT_INTERVAL", "10.0")))
     enable_logging: bool = field(default_factory=lambda:
         os.getenv("DASHCORN_ENABLE_LOGGING", "false").lower() == "true")
 
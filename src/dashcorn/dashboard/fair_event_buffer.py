@@ -0,0 +1,250 @@
+import heapq
+import math
+
+from bisect import bisect_right
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from dashcorn.utils.cache import DequeView, ExpiringDeque
+from dashcorn.utils.memory_util import approx_size
+
+UNKNOWN_AGENT = "unknown"
+
+Event = dict[str, Any]
+
+def _cursor(event: Event) -> int:
+    return event["cursor"]
+
+def _cost(buffer: ExpiringDeque) -> int:
+    return buffer.cost
+
+
+class AgentEventStats:
+    __slots__ = ("accepted", "evicted")
+
+    def __init__(self):
+        self.accepted = 0
+        self.evicted = 0
+
+
+class FairEventBuffer:
+    """
+    HTTP events split into one expiring sub-buffer per agent, sharing a global
+    `budget` of events.
+
+    When the budget is exceeded, events are evicted from the agent holding the
+    most events relative to its weight, down to the level of the next heaviest
+    one. An agent below its weighted share of the budget therefore never loses
+    events to a noisy neighbour, while an agent alone may use the whole budget.
+    Evictions happen in batches of `evict_batch` events, so the O(agents) scan
+    for the heaviest agent is amortized over that many appends.
+
+    Events must carry a `cursor` that increases across all agents; readers
+    merge the sub-buffers back into cursor order. The buffer is not
+    thread-safe, callers serialize access.
+
+    Args:
+        budget: Maximum number of events, or of bytes with `sizeof`.
+        weights: Relative share of the budget per agent id, `default_weight`
+            for agents not listed.
+        evict_batch: Budget units evicted at once, defaults to 1/64 of the budget.
+        sizeof: Approximate size of an event in bytes; fair shares are then
+            measured in bytes instead of events.
+        maxlen: Maximum number of events with `sizeof`, on top of the byte
+            budget, shared out by weight in the same way.
+    """
+
+    def __init__(self,
+            ttl: Optional[float] = 60.0,
+            budget: Optional[int] = 10000,
+            weights: Optional[Mapping[str, float]] = None,
+            default_weight: float = 1.0,
+            evict_batch: Optional[int] = None,
+            sizeof: Optional[Callable[[Event], int]] = None,
+            maxlen: Optional[int] = None):
+        if weights and min(weights.values()) <= 0 or default_weight <= 0:
+            raise ValueError("FairEventBuffer weights must be positive")
+        self._ttl = ttl
+        self._budget = budget
+        self._weights = dict(weights or {})
+        self._default_weight = default_weight
+        self._evict_batch = evict_batch
+        self._sizeof = sizeof
+        self._maxlen = maxlen if sizeof is not None else None
+        self._buffers: Dict[str, ExpiringDeque[Event]] = {}
+        self._stats: Dict[str, AgentEventStats] = {}
+        # Upper bound of the buffered cost, expiries are only seen on recount
+        self._size = 0
+        # Same for the number of events, when `maxlen` caps it beside the bytes
+        self._count = 0
+
+    @property
+    def budget(self) -> Optional[int]:
+        return self._budget
+
+    @budget.setter
+    def budget(self, budget: Optional[int]) -> None:
+        """
+        Change the budget; a smaller one is enforced on the next append.
+        """
+        self._budget = budget
+
+    def weight(self, agent_id: str) -> float:
+        return self._weights.get(agent_id, self._default_weight)
+
+    def append(self, event: Event) -> None:
+        agent_id = event.get("agent_id") or UNKNOWN_AGENT
+        buffer = self._buffers.get(agent_id)
+        if buffer is None:
+            buffer = self._buffers[agent_id] = ExpiringDeque(ttl=self._ttl, sizeof=self._sizeof)
+            self._stats.setdefault(agent_id, AgentEventStats())
+        buffer.append(event)
+        self._stats[agent_id].accepted += 1
+        self._size += 1 if self._sizeof is None else self._sizeof(event)
+        budget = self._budget
+        if budget is not None and self._size > budget:
+            self._size = self.cost
+            if self._size > budget:
+                batch = self._evict_batch or max(1, budget // 64)
+                self._evict(self._size - budget + batch - 1)
+        maxlen = self._maxlen
+        if maxlen is not None:
+            self._count += 1
+            if self._count > maxlen:
+                self._count = len(self)
+                if self._count > maxlen:
+                    batch = self._evict_batch or max(1, maxlen // 64)
+                    self._evict(self._count - maxlen + batch - 1, by_count=True)
+
+    def _evict(self, amount: int, by_count: bool = False) -> None:
+        """
+        Evict `amount` budget units, or events with `by_count`.
+        """
+        by_count = by_count or self._sizeof is None
+        measure = len if by_count else _cost
+        while amount > 0:
+            heaviest = heapq.nlargest(2, (
+                (measure(buffer) / self.weight(agent_id), agent_id)
+                for agent_id, buffer in self._buffers.items()
+            ))
+            if not heaviest or heaviest[0][0] == 0:
+                return
+            agent_id = heaviest[0][1]
+            buffer = self._buffers[agent_id]
+            floor = heaviest[1][0] * self.weight(agent_id) if len(heaviest) > 1 else 0
+            cost, measured = buffer.cost, measure(buffer)
+            excess = measured - math.ceil(floor)
+            if excess < 1:
+                # Tied with the next agent, spread the batch over the agents
+                excess = max(1, amount // len(self._buffers))
+            excess = min(amount, excess)
+            if by_count:
+                dropped = buffer.discard_oldest(excess)
+            else:
+                # Drop events until their bytes cover the excess
+                dropped = 0
+                for event in buffer.snapshot():
+                    excess -= self._sizeof(event)
+                    dropped += 1
+                    if excess <= 0:
+                        break
+                buffer.discard_oldest(dropped)
+            self._stats[agent_id].evicted += dropped
+            self._size -= cost - buffer.cost
+            if self._maxlen is not None:
+                self._count -= dropped
+            amount -= measured - measure(buffer)
+
+    def remove(self, agent_id: str) -> None:
+        """
+        Forget an agent, its buffered events and its counters.
+        """
+        buffer = self._buffers.pop(agent_id, None)
+        if buffer is not None:
+            self._size -= buffer.cost
+            self._count -= len(buffer)
+        self._stats.pop(agent_id, None)
+
+    def clear(self) -> None:
+        for buffer in self._buffers.values():
+            buffer.clear()
+        self._size = 0
+        self._count = 0
+
+    def views(self) -> List[DequeView[Event]]:
+        """
+        Views of the live events of every agent, each in cursor order.
+        """
+        return [buffer.snapshot() for buffer in self._buffers.values()]
+
+    @property
+    def cost(self) -> int:
+        """
+        Buffered events, or their bytes with `sizeof`.
+        """
+        return sum(buffer.cost for buffer in self._buffers.values())
+
+    def nbytes_by_agent(self) -> Dict[str, int]:
+        """
+        Approximate bytes of the buffered events of each agent.
+
+        Without `sizeof` the events are measured on the spot, in O(events).
+        """
+        if self._sizeof is not None:
+            return {agent_id: buffer.cost for agent_id, buffer in self._buffers.items()}
+        return {
+            agent_id: sum(map(approx_size, buffer.snapshot()))
+            for agent_id, buffer in self._buffers.items()
+        }
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Accepted, evicted and currently buffered events per agent.
+        """
+        return {
+            agent_id: dict(accepted=stats.accepted, evicted=stats.evicted,
+                buffered=len(self._buffers[agent_id]) if agent_id in self._buffers else 0)
+            for agent_id, stats in self._stats.items()
+        }
+
+    def __len__(self) -> int:
+        return sum(len(buffer) for buffer in self._buffers.values())
+
+
+def merge_views(views: Iterable[DequeView[Event]]) -> List[Event]:
+    """
+    All events of `views` in cursor order.
+    """
+    return list(heapq.merge(*views, key=_cursor))
+
+def page_views(views: Iterable[DequeView[Event]], since: int = 0,
+        limit: Optional[int] = None) -> Tuple[List[Event], int]:
+    """
+    Events of `views` whose cursor is greater than `since`, oldest first.
+
+    Each view is bisected to its first new event, so the cost is
+    O(agents * log n + limit * log agents) whatever the size of the buffers.
+    """
+    tails = []
+    for view in views:
+        start = bisect_right(view, since, key=_cursor)
+        if start < len(view):
+            tails.append(view.iter_from(start))
+    events = list(islice(heapq.merge(*tails, key=_cursor), limit))
+    next_since = events[-1]["cursor"] if events else since
+    return events, next_since
+
+def parse_weights(spec: Optional[str]) -> Dict[str, float]:
+    """
+    Parse `agent-a=4,agent-b=0.5` into a weight per agent id.
+    """
+    weights = {}
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        agent_id, sep, value = item.rpartition("=")
+        if not sep or not agent_id.strip():
+            raise ValueError(f"invalid agent weight {item!r}, expected <agent_id>=<weight>")
+        weights[agent_id.strip()] = float(value)
+    return weights
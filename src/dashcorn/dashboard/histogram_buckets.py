@@ -0,0 +1,115 @@
+"""
+Histogram bucket layouts for latency metrics.
+
+Classic Prometheus histograms need an explicit, sorted list of upper bounds.
+This module builds such lists (linear, exponential, log-linear and the base-2
+"native" exponential layout shared with OpenTelemetry) and parses them from a
+compact string spec so they can be configured via environment variables.
+"""
+
+import math
+
+from typing import Iterable, Optional, Sequence, Tuple
+
+Buckets = Tuple[float, ...]
+
+DEFAULT_BUCKETS: Buckets = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0,
+)
+
+def linear_buckets(start: float, width: float, count: int) -> Buckets:
+    """
+    `count` bounds starting at `start`, each `width` apart.
+    """
+    if count < 1 or width <= 0:
+        raise ValueError("linear buckets need count >= 1 and width > 0")
+    return tuple(start + i * width for i in range(count))
+
+def exponential_buckets(start: float, factor: float, count: int) -> Buckets:
+    """
+    `count` bounds starting at `start`, each `factor` times the previous one.
+    """
+    if count < 1 or start <= 0 or factor <= 1:
+        raise ValueError("exponential buckets need count >= 1, start > 0 and factor > 1")
+    return tuple(start * factor ** i for i in range(count))
+
+def log_linear_buckets(min_exponent: int, max_exponent: int,
+        steps: Sequence[float] = (1, 2, 5)) -> Buckets:
+    """
+    Bounds `step * 10**e` for each decade `e` in `[min_exponent, max_exponent]`,
+    e.g. (-3, 0) -> 0.001, 0.002, 0.005, 0.01, ..., 1, 2, 5.
+    """
+    if max_exponent < min_exponent:
+        raise ValueError("log-linear buckets need max_exponent >= min_exponent")
+    return tuple(
+        _round(step * 10.0 ** exponent)
+        for exponent in range(min_exponent, max_exponent + 1)
+        for step in steps
+    )
+
+def exponential_bucket_index(value: float, scale: int) -> int:
+    """
+    Index of the base-2 exponential bucket holding `value` (> 0).
+
+    Bucket `i` covers `(base**i, base**(i+1)]` with `base = 2 ** (2 ** -scale)`,
+    which is the layout used by Prometheus native histograms and OpenTelemetry
+    exponential histograms.
+    """
+    log = math.log2(value)
+    scaled = log * (1 << scale) if scale >= 0 else log / (1 << -scale)
+    return math.ceil(scaled) - 1
+
+def native_exponential_buckets(scale: int, min_value: float, max_value: float) -> Buckets:
+    """
+    Upper bounds of the base-2 exponential buckets at `scale` spanning
+    `[min_value, max_value]`.
+    """
+    if min_value <= 0 or max_value <= min_value:
+        raise ValueError("native buckets need 0 < min_value < max_value")
+    base = 2 ** (2.0 ** -scale)
+    lo = exponential_bucket_index(min_value, scale)
+    hi = exponential_bucket_index(max_value, scale)
+    return tuple(_round(base ** (i + 1)) for i in range(lo, hi + 1))
+
+def parse_buckets(spec: Optional[str]) -> Buckets:
+    """
+    Parse a bucket spec.
+
+    Supported forms:
+        ""                                  -> DEFAULT_BUCKETS
+        "0.01,0.1,1"                        -> explicit bounds
+        "linear:start,width,count"
+        "exp:start,factor,count"
+        "loglinear:min_exponent,max_exponent[,step...]"
+        "native:scale,min_value,max_value"
+    """
+    if not spec or not spec.strip():
+        return DEFAULT_BUCKETS
+    kind, _, args = spec.strip().partition(":")
+    if not args:
+        return normalize_buckets(float(v) for v in kind.split(","))
+
+    values = [v.strip() for v in args.split(",") if v.strip()]
+    kind = kind.strip().lower()
+    if kind == "linear":
+        return linear_buckets(float(values[0]), float(values[1]), int(values[2]))
+    if kind == "exp":
+        return exponential_buckets(float(values[0]), float(values[1]), int(values[2]))
+    if kind == "loglinear":
+        steps = tuple(float(v) for v in values[2:]) or (1, 2, 5)
+        return log_linear_buckets(int(values[0]), int(values[1]), steps)
+    if kind == "native":
+        return native_exponential_buckets(int(values[0]), float(values[1]), float(values[2]))
+    raise ValueError(f"Unknown bucket layout: {kind!r}")
+
+def normalize_buckets(bounds: Iterable[float]) -> Buckets:
+    """
+    Sort and de-duplicate bounds, dropping a trailing +Inf (it is implicit).
+    """
+    result = tuple(sorted(set(float(b) for b in bounds if not math.isinf(b))))
+    if not result:
+        raise ValueError("At least one finite bucket bound is required")
+    return result
+
+def _round(value: float) -> float:
+    return float(f"{value:.12g}")
@@ -0,0 +1,182 @@
+from collections.abc import Mapping
+from sys import getsizeof
+from typing import Any, Dict, Iterator, Optional
+
+class InternTable:
+    """
+    Bounded table of canonical strings.
+
+    Equal strings decoded from different messages are separate objects; passing
+    them through `intern()` makes every event share one copy. Unlike
+    `sys.intern`, the table stops admitting new strings once it holds
+    `maxsize` of them, so a high-cardinality field cannot grow it without
+    bound; those values are simply kept as they are. Paths, the field most
+    likely to be high-cardinality (raw URLs), go through `intern_path()` and
+    a table of their own, so they cannot crowd out agent ids and methods.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self._maxsize = maxsize
+        self._strings: Dict[str, str] = {}
+        self._paths: Dict[str, str] = {}
+
+    def intern(self, value: Any) -> Any:
+        return self._intern(self._strings, value)
+
+    def intern_path(self, value: Any) -> Any:
+        return self._intern(self._paths, value)
+
+    def _intern(self, strings: Dict[str, str], value: Any) -> Any:
+        if type(value) is not str:
+            return value
+        canonical = strings.get(value)
+        if canonical is not None:
+            return canonical
+        if len(strings) < self._maxsize:
+            strings[value] = value
+        return value
+
+    def is_shared(self, value: Any) -> bool:
+        """
+        Whether `value` is the canonical copy held by the table.
+        """
+        return self._strings.get(value) is value or self._paths.get(value) is value
+
+    def __contains__(self, value: str) -> bool:
+        return value in self._strings or value in self._paths
+
+    def __len__(self) -> int:
+        return len(self._strings) + len(self._paths)
+
+
+# Fields decoded into slots; anything else goes to `extras`
+_FIELDS = ("type", "agent_id", "method", "path", "status", "duration", "time",
+    "pid", "parent_pid", "request_id", "seq", "sent_at", "cursor")
+_FIELD_SET = frozenset(_FIELDS)
+# Low-cardinality fields shared through the intern table
+INTERNED_FIELDS = ("type", "agent_id", "method", "path")
+
+class HttpEvent(Mapping):
+    """
+    HTTP event decoded into slots instead of a per-event dict.
+
+    A record costs a fraction of the equivalent dict, and its `type`,
+    `agent_id`, `method` and `path` strings are shared through an InternTable.
+    It is a read-only Mapping over the fields that were present in the message
+    (a field set to None counts as absent), so consumers written against event
+    dicts keep using `get()`, `[]`, `dict(event)` and JSON encoding. Item
+    assignment is supported for the hub to stamp fields such as `cursor`.
+    Unknown fields are kept in a small `extras` dict.
+    """
+
+    __slots__ = _FIELDS + ("extras", "strings")
+
+    def __init__(self, **fields: Any):
+        for name in _FIELDS:
+            setattr(self, name, fields.pop(name, None))
+        self.extras: Optional[Dict[str, Any]] = fields or None
+        self.strings: Optional[InternTable] = None
+
+    @classmethod
+    def from_message(cls, msg: Mapping, strings: Optional[InternTable] = None) -> "HttpEvent":
+        """
+        Build a record from a decoded message, interning its low-cardinality strings.
+        """
+        event = cls.__new__(cls)
+        get = msg.get
+        if strings is not None:
+            intern = strings.intern
+            event.type = intern(get("type"))
+            event.agent_id = intern(get("agent_id"))
+            event.method = intern(get("method"))
+            event.path = strings.intern_path(get("path"))
+        else:
+            event.type = get("type")
+            event.agent_id = get("agent_id")
+            event.method = get("method")
+            event.path = get("path")
+        event.status = get("status")
+        event.duration = get("duration")
+        event.time = get("time")
+        event.pid = get("pid")
+        event.parent_pid = get("parent_pid")
+        event.request_id = get("request_id")
+        event.seq = get("seq")
+        event.sent_at = get("sent_at")
+        event.cursor = get("cursor")
+        extras = None
+        if not _FIELD_SET.issuperset(msg):
+            extras = {key: value for key, value in msg.items() if key not in _FIELD_SET}
+        event.extras = extras
+        event.strings = strings
+        return event
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _FIELD_SET:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif self.extras is not None and key in self.extras:
+            return self.extras[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _FIELD_SET:
+            value = getattr(self, key)
+            return default if value is None else value
+        if self.extras is not None:
+            return self.extras.get(key, default)
+        return default
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in _FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self.extras is None:
+                self.extras = {}
+            self.extras[key] = value
+
+    def __contains__(self, key: object) -> bool:
+        if key in _FIELD_SET:
+            return getattr(self, key) is not None
+        return self.extras is not None and key in self.extras
+
+    def __iter__(self) -> Iterator[str]:
+        for name in _FIELDS:
+            if getattr(self, name) is not None:
+                yield name
+        if self.extras:
+            yield from self.extras
+
+    def __len__(self) -> int:
+        count = sum(1 for name in _FIELDS if getattr(self, name) is not None)
+        return count + (len(self.extras) if self.extras else 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self}
+
+    def __sizeof__(self) -> int:
+        # Strings still held by the intern table are shared with other records,
+        # count what is owned (values past the table's bound are)
+        size = object.__sizeof__(self)
+        strings = self.strings
+        for name in _FIELDS:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            if name in INTERNED_FIELDS and strings is not None and strings.is_shared(value):
+                continue
+            size += getsizeof(value)
+        if self.extras is not None:
+            size += getsizeof(self.extras) + sum(map(getsizeof, self.extras.values()))
+        return size
+
+    def __getstate__(self):
+        # The intern table stays behind, records unpickled elsewhere own their strings
+        state = {name: getattr(self, name) for name in _FIELDS}
+        state["extras"] = self.extras
+        state["strings"] = None
+        return None, state
+
+    def __repr__(self) -> str:
+        return f"HttpEvent({self.to_dict()!r})"
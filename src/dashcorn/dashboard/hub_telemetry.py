@@ -0,0 +1,193 @@
+import time
+
+from bisect import bisect_left
+from collections import Counter
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence
+
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+from prometheus_client.utils import floatToGoString
+
+from .histogram_buckets import log_linear_buckets
+from .sequence_tracker import SequenceTracker
+
+# 1us .. 500ms, decoding and updating one message
+INGEST_LATENCY_BUCKETS = log_linear_buckets(-6, -1)
+# 100us .. 50s, one leader election round including publishing
+ELECTION_BUCKETS = log_linear_buckets(-4, 1)
+# 100us .. 50s, from the agent's send to the hub's decode
+PIPELINE_LATENCY_BUCKETS = log_linear_buckets(-4, 1)
+
+class LatencyHistogram:
+    """
+    Plain bucket counts for a single writer, cheaper than a prometheus_client
+    Histogram on the per-message path (no lock, no child lookup).
+    """
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def cumulative_buckets(self) -> List[int]:
+        return list(accumulate(list(self.counts)))
+
+
+class HubTelemetry:
+    """
+    Self-metrics of the hub, exported as `dashcorn_hub_*` series.
+
+    The ingest path (MetricsCollector), leader election (SettingsSelector) and
+    the exporter report into this object, which is registered on the hub's
+    Prometheus registry next to the request metrics:
+
+        - messages ingested per kind and per agent, and rejected per reason;
+        - decode and state-update latency per message;
+        - ingest queue depth: the largest run of frames found already queued on
+          the PULL socket over the last `depth_window` seconds (ZMQ does not
+          expose the queue length itself, the run length is the backlog);
+        - leader election round duration;
+        - loss, duplication and reordering of sequenced messages (see
+          SequenceTracker), and their latency from `sent_at` to decoding;
+        - series held by the exporter, when given one.
+
+    Recording is done without locks: every recorder has a single writer
+    thread, and `collect()` copies what it reads.
+    """
+
+    def __init__(self, prefix: str = "dashcorn_hub",
+            exporter=None,
+            depth_window: float = 10.0,
+            sequences: Optional[SequenceTracker] = None):
+        self._prefix = prefix
+        self._exporter = exporter
+        self._messages: Counter = Counter()
+        self._agent_messages: Counter = Counter()
+        self._rejects: Counter = Counter()
+        self._decode = LatencyHistogram(INGEST_LATENCY_BUCKETS)
+        self._update = LatencyHistogram(INGEST_LATENCY_BUCKETS)
+        self._election = LatencyHistogram(ELECTION_BUCKETS)
+        self._elections_failed = 0
+        self._sequences = sequences or SequenceTracker()
+        self._pipeline_latency = LatencyHistogram(PIPELINE_LATENCY_BUCKETS)
+        self._depth_window = depth_window
+        self._depth_window_start = time.monotonic()
+        self._depth_max = 0
+        self._depth_previous_max = 0
+
+    def record_message(self, kind: str, agent_id: Optional[str],
+            decode_seconds: float, update_seconds: float) -> None:
+        self._messages[kind] += 1
+        self._agent_messages[agent_id or "unknown"] += 1
+        self._decode.observe(decode_seconds)
+        self._update.observe(update_seconds)
+
+    def record_sequence(self, agent_id: str, pid: object, seq: int,
+            sent_at: Optional[float] = None) -> None:
+        self._sequences.observe(agent_id, pid, seq)
+        if sent_at is not None:
+            # Wall clocks: across hosts this includes their offset, which may be negative
+            self._pipeline_latency.observe(max(0.0, time.time() - sent_at))
+
+    @property
+    def sequences(self) -> SequenceTracker:
+        return self._sequences
+
+    def record_messages(self, kind: str, count: int) -> None:
+        """
+        Count messages handled elsewhere (ingest shards) without latencies.
+        """
+        self._messages[kind] += count
+
+    def record_reject(self, reason: str, count: int = 1) -> None:
+        self._rejects[reason] += count
+
+    def record_queue_depth(self, frames: int) -> None:
+        now = time.monotonic()
+        if now - self._depth_window_start >= self._depth_window:
+            stale = now - self._depth_window_start >= 2 * self._depth_window
+            self._depth_previous_max = 0 if stale else self._depth_max
+            self._depth_max = 0
+            self._depth_window_start = now
+        if frames > self._depth_max:
+            self._depth_max = frames
+
+    def queue_depth(self) -> int:
+        if time.monotonic() - self._depth_window_start >= 2 * self._depth_window:
+            return 0
+        return max(self._depth_max, self._depth_previous_max)
+
+    def observe_election(self, seconds: float, failed: bool = False) -> None:
+        self._election.observe(seconds)
+        if failed:
+            self._elections_failed += 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "messages": dict(self._messages),
+            "agent_messages": dict(self._agent_messages),
+            "rejected": dict(self._rejects),
+            "queue_depth": self.queue_depth(),
+            "elections": sum(self._election.counts),
+            "elections_failed": self._elections_failed,
+        }
+
+    def collect(self):
+        prefix = self._prefix
+
+        messages = CounterMetricFamily(f"{prefix}_ingest_messages",
+            "Metrics messages ingested by the hub, by message kind", labels=["kind"])
+        for kind, value in list(self._messages.items()):
+            messages.add_metric([kind], value)
+        yield messages
+
+        agent_messages = CounterMetricFamily(f"{prefix}_agent_messages",
+            "HTTP and worker status messages ingested per agent", labels=["agent_id"])
+        for agent_id, value in list(self._agent_messages.items()):
+            agent_messages.add_metric([agent_id], value)
+        yield agent_messages
+
+        rejects = CounterMetricFamily(f"{prefix}_ingest_rejected",
+            "Messages dropped by the hub, by reason (schema rejects and processing errors)",
+            labels=["reason"])
+        for reason, value in list(self._rejects.items()):
+            rejects.add_metric([reason], value)
+        yield rejects
+
+        yield self._histogram(f"{prefix}_decode_duration_seconds",
+            "Time spent decoding and validating one message", self._decode)
+        yield self._histogram(f"{prefix}_update_duration_seconds",
+            "Time spent applying one message to the hub state, listeners included", self._update)
+        yield GaugeMetricFamily(f"{prefix}_ingest_queue_depth",
+            "Largest run of frames found queued on the ingest socket in the last window",
+            value=self.queue_depth())
+
+        yield self._histogram(f"{prefix}_election_duration_seconds",
+            "Duration of a leader election round, publishing included", self._election)
+        yield CounterMetricFamily(f"{prefix}_elections_failed",
+            "Leader election rounds that raised", value=self._elections_failed)
+
+        yield from self._sequences.collect(prefix)
+        yield self._histogram(f"{prefix}_pipeline_latency_seconds",
+            "Time from an agent sending a message to the hub decoding it", self._pipeline_latency)
+
+        if self._exporter is not None:
+            series = GaugeMetricFamily(f"{prefix}_exporter_series",
+                "Series held by the request metrics exporter", labels=["family"])
+            for family, value in self._exporter.series_counts().items():
+                series.add_metric([family], value)
+            yield series
+
+    @staticmethod
+    def _histogram(name: str, documentation: str, histogram: LatencyHistogram) -> HistogramMetricFamily:
+        bounds = [floatToGoString(b) for b in histogram.bounds] + ["+Inf"]
+        family = HistogramMetricFamily(name, documentation)
+        family.add_metric([], buckets=list(zip(bounds, histogram.cumulative_buckets())),
+            sum_value=histogram.sum)
+        return family
@@ -0,0 +1,249 @@
+import asyncio
+import time
+import logging
+
+from typing import Any, Dict, Optional, Set
+
+from dashcorn.dashboard.metrics_rollup import SeriesRollup
+from dashcorn.dashboard.realtime_metrics import RealtimeState
+
+logger = logging.getLogger(__name__)
+
+Frame = Dict[str, Any]
+
+class StreamSubscriber:
+    """
+    A bounded per-client frame queue.
+
+    When the client falls behind and its queue is full, the incoming frame is
+    merged into the newest queued one instead of growing the queue
+    (downsampling), so the client still receives deltas in order.
+    A client that stays saturated for `max_lagging_ticks` consecutive ticks is
+    marked closed so the transport can disconnect it.
+    """
+
+    def __init__(self,
+            agent_id: Optional[str] = None,
+            path: Optional[str] = None,
+            maxsize: int = 8,
+            max_lagging_ticks: int = 30):
+        self.agent_id = agent_id
+        self.path = path
+        self.queue: asyncio.Queue[Frame] = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+        self.downsampled = 0
+        self._lagging_ticks = 0
+        self._max_lagging_ticks = max_lagging_ticks
+
+    @property
+    def filter_key(self) -> tuple:
+        return (self.agent_id, self.path)
+
+    def offer(self, frame: Frame) -> None:
+        if self.closed:
+            return
+        if not self.queue.full():
+            self._lagging_ticks = 0
+            self.queue.put_nowait(frame)
+            return
+
+        self._lagging_ticks += 1
+        if self._lagging_ticks > self._max_lagging_ticks:
+            self.close()
+            return
+
+        # Fold this frame into the newest pending one to keep the queue bounded,
+        # re-queueing the others unchanged so frames stay in order
+        pending = [self.queue.get_nowait() for _ in range(self.queue.qsize())]
+        pending[-1] = merge_frames(pending[-1], frame)
+        for queued in pending:
+            self.queue.put_nowait(queued)
+        self.downsampled += 1
+
+    def close(self) -> None:
+        self.closed = True
+        # Wake up the consumer so it notices the subscriber has been dropped
+        try:
+            self.queue.put_nowait({"type": "close"})
+        except asyncio.QueueFull:
+            self.queue.get_nowait()
+            self.queue.put_nowait({"type": "close"})
+
+
+class MetricsBroadcaster:
+    """
+    Single producer that pushes per-tick delta frames to stream subscribers.
+
+    Each tick the broadcaster computes one frame containing rollup buckets
+    completed since the previous tick and worker states that changed. The frame
+    is filtered once per distinct subscriber filter and offered to every
+    subscriber without blocking.
+    """
+
+    def __init__(self,
+            state_store: RealtimeState,
+            interval: float = 1.0,
+            queue_size: int = 8,
+            max_lagging_ticks: int = 30):
+        self._state_store = state_store
+        self._interval = interval
+        self._queue_size = queue_size
+        self._max_lagging_ticks = max_lagging_ticks
+        self._subscribers: Set[StreamSubscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._last_bucket_end: Optional[float] = None
+        self._last_servers: Dict[str, Any] = {}
+
+    def subscribe(self, agent_id: Optional[str] = None, path: Optional[str] = None) -> StreamSubscriber:
+        """
+        Register a subscriber, starting the producer on the running loop if needed.
+        """
+        subscriber = StreamSubscriber(agent_id=agent_id, path=path,
+            maxsize=self._queue_size,
+            max_lagging_ticks=self._max_lagging_ticks)
+        self._subscribers.add(subscriber)
+        self.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: StreamSubscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.debug(f"[{self.__class__.__name__}] started.")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for subscriber in list(self._subscribers):
+            subscriber.close()
+        self._subscribers.clear()
+        logger.debug(f"[{self.__class__.__name__}] stopped.")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                self.broadcast(self.build_frame())
+            except Exception as e:
+                logger.warning(f"[{self.__class__.__name__}] Failed to broadcast frame: {e}")
+
+    def broadcast(self, frame: Frame) -> None:
+        filtered: Dict[tuple, Frame] = {}
+        for subscriber in list(self._subscribers):
+            if subscriber.closed:
+                self._subscribers.discard(subscriber)
+                continue
+            key = subscriber.filter_key
+            if key not in filtered:
+                filtered[key] = filter_frame(frame, *key)
+            subscriber.offer(filtered[key])
+
+    def build_frame(self, now: Optional[float] = None) -> Frame:
+        """
+        Compute the delta since the previous call.
+        """
+        now = time.time() if now is None else now
+        rollups = self._state_store.rollups
+        resolution = rollups.resolution
+
+        # Only emit buckets that can no longer receive in-order events
+        bucket_end = now - now % resolution
+        bucket_start = self._last_bucket_end if self._last_bucket_end is not None else bucket_end - resolution
+        self._last_bucket_end = bucket_end
+
+        buckets = []
+        for bucket in rollups.buckets_between(bucket_start, bucket_end):
+            buckets.append({
+                "start": bucket.start,
+                "series": [
+                    _series_to_dict(key, rollup)
+                    for key, rollup in list(bucket.series.items())
+                ],
+            })
+
+        # Snapshots are replaced on change, so identity tells what changed
+        servers = self._state_store.get_all_servers()
+        if servers is self._last_servers:
+            changed, removed = {}, []
+        else:
+            changed = {
+                agent_id: state for agent_id, state in servers.items()
+                if self._last_servers.get(agent_id) is not state
+            }
+            removed = [agent_id for agent_id in self._last_servers if agent_id not in servers]
+        self._last_servers = servers
+
+        return {
+            "type": "delta",
+            "time": now,
+            "buckets": buckets,
+            "servers": changed,
+            "removed_agents": removed,
+        }
+
+
+def filter_frame(frame: Frame, agent_id: Optional[str], path: Optional[str]) -> Frame:
+    if agent_id is None and path is None:
+        return frame
+    buckets = []
+    for bucket in frame["buckets"]:
+        series = [
+            s for s in bucket["series"]
+            if (agent_id is None or s["agent_id"] == agent_id)
+            and (path is None or s["path"] == path)
+        ]
+        if series:
+            buckets.append({"start": bucket["start"], "series": series})
+    return {
+        **frame,
+        "buckets": buckets,
+        "servers": {
+            k: v for k, v in frame["servers"].items()
+            if agent_id is None or k == agent_id
+        },
+        "removed_agents": [
+            k for k in frame["removed_agents"]
+            if agent_id is None or k == agent_id
+        ],
+    }
+
+
+def merge_frames(older: Frame, newer: Frame) -> Frame:
+    """
+    Combine two consecutive delta frames into one equivalent frame.
+    """
+    if older.get("type") != "delta":
+        return newer
+    removed = [k for k in older["removed_agents"] if k not in newer["servers"]]
+    servers = {k: v for k, v in older["servers"].items() if k not in newer["removed_agents"]}
+    servers.update(newer["servers"])
+    return {
+        "type": "delta",
+        "time": newer["time"],
+        "buckets": older["buckets"] + newer["buckets"],
+        "servers": servers,
+        "removed_agents": removed + newer["removed_agents"],
+    }
+
+
+def _series_to_dict(key: tuple, rollup: SeriesRollup) -> Dict[str, Any]:
+    agent_id, method, path, status = key
+    return {
+        "agent_id": agent_id,
+        "method": method,
+        "path": path,
+        "status": status,
+        "count": rollup.count,
+        "errors": rollup.errors,
+        "duration_sum": rollup.duration_sum,
+        "p50": rollup.percentile(0.5),
+        "p99": rollup.percentile(0.99),
+    }
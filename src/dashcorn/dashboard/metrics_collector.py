@@ -1,11 +1,18 @@
 import zmq
+import zmq.asyncio
+import asyncio
 import threading
 import logging
 import time
 
-from typing import Optional
+from collections import Counter
+from time import perf_counter
+from typing import Any, Dict, Optional
 
 from dashcorn.commons import consts
+from dashcorn.dashboard.http_event import InternTable
+from dashcorn.dashboard.hub_telemetry import HubTelemetry
+from dashcorn.dashboard.metrics_schema import MessageRejected, decode_message, validate_message
 from dashcorn.dashboard.realtime_metrics import RealtimeState
 from dashcorn.utils.zmq_util import Protocol, renew_zmq_ipc_socket
 
@@ -15,13 +22,29 @@ class MetricsCollector:
     """
     Listen for incoming metrics over a ZMQ PULL socket and update in-memory store.
     Designed to run in a background thread.
+
+    Frames are received without copying and decoded from the frame buffer
+    against the schemas of `metrics_schema`. Malformed messages are counted
+    per reason in `stats()` and dropped without pausing the loop. HTTP events
+    are stored as HttpEvent records whose low-cardinality strings are shared
+    through the collector's InternTable.
+
+    `start()` runs the loop on a thread; `serve()` is the same loop as a
+    coroutine for the asyncio hub runtime. With a HubTelemetry, each message's
+    decode and update time and the socket backlog are reported to it.
     """
 
+    poll_timeout_ms = 100
+    # Frames handled before yielding to the event loop in `serve()`
+    serve_batch_size = 256
+
     def __init__(self,
             protocol: Protocol = "tcp",
             address: Optional[str] = f"*:{consts.ZMQ_CONNECTION_METRICS_PORT}",
             endpoint: Optional[str] = None,
-            state_store: Optional[RealtimeState] = None):
+            state_store: Optional[RealtimeState] = None,
+            intern_maxsize: int = 4096,
+            telemetry: Optional[HubTelemetry] = None):
         """
         Initialize the MetricsCollector.
 
@@ -31,6 +54,10 @@ class MetricsCollector:
         self._address = renew_zmq_ipc_socket(address, protocol)
         self._endpoint = endpoint or f"{self._protocol}://{self._address}"
         self._state_store = state_store
+        self._strings = InternTable(maxsize=intern_maxsize)
+        self._received = 0
+        self._rejects: Counter = Counter()
+        self._telemetry = telemetry
         self._context = None
         self._socket = None
         self._thread = None
@@ -57,23 +84,126 @@ class MetricsCollector:
         logger.debug(f"[{self.__class__.__name__}] started.")
 
     def _run_loop(self):
+        backlog = 0
         while not self._stop_event.is_set():
             try:
-                self._handle_message(self._socket.recv_json())
-            except Exception as e:
-                logger.warning(f"[{self.__class__.__name__}] Error while receiving or processing message: {e}")
+                # Poll so that stop() is noticed before the socket is closed
+                if not self._socket.poll(self.poll_timeout_ms):
+                    continue
+                frame = self._socket.recv(copy=False)
+            except zmq.ZMQError as e:
+                if self._stop_event.is_set():
+                    break
+                logger.warning(f"[{self.__class__.__name__}] Error while receiving message: {e}")
                 time.sleep(0.5)
+                continue
+            try:
+                self._handle_frame(frame.buffer)
+            except Exception as e:
+                self._processing_failed(e)
+            if self._telemetry is not None:
+                backlog = self._track_backlog(self._socket, backlog)
+
+    async def serve(self):
+        """
+        Listen on the current event loop until the task is cancelled.
+
+        The socket is driven by the loop's readiness callbacks rather than by
+        polling. Frames already queued are received without suspending, so the
+        loop is yielded every `serve_batch_size` frames to keep other
+        coroutines (HTTP handlers, streams) responsive under load.
+        """
+        context = zmq.asyncio.Context()
+        socket = context.socket(zmq.PULL)
+        try:
+            socket.bind(self._endpoint)
+        except zmq.ZMQError as e:
+            logger.warning(f"[{self.__class__.__name__}] bind error: {e}")
+            socket.close(linger=0)
+            context.term()
+            raise e
+        logger.debug(f"[{self.__class__.__name__}] Listening on {self._endpoint} (asyncio)...")
+        handled = 0
+        backlog = 0
+        try:
+            while True:
+                try:
+                    frame = await socket.recv(copy=False)
+                except zmq.ZMQError as e:
+                    logger.warning(f"[{self.__class__.__name__}] Error while receiving message: {e}")
+                    await asyncio.sleep(0.5)
+                    continue
+                try:
+                    self._handle_frame(frame.buffer)
+                except Exception as e:
+                    self._processing_failed(e)
+                if self._telemetry is not None:
+                    backlog = self._track_backlog(socket, backlog)
+                handled += 1
+                if handled % self.serve_batch_size == 0:
+                    await asyncio.sleep(0)
+        finally:
+            socket.close(linger=0)
+            context.term()
+            logger.debug(f"[{self.__class__.__name__}] stopped (asyncio).")
+
+    def _handle_frame(self, buffer: Any) -> None:
+        self._received += 1
+        start = perf_counter()
+        try:
+            kind, data = decode_message(buffer, self._strings)
+        except MessageRejected as e:
+            self._reject(e)
+            return
+        decoded = perf_counter()
+        if self._state_store:
+            self._state_store.update(kind, data)
+        telemetry = self._telemetry
+        if telemetry is not None:
+            agent_id = data.get("agent_id")
+            telemetry.record_message(kind, agent_id, decoded - start, perf_counter() - decoded)
+            seq = data.get("seq")
+            if seq is not None:
+                telemetry.record_sequence(agent_id, data.get("pid"), seq, data.get("sent_at"))
+
+    def _track_backlog(self, socket: zmq.Socket, backlog: int) -> int:
+        # Frames handled while more were already queued are the socket's backlog
+        backlog += 1
+        if socket.get(zmq.EVENTS) & zmq.POLLIN:
+            return backlog
+        self._telemetry.record_queue_depth(backlog)
+        return 0
 
     def _handle_message(self, msg: dict):
-        msg_type = msg.get("type")
-        if msg_type == "worker_status":
-            if self._state_store:
-                self._state_store.update("server", msg)
-        elif msg_type == "http":
-            if self._state_store:
-                self._state_store.update("http", msg)
-        else:
-            logger.warning(f"[{self.__class__.__name__}] Unknown message type: {msg_type}")
+        self._received += 1
+        try:
+            kind, data = validate_message(msg, self._strings)
+        except MessageRejected as e:
+            self._reject(e)
+            return
+        if self._state_store:
+            self._state_store.update(kind, data)
+
+    def _reject(self, e: MessageRejected) -> None:
+        self._rejects[e.reason] += 1
+        if self._telemetry is not None:
+            self._telemetry.record_reject(e.reason)
+        logger.debug(f"[{self.__class__.__name__}] Rejected message: {e}")
+
+    def _processing_failed(self, e: Exception) -> None:
+        self._rejects["error"] += 1
+        if self._telemetry is not None:
+            self._telemetry.record_reject("error")
+        logger.warning(f"[{self.__class__.__name__}] Error while processing message: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Messages received and rejected (per reason) since the collector was created.
+        """
+        return {
+            "received": self._received,
+            "rejected": dict(self._rejects),
+        }
 
     def stop(self):
         """Stop the listener."""
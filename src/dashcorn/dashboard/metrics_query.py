@@ -0,0 +1,155 @@
+import time
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from dashcorn.dashboard.metrics_rollup import RollupStore, SeriesKey, SeriesRollup
+
+GROUP_BY_FIELDS = ("agent_id", "method", "path", "status", "status_class")
+AGGREGATIONS = ("count", "rate", "error_ratio", "avg", "p50", "p90", "p99")
+
+_KEY_INDEX = {"agent_id": 0, "method": 1, "path": 2, "status": 3}
+
+@dataclass
+class MetricsQuery:
+    """
+    A time-range query over HTTP event rollups.
+
+    Attributes:
+        start (float): Range start (epoch seconds). Negative values are relative to now.
+        end (Optional[float]): Range end (epoch seconds). Defaults to now.
+        agent_id, method, path: Exact-match filters. A trailing ``*`` on ``path``
+            turns it into a prefix match.
+        status_class (Optional[str]): Filter on status class, e.g. ``"5xx"``.
+        group_by (List[str]): Dimensions to group on (see GROUP_BY_FIELDS).
+        aggs (List[str]): Aggregations to compute (see AGGREGATIONS).
+    """
+    start: float = -60.0
+    end: Optional[float] = None
+    agent_id: Optional[str] = None
+    method: Optional[str] = None
+    path: Optional[str] = None
+    status_class: Optional[str] = None
+    group_by: List[str] = field(default_factory=list)
+    aggs: List[str] = field(default_factory=lambda: ["count", "rate", "error_ratio", "p50", "p90", "p99"])
+
+    def resolve_range(self, now: Optional[float] = None) -> tuple[float, float]:
+        now = time.time() if now is None else now
+        start = now + self.start if self.start < 0 else self.start
+        end = now if self.end is None else (now + self.end if self.end < 0 else self.end)
+        return start, end
+
+    def validate(self) -> None:
+        for dim in self.group_by:
+            if dim not in GROUP_BY_FIELDS:
+                raise ValueError(f"Unsupported group_by field: {dim!r}. Expected one of {GROUP_BY_FIELDS}")
+        for agg in self.aggs:
+            if agg not in AGGREGATIONS:
+                raise ValueError(f"Unsupported aggregation: {agg!r}. Expected one of {AGGREGATIONS}")
+        if self.status_class is not None and _parse_status_class(self.status_class) is None:
+            raise ValueError(f"Invalid status_class: {self.status_class!r}. Expected e.g. '2xx'")
+        start, end = self.resolve_range()
+        if end <= start:
+            raise ValueError(f"Invalid time range: start={start} must be before end={end}")
+
+
+class MetricsQueryEngine:
+    """
+    Evaluate MetricsQuery objects against a RollupStore.
+    """
+
+    def __init__(self, rollup_store: RollupStore):
+        self._rollups = rollup_store
+
+    def execute(self, query: MetricsQuery) -> Dict[str, Any]:
+        query.validate()
+        start, end = query.resolve_range()
+
+        groups = self._rollups.aggregate(start, end,
+            predicate=_make_predicate(query),
+            group_key=_make_group_key(query.group_by),
+        )
+
+        # Only whole buckets are aggregated, so rates use the bucket-aligned span
+        resolution = self._rollups.resolution
+        span = max(resolution, (end - start))
+
+        results = []
+        for group, rollup in sorted(groups.items(), key=lambda kv: -kv[1].count):
+            row = {"key": dict(zip(query.group_by, group))}
+            row.update(_evaluate(rollup, query.aggs, span))
+            results.append(row)
+
+        return {
+            "start": start,
+            "end": end,
+            "group_by": list(query.group_by),
+            "aggs": list(query.aggs),
+            "groups": results,
+        }
+
+
+def _make_predicate(query: MetricsQuery):
+    status_range = _parse_status_class(query.status_class) if query.status_class else None
+    path_prefix = query.path[:-1] if query.path and query.path.endswith("*") else None
+
+    if not any((query.agent_id, query.method, query.path, status_range)):
+        return None
+
+    def predicate(key: SeriesKey) -> bool:
+        agent_id, method, path, status = key
+        if query.agent_id is not None and agent_id != query.agent_id:
+            return False
+        if query.method is not None and method != query.method.upper():
+            return False
+        if path_prefix is not None:
+            if not path.startswith(path_prefix):
+                return False
+        elif query.path is not None and path != query.path:
+            return False
+        if status_range is not None and not (status_range[0] <= status < status_range[1]):
+            return False
+        return True
+
+    return predicate
+
+
+def _make_group_key(group_by: List[str]):
+    if not group_by:
+        return None
+    getters = []
+    for dim in group_by:
+        if dim == "status_class":
+            getters.append(lambda key: status_class_of(key[3]))
+        else:
+            index = _KEY_INDEX[dim]
+            getters.append(lambda key, i=index: key[i])
+    return lambda key: tuple(getter(key) for getter in getters)
+
+
+def _evaluate(rollup: SeriesRollup, aggs: List[str], span: float) -> Dict[str, Any]:
+    row = {}
+    for agg in aggs:
+        if agg == "count":
+            row[agg] = rollup.count
+        elif agg == "rate":
+            row[agg] = rollup.count / span
+        elif agg == "error_ratio":
+            row[agg] = rollup.errors / rollup.count if rollup.count else 0.0
+        elif agg == "avg":
+            row[agg] = rollup.duration_sum / rollup.count if rollup.count else None
+        else:
+            row[agg] = rollup.percentile(int(agg[1:]) / 100)
+    return row
+
+
+def status_class_of(status: int) -> str:
+    return f"{status // 100}xx" if status else "unknown"
+
+
+def _parse_status_class(value: str) -> Optional[tuple[int, int]]:
+    value = value.strip().lower()
+    if len(value) == 3 and value[0].isdigit() and value[1:] == "xx":
+        base = int(value[0]) * 100
+        return base, base + 100
+    return None
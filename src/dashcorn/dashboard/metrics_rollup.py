@@ -0,0 +1,340 @@
+import sys
+import time
+import threading
+import logging
+
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .cardinality_limiter import CardinalityLimiter
+from .histogram_buckets import exponential_bucket_index
+
+logger = logging.getLogger(__name__)
+
+SeriesKey = Tuple[str, str, str, int]  # (agent_id, method, path, status)
+
+# Rough CPython costs used for memory accounting: a dict slot with its share of
+# the table, a boxed int, and a series with its key tuple and empty histogram.
+_DICT_ENTRY_BYTES = 64
+_INT_BYTES = sys.getsizeof(1 << 40)
+_HISTOGRAM_ENTRY_BYTES = _DICT_ENTRY_BYTES + 2 * _INT_BYTES
+
+class SeriesRollup:
+    """
+    Aggregate of HTTP events for a single series within a time bucket.
+
+    Durations are kept in a sparse base-2 exponential histogram: bucket ``i``
+    covers ``(base**i, base**(i+1)]`` with ``base = 2 ** (2 ** -scale)``, so the
+    relative error of any percentile estimate is bounded by ``base - 1``.
+    """
+
+    __slots__ = ("scale", "count", "errors", "duration_sum", "zero_count", "buckets")
+
+    def __init__(self, scale: int):
+        self.scale = scale
+        self.count = 0
+        self.errors = 0
+        self.duration_sum = 0.0
+        self.zero_count = 0
+        self.buckets: Dict[int, int] = {}
+
+    def observe(self, duration: float, status: int) -> None:
+        self.count += 1
+        if status >= 500:
+            self.errors += 1
+        if duration > 0:
+            self.duration_sum += duration
+            index = exponential_bucket_index(duration, self.scale)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+        else:
+            self.zero_count += 1
+
+    def merge(self, other: "SeriesRollup") -> None:
+        self.count += other.count
+        self.errors += other.errors
+        self.duration_sum += other.duration_sum
+        self.zero_count += other.zero_count
+        # `other` may be a live rollup still observed by the ingest thread; the
+        # snapshot is taken in one step, without releasing the GIL
+        for index, count in list(other.buckets.items()):
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Estimate the q-th quantile (0 <= q <= 1) of observed durations.
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = self.zero_count
+        if rank <= seen:
+            return 0.0
+        base = 2 ** (2 ** -self.scale)
+        for index in sorted(self.buckets):
+            count = self.buckets[index]
+            if seen + count >= rank:
+                lower = base ** index
+                upper = lower * base
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return base ** (max(self.buckets) + 1)
+
+
+_SERIES_BYTES = (sys.getsizeof(SeriesRollup(0)) + sys.getsizeof({})
+    + sys.getsizeof(("", "", "", 0)) + _DICT_ENTRY_BYTES)
+
+
+class RollupBucket:
+    __slots__ = ("start", "series", "nbytes")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.series: Dict[SeriesKey, SeriesRollup] = {}
+        self.nbytes = sys.getsizeof(self) + sys.getsizeof(self.series)
+
+
+class RollupStore:
+    """
+    Time-bucketed rollups of HTTP events.
+
+    Events are folded into fixed-width buckets (``resolution`` seconds) keyed by
+    ``(agent_id, method, path, status)`` at ingest time. Buckets are kept ordered
+    by start time so that range queries locate their first bucket by bisection
+    and only touch the buckets inside the requested window.
+
+    An optional CardinalityLimiter bounds the distinct agent_id, method and
+    path values kept per bucket; it is rebalanced whenever a new bucket opens.
+
+    The approximate memory held by the buckets is tracked as series and
+    histogram entries are added, and `trim()` drops the oldest buckets to fit
+    a byte budget.
+    """
+
+    def __init__(self,
+            resolution: float = 1.0,
+            retention: float = 900.0,
+            scale: int = 3,
+            limiter: Optional[CardinalityLimiter] = None):
+        self._resolution = resolution
+        self._retention = retention
+        self._scale = scale
+        self._limiter = limiter
+        self._buckets: List[RollupBucket] = []
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def resolution(self) -> float:
+        return self._resolution
+
+    @property
+    def retention(self) -> float:
+        return self._retention
+
+    @property
+    def scale(self) -> int:
+        return self._scale
+
+    def observe(self, event: Any) -> None:
+        """
+        Fold a single HTTP event into its bucket.
+        """
+        now = time.time()
+        event_time = event.get("time") or now
+        if now - event_time > self._retention:
+            return
+
+        agent_id = event.get("agent_id") or "unknown"
+        method = event.get("method") or "unknown"
+        path = event.get("path") or "unknown"
+        if self._limiter is not None:
+            agent_id = self._limiter.admit("agent_id", agent_id)
+            method = self._limiter.admit("method", method)
+            path = self._limiter.admit("path", path)
+        key = (agent_id, method, path, _as_int(event.get("status")))
+        start = event_time - event_time % self._resolution
+
+        with self._lock:
+            bucket = self._get_bucket(start)
+            rollup = bucket.series.get(key)
+            if rollup is None:
+                rollup = bucket.series[key] = SeriesRollup(self._scale)
+                bucket.nbytes += _SERIES_BYTES
+                self._nbytes += _SERIES_BYTES
+            entries = len(rollup.buckets)
+            rollup.observe(event.get("duration") or 0.0, key[3])
+            if len(rollup.buckets) != entries:
+                bucket.nbytes += _HISTOGRAM_ENTRY_BYTES
+                self._nbytes += _HISTOGRAM_ENTRY_BYTES
+            self._expire_old(now)
+
+    def merge(self, start: float, key: SeriesKey, rollup: SeriesRollup) -> None:
+        """
+        Fold a partial rollup computed elsewhere, e.g. by an ingest shard, into
+        the bucket starting at `start`.
+        """
+        now = time.time()
+        if now - start > self._retention:
+            return
+        if self._limiter is not None:
+            agent_id, method, path, status = key
+            key = (self._limiter.admit("agent_id", agent_id),
+                self._limiter.admit("method", method),
+                self._limiter.admit("path", path),
+                status)
+        with self._lock:
+            bucket = self._get_bucket(start)
+            current = bucket.series.get(key)
+            if current is None:
+                current = bucket.series[key] = SeriesRollup(self._scale)
+                bucket.nbytes += _SERIES_BYTES
+                self._nbytes += _SERIES_BYTES
+            entries = len(current.buckets)
+            current.merge(rollup)
+            added = (len(current.buckets) - entries) * _HISTOGRAM_ENTRY_BYTES
+            bucket.nbytes += added
+            self._nbytes += added
+            self._expire_old(now)
+
+    def drain(self) -> List[RollupBucket]:
+        """
+        Remove and return every bucket, leaving the store empty.
+        """
+        with self._lock:
+            buckets = self._buckets
+            self._buckets = []
+            self._nbytes = 0
+            return buckets
+
+    def _get_bucket(self, start: float) -> RollupBucket:
+        buckets = self._buckets
+        if buckets and buckets[-1].start == start:
+            return buckets[-1]
+        if not buckets or buckets[-1].start < start:
+            bucket = RollupBucket(start)
+            buckets.append(bucket)
+            self._nbytes += bucket.nbytes
+            if self._limiter is not None:
+                self._limiter.rebalance()
+            return bucket
+        # Late event: locate (or insert) its bucket in the past
+        pos = bisect_left(buckets, start, key=lambda b: b.start)
+        if pos < len(buckets) and buckets[pos].start == start:
+            return buckets[pos]
+        bucket = RollupBucket(start)
+        buckets.insert(pos, bucket)
+        self._nbytes += bucket.nbytes
+        return bucket
+
+    def _expire_old(self, now: float) -> None:
+        threshold = now - self._retention
+        buckets = self._buckets
+        if buckets and buckets[0].start < threshold:
+            pos = bisect_left(buckets, threshold, key=lambda b: b.start)
+            self._drop_oldest(pos)
+
+    def _drop_oldest(self, count: int) -> None:
+        # Called with _lock held
+        self._nbytes -= sum(bucket.nbytes for bucket in self._buckets[:count])
+        del self._buckets[:count]
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate bytes held by the rollup buckets.
+        """
+        return self._nbytes
+
+    def trim(self, max_bytes: int) -> int:
+        """
+        Drop the oldest buckets until the rollups fit `max_bytes`, always
+        keeping the most recent one.
+
+        Returns:
+            Number of buckets dropped.
+        """
+        with self._lock:
+            dropped = 0
+            nbytes = self._nbytes
+            while dropped < len(self._buckets) - 1 and nbytes > max_bytes:
+                nbytes -= self._buckets[dropped].nbytes
+                dropped += 1
+            if dropped:
+                self._drop_oldest(dropped)
+            return dropped
+
+    def nbytes_by_agent(self) -> Dict[str, int]:
+        """
+        Approximate bytes of the series of each agent, walking every bucket.
+        """
+        usage: Dict[str, int] = {}
+        for bucket in self:
+            for key, rollup in list(bucket.series.items()):
+                usage[key[0]] = (usage.get(key[0], 0) + _SERIES_BYTES
+                    + len(rollup.buckets) * _HISTOGRAM_ENTRY_BYTES)
+        return usage
+
+    def buckets_between(self, start: float, end: float) -> List[RollupBucket]:
+        """
+        Return buckets whose start time falls in ``[start, end)``.
+        """
+        with self._lock:
+            buckets = self._buckets
+            lo = bisect_left(buckets, start - start % self._resolution, key=lambda b: b.start)
+            hi = bisect_left(buckets, end, key=lambda b: b.start)
+            return buckets[lo:hi]
+
+    def aggregate(self,
+            start: float,
+            end: float,
+            predicate: Optional[Callable[[SeriesKey], bool]] = None,
+            group_key: Optional[Callable[[SeriesKey], Any]] = None,
+    ) -> Dict[Any, SeriesRollup]:
+        """
+        Merge all series in ``[start, end)`` matching ``predicate`` into groups.
+
+        Args:
+            predicate: Filter applied to each series key. All series match if None.
+            group_key: Maps a series key to its group. Everything is merged into
+                a single ``()`` group if None.
+        """
+        groups: Dict[Any, SeriesRollup] = {}
+        matched: Dict[SeriesKey, Any] = {}
+        for bucket in self.buckets_between(start, end):
+            for key, rollup in list(bucket.series.items()):
+                group = matched.get(key, _UNSEEN)
+                if group is _UNSEEN:
+                    if predicate is not None and not predicate(key):
+                        group = _SKIPPED
+                    else:
+                        group = group_key(key) if group_key else ()
+                    matched[key] = group
+                if group is _SKIPPED:
+                    continue
+                merged = groups.get(group)
+                if merged is None:
+                    merged = groups[group] = SeriesRollup(self._scale)
+                merged.merge(rollup)
+        return groups
+
+    def __iter__(self) -> Iterator[RollupBucket]:
+        with self._lock:
+            return iter(list(self._buckets))
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._nbytes = 0
+
+
+_UNSEEN = object()
+_SKIPPED = object()
+
+def _as_int(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
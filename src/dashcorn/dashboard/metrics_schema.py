@@ -0,0 +1,105 @@
+"""
+Schemas of the messages agents push to the hub.
+
+Frames are decoded straight from the ZMQ frame buffer (orjson reads the
+memoryview in place when installed) and checked against a flat table of
+field types before anything reaches the state store. A message that does not
+fit raises MessageRejected, whose `reason` is meant to be counted, not logged
+one by one.
+"""
+
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from dashcorn.utils import json_util
+
+from .http_event import HttpEvent, InternTable
+
+# Reject reasons
+INVALID_JSON = "invalid_json"
+NOT_AN_OBJECT = "not_an_object"
+UNKNOWN_TYPE = "unknown_type"
+MISSING_FIELD = "missing_field"
+INVALID_FIELD = "invalid_field"
+
+_STR = frozenset((str,))
+_INT = frozenset((int,))
+_NUMBER = frozenset((int, float))
+_OBJECT = frozenset((dict,))
+
+# name -> (accepted exact types, required); bool is not accepted as a number
+FieldSpec = Dict[str, Tuple[frozenset, bool]]
+
+HTTP_FIELDS: FieldSpec = {
+    "agent_id": (_STR, True),
+    "method": (_STR, True),
+    "path": (_STR, True),
+    "status": (_INT, True),
+    "duration": (_NUMBER, True),
+    "time": (_NUMBER, False),
+    "pid": (_INT, False),
+    "parent_pid": (_INT, False),
+    "request_id": (_STR, False),
+    "seq": (_INT, False),
+    "sent_at": (_NUMBER, False),
+}
+
+WORKER_STATUS_FIELDS: FieldSpec = {
+    "agent_id": (_STR, True),
+    "timestamp": (_NUMBER, False),
+    "master": (_OBJECT, False),
+    "workers": (_OBJECT, False),
+    "pid": (_INT, False),
+    "seq": (_INT, False),
+    "sent_at": (_NUMBER, False),
+}
+
+class MessageRejected(ValueError):
+    def __init__(self, reason: str, detail: str = ""):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+
+
+def check_fields(msg: Mapping[str, Any], fields: FieldSpec) -> None:
+    """
+    Raise MessageRejected unless every field of `fields` has an accepted type.
+    Fields not listed are let through.
+    """
+    for name, (types, required) in fields.items():
+        value = msg.get(name)
+        if value is None:
+            if required:
+                raise MessageRejected(MISSING_FIELD, name)
+        elif type(value) not in types:
+            raise MessageRejected(INVALID_FIELD, name)
+
+def validate_message(msg: Any, strings: Optional[InternTable] = None) -> Tuple[str, Any]:
+    """
+    Check a decoded message and turn it into what the state store takes.
+
+    Returns:
+        ("http", HttpEvent) or ("server", dict).
+    """
+    if type(msg) is not dict:
+        raise MessageRejected(NOT_AN_OBJECT)
+    msg_type = msg.get("type")
+    if msg_type == "http":
+        check_fields(msg, HTTP_FIELDS)
+        return "http", HttpEvent.from_message(msg, strings)
+    if msg_type == "worker_status":
+        check_fields(msg, WORKER_STATUS_FIELDS)
+        workers = msg.get("workers")
+        if workers and any(type(worker) is not dict for worker in workers.values()):
+            raise MessageRejected(INVALID_FIELD, "workers")
+        return "server", msg
+    raise MessageRejected(UNKNOWN_TYPE, str(msg_type)[:64])
+
+def decode_message(frame: Any, strings: Optional[InternTable] = None) -> Tuple[str, Any]:
+    """
+    Decode and validate one frame given as bytes or a buffer such as
+    `zmq.Frame.buffer`.
+    """
+    try:
+        msg = json_util.loads(frame)
+    except ValueError as e:
+        raise MessageRejected(INVALID_JSON, str(e)[:200]) from None
+    return validate_message(msg, strings)
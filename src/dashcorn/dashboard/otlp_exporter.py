@@ -0,0 +1,246 @@
+import gzip
+import time
+import threading
+import logging
+
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from dashcorn.utils import protobuf_wire as pb
+
+from .metrics_rollup import RollupStore, SeriesKey, SeriesRollup
+from .push_sender import PushSender
+
+logger = logging.getLogger(__name__)
+
+OTLP_HEADERS = {
+    "Content-Type": "application/x-protobuf",
+    "User-Agent": "dashcorn-hub",
+}
+
+AGGREGATION_TEMPORALITY_DELTA = 1
+
+DURATION_METRIC = "http.server.request.duration"
+
+# OpenTelemetry SDKs default to at most 160 buckets per exponential histogram
+MAX_EXPONENTIAL_BUCKETS = 160
+
+class OtlpMetricsExporter:
+    """
+    Push request rollups to an OpenTelemetry collector over OTLP/HTTP.
+
+    Every `interval` seconds the rollup buckets completed since the previous
+    export are merged per `(agent_id, method, path, status)` series and sent as
+    delta-temporality exponential histograms. The rollups already use the
+    base-2 exponential layout, so their bucket counts are copied as they are
+    (downscaled only when a series spans more than MAX_EXPONENTIAL_BUCKETS).
+    Data points are split into requests of at most `max_points_per_request`,
+    which bounds batches by size as well as by time.
+
+    Events arriving after the bucket they belong to was exported are not
+    re-sent, as the delta for that window has already been reported.
+
+    Args:
+        rollup_store: Source of the rollups, usually `RealtimeState.rollups`.
+        endpoint: OTLP/HTTP metrics endpoint, e.g. `http://collector:4318/v1/metrics`.
+        resource_attributes: Added to the exported resource, next to `service.name`.
+        compress: Gzip request bodies.
+    """
+
+    def __init__(self, rollup_store: RollupStore, endpoint: str,
+            interval: float = 10.0,
+            max_points_per_request: int = 1000,
+            max_pending_requests: int = 32,
+            max_retries: int = 3,
+            retry_backoff: float = 0.5,
+            timeout: float = 10.0,
+            resource_attributes: Optional[Mapping[str, str]] = None,
+            headers: Optional[Mapping[str, str]] = None,
+            compress: bool = True):
+        self._rollups = rollup_store
+        self._interval = interval
+        self._max_points_per_request = max_points_per_request
+        self._timeout = timeout
+        self._compress = compress
+        self._resource = self._encode_resource({
+            "service.name": "dashcorn-hub",
+            **(resource_attributes or {}),
+        })
+        self._exported_until: Optional[float] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        request_headers = {**OTLP_HEADERS, **(headers or {})}
+        if compress:
+            request_headers["Content-Encoding"] = "gzip"
+        self._sender = PushSender(endpoint, request_headers,
+            max_pending_requests=max_pending_requests,
+            max_retries=max_retries,
+            retry_backoff=retry_backoff,
+            timeout=timeout,
+            stop_event=self._stop_event)
+
+    def stats(self) -> Dict[str, int]:
+        return self._sender.stats()
+
+    def _run_loop(self):
+        logger.debug(f"[{self.__class__.__name__}] loop is running...")
+        while not self._stop_event.wait(self._interval):
+            try:
+                self.export_once()
+            except Exception as e:
+                logger.warning(f"[{self.__class__.__name__}] export failed: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            logger.debug(f"[{self.__class__.__name__}] is already running.")
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+        logger.debug(f"[{self.__class__.__name__}] started, exporting to {self._sender.url}.")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self._timeout + 2)
+        with self._lock:
+            self._sender.close()
+        logger.debug(f"[{self.__class__.__name__}] stopped.")
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def export_once(self, now: Optional[float] = None) -> int:
+        """
+        Export the rollup buckets completed since the previous call.
+
+        Returns:
+            Number of requests successfully sent.
+        """
+        now = time.time() if now is None else now
+        resolution = self._rollups.resolution
+        # Only buckets whose window has fully elapsed are final
+        end = now - now % resolution
+        with self._lock:
+            start = self._exported_until
+            if start is None:
+                start = end - self._rollups.retention
+            if end > start:
+                groups = self._rollups.aggregate(start, end, group_key=lambda key: key)
+                self._exported_until = end
+                for payload, points in self._encode(groups, start, end):
+                    self._sender.enqueue(payload, points)
+            return self._sender.flush()
+
+    def _encode(self, groups: Dict[SeriesKey, SeriesRollup],
+            start: float, end: float) -> List[Tuple[bytes, int]]:
+        start_ns = int(start * 1e9)
+        end_ns = int(end * 1e9)
+        payloads = []
+        points = bytearray()
+        point_count = 0
+        for key, rollup in groups.items():
+            pb.write_bytes(points, 1, self._encode_point(key, rollup, start_ns, end_ns))
+            point_count += 1
+            if point_count == self._max_points_per_request:
+                payloads.append((self._encode_request(points), point_count))
+                points = bytearray()
+                point_count = 0
+        if point_count:
+            payloads.append((self._encode_request(points), point_count))
+        return payloads
+
+    def _encode_request(self, data_points: bytearray) -> bytes:
+        histogram = data_points
+        pb.write_varint(histogram, 2, AGGREGATION_TEMPORALITY_DELTA)
+
+        metric = bytearray()
+        pb.write_string(metric, 1, DURATION_METRIC)
+        pb.write_string(metric, 2, "Duration of HTTP server requests.")
+        pb.write_string(metric, 3, "s")
+        pb.write_bytes(metric, 10, histogram)
+
+        scope = bytearray()
+        pb.write_string(scope, 1, "dashcorn")
+
+        scope_metrics = bytearray()
+        pb.write_bytes(scope_metrics, 1, scope)
+        pb.write_bytes(scope_metrics, 2, metric)
+
+        resource_metrics = bytearray()
+        pb.write_bytes(resource_metrics, 1, self._resource)
+        pb.write_bytes(resource_metrics, 2, scope_metrics)
+
+        request = bytearray()
+        pb.write_bytes(request, 1, resource_metrics)
+        if self._compress:
+            return gzip.compress(request, compresslevel=5)
+        return bytes(request)
+
+    def _encode_point(self, key: SeriesKey, rollup: SeriesRollup,
+            start_ns: int, end_ns: int) -> bytearray:
+        agent_id, method, path, status = key
+        point = bytearray()
+        pb.write_bytes(point, 1, _string_attribute("dashcorn.agent.id", agent_id))
+        pb.write_bytes(point, 1, _string_attribute("http.request.method", method))
+        pb.write_bytes(point, 1, _string_attribute("http.route", path))
+        pb.write_bytes(point, 1, _int_attribute("http.response.status_code", status))
+        pb.write_fixed64(point, 2, start_ns)
+        pb.write_fixed64(point, 3, end_ns)
+        pb.write_fixed64(point, 4, rollup.count)
+        pb.write_double(point, 5, rollup.duration_sum)
+
+        scale, offset, counts = exponential_bucket_counts(rollup.buckets, rollup.scale)
+        pb.write_sint(point, 6, scale)
+        pb.write_fixed64(point, 7, rollup.zero_count)
+        if counts:
+            positive = bytearray()
+            pb.write_sint(positive, 1, offset)
+            pb.write_packed_varints(positive, 2, counts)
+            pb.write_bytes(point, 8, positive)
+        return point
+
+    @staticmethod
+    def _encode_resource(attributes: Mapping[str, str]) -> bytes:
+        resource = bytearray()
+        for name, value in attributes.items():
+            pb.write_bytes(resource, 1, _string_attribute(name, str(value)))
+        return bytes(resource)
+
+
+def exponential_bucket_counts(buckets: Dict[int, int], scale: int,
+        max_buckets: int = MAX_EXPONENTIAL_BUCKETS) -> Tuple[int, int, List[int]]:
+    """
+    Turn sparse exponential bucket counts into OTLP's `(scale, offset, counts)`.
+
+    Halving the scale merges each pair of adjacent buckets (index `i` becomes
+    `i >> 1`), which is repeated until the populated range fits `max_buckets`.
+    """
+    if not buckets:
+        return scale, 0, []
+    lo, hi = min(buckets), max(buckets)
+    shift = 0
+    while (hi >> shift) - (lo >> shift) + 1 > max_buckets:
+        shift += 1
+    offset = lo >> shift
+    counts = [0] * ((hi >> shift) - offset + 1)
+    for index, count in buckets.items():
+        counts[(index >> shift) - offset] += count
+    return scale - shift, offset, counts
+
+def _string_attribute(key: str, value: str) -> bytearray:
+    any_value = bytearray()
+    pb.write_string(any_value, 1, value)
+    attribute = bytearray()
+    pb.write_string(attribute, 1, key)
+    pb.write_bytes(attribute, 2, any_value)
+    return attribute
+
+def _int_attribute(key: str, value: int) -> bytearray:
+    any_value = bytearray()
+    pb.write_varint(any_value, 3, value)
+    attribute = bytearray()
+    pb.write_string(attribute, 1, key)
+    pb.write_bytes(attribute, 2, any_value)
+    return attribute
@@ -1,4 +1,6 @@
 import zmq
+import zmq.asyncio
+import asyncio
 import threading
 import time
 import logging
@@ -69,6 +71,41 @@ class ProcessManager:
         socket.close()
         ctx.term()
 
+    async def serve(self):
+        """
+        Answer requests on the current event loop until the task is cancelled.
+
+        Commands start and stop processes and may sleep, so they run on the
+        loop's default executor rather than on the loop itself.
+        """
+        ctx = zmq.asyncio.Context()
+        socket = ctx.socket(zmq.REP)
+        socket.bind(self.endpoint)
+        logger.debug(f"ZMQ REP socket bound to {self.endpoint} (asyncio)")
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request = await socket.recv_json()
+                except zmq.ZMQError:
+                    logger.warning("ZMQ error in ProcessManager loop.")
+                    await asyncio.sleep(0.1)
+                    continue
+                except ValueError as ex:
+                    # Malformed request, the REP socket still owes a reply
+                    await socket.send_json({"status": "error", "message": str(ex)})
+                    continue
+                try:
+                    reply = await loop.run_in_executor(None, self.process, request)
+                except Exception as ex:
+                    logger.warning("Unexpected error in ProcessManager loop.")
+                    reply = {"status": "error", "message": str(ex)}
+                await socket.send_json(reply)
+        finally:
+            socket.close(linger=0)
+            ctx.term()
+            logger.debug("ProcessManager stopped (asyncio).")
+
     def process(self, request: dict) -> dict:
         logger.debug(f"Received request: {request}")
         cmd = request.get("cmd")
@@ -0,0 +1,181 @@
+import gzip
+import time
+import threading
+import logging
+
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from prometheus_client.utils import floatToGoString
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE_TEXT = "text/plain; version=0.0.4; charset=utf-8"
+CONTENT_TYPE_OPENMETRICS = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+Format = str  # "text" | "openmetrics"
+
+class Exposition:
+    """
+    A pre-rendered scrape payload. The gzip body is produced once, on first use.
+    """
+
+    __slots__ = ("body", "content_type", "rendered_at", "_gzipped")
+
+    def __init__(self, body: bytes, content_type: str, rendered_at: float):
+        self.body = body
+        self.content_type = content_type
+        self.rendered_at = rendered_at
+        self._gzipped: Optional[bytes] = None
+
+    @property
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=5)
+        return self._gzipped
+
+
+class PromExpositionCache:
+    """
+    Rendered Prometheus exposition of one or more collectors, rebuilt only
+    where the series changed since the previous render.
+
+    A collector exposing `collect_groups()` (see PromMetricsExporter) hands
+    its families over in groups, each with a change marker. A group whose
+    marker is the same as at the previous render is neither collected nor
+    formatted again: its cached text is reused. Groups without a marker, and
+    collectors with a plain `collect()` (a registry of process metrics), are
+    collected on every render; only the line of every sample whose value is
+    unchanged is reused then.
+
+    A scrape is answered from the cached bytes while they are younger than
+    `max_age`, so however many scrapers there are, a render happens at most
+    once per `max_age` and format.
+
+    Args:
+        collectors: Objects exposing `collect()` or `collect_groups()`.
+        max_age: Maximum age (seconds) of a cached payload.
+    """
+
+    def __init__(self, *collectors: Any, max_age: float = 1.0):
+        self._collectors = collectors
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._expositions: Dict[Format, Exposition] = {}
+        # (format, group) -> (marker, rendered text, sample lines by key)
+        self._groups: Dict[Tuple[Format, Hashable], Tuple[Any, str, Dict[tuple, Tuple[Any, str]]]] = {}
+
+    def negotiate(self, accept_header: Optional[str]) -> Exposition:
+        """
+        Pick the OpenMetrics variant when the client asks for it, else plain text.
+        """
+        if accept_header and "application/openmetrics-text" in accept_header:
+            return self.render("openmetrics")
+        return self.render("text")
+
+    def render(self, fmt: Format = "text") -> Exposition:
+        with self._lock:
+            cached = self._expositions.get(fmt)
+            now = time.monotonic()
+            if cached is not None and now - cached.rendered_at < self._max_age:
+                return cached
+
+            body = self._render_body(fmt)
+            content_type = CONTENT_TYPE_OPENMETRICS if fmt == "openmetrics" else CONTENT_TYPE_TEXT
+            exposition = Exposition(body, content_type, now)
+            self._expositions[fmt] = exposition
+            return exposition
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._expositions.clear()
+            self._groups.clear()
+
+    def _render_body(self, fmt: Format) -> bytes:
+        output = []
+        seen = set()
+        for index, collector in enumerate(self._collectors):
+            collect_groups = getattr(collector, "collect_groups", None)
+            if collect_groups is None:
+                groups = [(index, None, collector.collect)]
+            else:
+                groups = [((index, key), marker, collect) for key, marker, collect in collect_groups()]
+
+            for key, marker, collect in groups:
+                seen.add(key)
+                cached = self._groups.get((fmt, key))
+                if cached is not None and marker is not None and cached[0] == marker:
+                    output.append(cached[1])
+                    continue
+                text, lines = _render_families(collect(), fmt, cached[2] if cached else {})
+                self._groups[(fmt, key)] = (marker, text, lines)
+                output.append(text)
+
+        # Groups that disappeared are dropped together with their lines
+        for group in [group for group in self._groups if group[0] == fmt and group[1] not in seen]:
+            del self._groups[group]
+        if fmt == "openmetrics":
+            output.append("# EOF\n")
+        return "".join(output).encode("utf-8")
+
+
+def _render_families(families: Iterable, fmt: Format,
+        previous: Dict[tuple, Tuple[Any, str]]) -> Tuple[str, Dict[tuple, Tuple[Any, str]]]:
+    """
+    Format `families`, reusing the lines of `previous` whose sample is unchanged.
+    """
+    openmetrics = fmt == "openmetrics"
+    current: Dict[tuple, Tuple[Any, str]] = {}
+    output = []
+
+    for metric in families:
+        name = metric.name
+        mtype = metric.type
+        if not openmetrics:
+            if mtype == "counter":
+                name = name + "_total"
+            elif mtype == "unknown":
+                mtype = "untyped"
+        output.append(f"# HELP {name} {_escape_help(metric.documentation)}\n")
+        output.append(f"# TYPE {name} {mtype}\n")
+
+        for sample in metric.samples:
+            if not openmetrics and sample.name.endswith("_created"):
+                continue
+            key = (sample.name, tuple(sorted(sample.labels.items())))
+            state = (sample.value, sample.timestamp, getattr(sample, "exemplar", None))
+            hit = previous.get(key)
+            if hit is not None and hit[0] == state:
+                line = hit[1]
+            else:
+                line = _sample_line(sample, key[1], openmetrics)
+            current[key] = (state, line)
+            output.append(line)
+
+    # Series that disappeared are dropped together with the old lines
+    return "".join(output), current
+
+def _sample_line(sample, labels: tuple, openmetrics: bool) -> str:
+    labelstr = ""
+    if labels:
+        labelstr = "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels) + "}"
+    timestamp = ""
+    if sample.timestamp is not None:
+        if openmetrics:
+            timestamp = f" {sample.timestamp}"
+        else:
+            timestamp = f" {int(float(sample.timestamp) * 1000):d}"
+    exemplar = ""
+    if openmetrics and getattr(sample, "exemplar", None):
+        exemplar = _exemplar_string(sample.exemplar)
+    return f"{sample.name}{labelstr} {floatToGoString(sample.value)}{timestamp}{exemplar}\n"
+
+def _exemplar_string(exemplar) -> str:
+    labels = ",".join(f'{k}="{_escape_label(v)}"' for k, v in sorted(exemplar.labels.items()))
+    timestamp = f" {exemplar.timestamp}" if exemplar.timestamp is not None else ""
+    return f" # {{{labels}}} {floatToGoString(exemplar.value)}{timestamp}"
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+def _escape_help(doc: str) -> str:
+    return doc.replace("\\", r"\\").replace("\n", r"\n")
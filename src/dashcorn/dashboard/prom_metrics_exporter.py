@@ -2,16 +2,101 @@ import time
 import threading
 import logging
 
-from typing import Optional
-from collections import defaultdict
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 from prometheus_client.core import (
     GaugeMetricFamily,
     CounterMetricFamily,
     HistogramMetricFamily,
 )
+from prometheus_client.samples import Exemplar
+from prometheus_client.utils import floatToGoString
+
+from .cardinality_limiter import OTHER, CardinalityLimiter
+from .histogram_buckets import DEFAULT_BUCKETS, normalize_buckets
 
 logger = logging.getLogger(__name__)
 
+# Requests finished within this many seconds are reported as in progress
+IN_PROGRESS_WINDOW = 4
+
+# A bucket's exemplar is replaced by any request once it is older than this
+EXEMPLAR_MAX_AGE = 60.0
+
+class RequestSeries:
+    """
+    Preallocated accumulator slot for one (agent_id, method, path) series.
+
+    `buckets` holds non-cumulative per-bucket counts (the last slot is +Inf);
+    `exemplars` holds at most one `(request_id, duration, time)` per bucket;
+    `recent` is a ring of per-second counts used for the in-progress gauge.
+    """
+
+    __slots__ = ("count", "duration_sum", "buckets", "exemplars", "recent", "recent_seconds")
+
+    def __init__(self, num_bounds: int):
+        self.count = 0
+        self.duration_sum = 0.0
+        self.buckets: List[int] = [0] * (num_bounds + 1)
+        self.exemplars: List[Optional[Tuple[str, float, float]]] = [None] * (num_bounds + 1)
+        self.recent: List[int] = [0] * IN_PROGRESS_WINDOW
+        self.recent_seconds: List[int] = [0] * IN_PROGRESS_WINDOW
+
+    def observe(self, duration: float, bucket: int, event_time: float,
+            request_id: Optional[str] = None) -> None:
+        self.count += 1
+        self.duration_sum += duration
+        self.buckets[bucket] += 1
+        if request_id:
+            self._offer_exemplar(bucket, (request_id, duration, event_time))
+        second = int(event_time)
+        slot = second % IN_PROGRESS_WINDOW
+        if self.recent_seconds[slot] != second:
+            self.recent_seconds[slot] = second
+            self.recent[slot] = 0
+        self.recent[slot] += 1
+
+    def _offer_exemplar(self, bucket: int, exemplar: Tuple[str, float, float]) -> None:
+        """
+        Keep the slowest recent request of the bucket as its exemplar.
+        """
+        current = self.exemplars[bucket]
+        if (current is None
+                or exemplar[1] >= current[1]
+                or exemplar[2] - current[2] > EXEMPLAR_MAX_AGE):
+            self.exemplars[bucket] = exemplar
+
+    def merge(self, other: "RequestSeries") -> None:
+        self.count += other.count
+        self.duration_sum += other.duration_sum
+        for i, value in enumerate(other.buckets):
+            self.buckets[i] += value
+        for i, exemplar in enumerate(other.exemplars):
+            if exemplar is not None:
+                self._offer_exemplar(i, exemplar)
+        for slot, second in enumerate(other.recent_seconds):
+            if self.recent_seconds[slot] == second:
+                self.recent[slot] += other.recent[slot]
+            elif second > self.recent_seconds[slot]:
+                self.recent_seconds[slot] = second
+                self.recent[slot] = other.recent[slot]
+
+    def cumulative_buckets(self) -> List[int]:
+        result = []
+        running = 0
+        for value in self.buckets:
+            running += value
+            result.append(running)
+        return result
+
+    def recent_count(self, now: float, window: int) -> int:
+        threshold = int(now) - window
+        return sum(
+            count for count, second in zip(self.recent, self.recent_seconds)
+            if second > threshold
+        )
+
+
 class PromMetricsExporter:
     metric_requests_total = "uvicorn_requests_total"
     metric_requests_by_worker_total = "uvicorn_requests_by_worker_total"
@@ -27,9 +112,30 @@ class PromMetricsExporter:
     metric_total_cpu_percent = "uvicorn_total_cpu_percent"
     metric_total_memory_bytes = "uvicorn_total_memory_bytes"
     metric_active_worker_count = "uvicorn_active_worker_count"
+    metric_cardinality_dropped_events_total = "uvicorn_cardinality_dropped_events_total"
+    metric_cardinality_tracked_values = "uvicorn_cardinality_tracked_values"
+    metric_http_events_accepted_total = "uvicorn_http_events_accepted_total"
+    metric_http_events_evicted_total = "uvicorn_http_events_evicted_total"
+    metric_http_events_buffered = "uvicorn_http_events_buffered"
+
+    # Label names of the key tuples of each request accumulator
+    _accum_labels = {
+        "_accum_total": ("agent_id", "method", "path", "status"),
+        "_accum_by_worker": ("agent_id", "pid"),
+        "_series": ("agent_id", "method", "path"),
+    }
+    # Every event is in each accumulator: a label is weighted in the first one holding it
+    _weighted_labels = {
+        "_accum_total": ("agent_id", "method", "path", "status"),
+        "_accum_by_worker": ("pid",),
+        "_series": (),
+    }
 
     def __init__(self, state_provider,
         metric_label_prefix: Optional[str] = None,
+        buckets: Optional[Sequence[float]] = None,
+        cardinality_limiter: Optional[CardinalityLimiter] = None,
+        rebalance_interval: float = 10.0,
         enable_logging: bool = False,
     ):
         """
@@ -37,9 +143,17 @@ class PromMetricsExporter:
         Cấu trúc gồm:
             - 'http': list các requests
             - 'server': dict agent_id -> {master, workers}
+        buckets: Upper bounds of the request duration histogram (see
+            `histogram_buckets`). +Inf is always appended.
+        cardinality_limiter: Per-label budgets applied to request series labels.
+            Values over budget are collapsed into the `__other__` series.
+        rebalance_interval: Minimum seconds between two cardinality rebalances.
         """
         self._state_provider = state_provider
         self._enable_logging = enable_logging
+        self._limiter = cardinality_limiter or CardinalityLimiter()
+        self._buckets = normalize_buckets(buckets or DEFAULT_BUCKETS)
+        self._bucket_labels = [floatToGoString(b) for b in self._buckets] + ["+Inf"]
 
         if metric_label_prefix and isinstance(metric_label_prefix, str):
             self.metric_requests_total = metric_label_prefix + "_requests_total"
@@ -56,47 +170,198 @@ class PromMetricsExporter:
             self.metric_total_cpu_percent = metric_label_prefix + "_total_cpu_percent"
             self.metric_total_memory_bytes = metric_label_prefix + "_total_memory_bytes"
             self.metric_active_worker_count = metric_label_prefix + "_active_worker_count"
+            self.metric_cardinality_dropped_events_total = metric_label_prefix + "_cardinality_dropped_events_total"
+            self.metric_cardinality_tracked_values = metric_label_prefix + "_cardinality_tracked_values"
+            self.metric_http_events_accepted_total = metric_label_prefix + "_http_events_accepted_total"
+            self.metric_http_events_evicted_total = metric_label_prefix + "_http_events_evicted_total"
+            self.metric_http_events_buffered = metric_label_prefix + "_http_events_buffered"
 
-        self._accum_total = defaultdict(int)
-        self._accum_by_worker = defaultdict(int)
-        self._accum_duration_sum = defaultdict(float)
-        self._accum_duration_count = defaultdict(int)
-        self._accum_in_progress = defaultdict(int)
+        self._accum_total = {}
+        self._accum_by_worker = {}
+        self._series = {}
+        self._generation = 0
+        # Second of the latest request seen, for the in-progress gauge
+        self._latest_second = 0
+        self._rebalance_interval = rebalance_interval
+        self._last_rebalance = time.monotonic()
         self._lock = threading.Lock()
 
-    def aggregate_http_events(self):
-        state = self._state_provider()
-        now = time.time()
+    @property
+    def buckets(self) -> Tuple[float, ...]:
+        """
+        Upper bounds of the duration histogram, without +Inf.
+        """
+        return tuple(self._buckets)
 
+    @property
+    def generation(self) -> int:
+        """
+        Counter bumped whenever aggregated request metrics change, the marker of
+        the `requests` group of `collect_groups()`.
+        """
+        return self._generation
+
+    def observe(self, req) -> None:
+        """
+        Fold a single HTTP event into the request series.
+
+        Called from the ingest path (see `RealtimeState.add_http_listener`). All
+        work is O(1) per event: the label tuple selects a preallocated series
+        slot whose counters and histogram bucket are incremented in place.
+        """
+        agent_id = req.get("agent_id", None)
+        if agent_id is None:
+            logger.warning(f"'agent_id' not found in http_event: {req}")
+            return
+
+        method = req.get("method", "unknown")
+        path = req.get("path", "unknown")
+        status = str(req.get("status", "000"))
+        duration = req.get("duration", 0.0)
+        pid = str(req.get("pid", "0"))
+
+        if "method" not in req or "path" not in req or "status" not in req:
+            logger.warning(f"Incomplete HTTP event fields: {req}")
+
+        limiter = self._limiter
+        agent_id = limiter.admit("agent_id", agent_id)
+        method = limiter.admit("method", method)
+        path = limiter.admit("path", path)
+        status = limiter.admit("status", status)
+        pid = limiter.admit("pid", pid)
+
+        bucket = bisect_left(self._buckets, duration)
+        event_time = req.get("time") or time.time()
+
+        with self._lock:
+            total_key = (agent_id, method, path, status)
+            self._accum_total[total_key] = self._accum_total.get(total_key, 0) + 1
+            worker_key = (agent_id, pid)
+            self._accum_by_worker[worker_key] = self._accum_by_worker.get(worker_key, 0) + 1
+
+            series_key = (agent_id, method, path)
+            series = self._series.get(series_key)
+            if series is None:
+                series = self._series[series_key] = RequestSeries(len(self._buckets))
+            series.observe(duration, bucket, event_time, req.get("request_id"))
+            self._latest_second = max(self._latest_second, int(event_time))
+            self._generation += 1
+
+        now = time.monotonic()
+        if now - self._last_rebalance >= self._rebalance_interval:
+            self._last_rebalance = now
+            self._rebalance_labels()
+
+    def observe_many(self, events) -> None:
+        for req in events:
+            self.observe(req)
+
+    def drain(self) -> Dict[str, Dict[tuple, Any]]:
+        """
+        Hand over the request series accumulated so far and start again from zero.
+
+        Used by ingest shards, whose exporters only ever hold the delta since
+        their last merge into the hub's exporter.
+        """
         with self._lock:
-            self._accum_in_progress = defaultdict(int)
+            partial = {attr: getattr(self, attr) for attr in self._accum_labels}
+            for attr in self._accum_labels:
+                setattr(self, attr, {})
+            self._generation += 1
+        return partial
 
-        for req in state.get_http_events(cleancut=True):
-            agent_id = req.get("agent_id", None)
-            if agent_id is None:
-                logger.warning(f"'agent_id' not found in http_event: {req}")
-                continue
+    def merge(self, partial: Dict[str, Dict[tuple, Any]]) -> None:
+        """
+        Fold request series drained from another exporter with the same buckets.
 
-            method = req.get("method", "unknown")
-            path = req.get("path", "unknown")
-            status = str(req.get("status", "000"))
-            duration = req.get("duration", 0.0)
-            pid = str(req.get("pid", "0"))
+        Label values go through this exporter's cardinality limiter once per
+        series rather than once per event, weighted by the series' events so
+        that hits and drops are counted as `observe()` would count them.
+        """
+        limiter = self._limiter
+        with self._lock:
+            for attr, labels in self._accum_labels.items():
+                accum = getattr(self, attr)
+                weighted = self._weighted_labels[attr]
+                for key, value in partial.get(attr, {}).items():
+                    events = value.count if isinstance(value, RequestSeries) else value
+                    key = tuple(limiter.admit(label, v, events if label in weighted else 0)
+                        for label, v in zip(labels, key))
+                    current = accum.get(key)
+                    if isinstance(value, RequestSeries):
+                        self._latest_second = max(self._latest_second, *value.recent_seconds)
+                    if current is None:
+                        accum[key] = value
+                    elif isinstance(value, RequestSeries):
+                        current.merge(value)
+                    else:
+                        accum[key] = current + value
+            self._generation += 1
 
-            if "method" not in req or "path" not in req or "status" not in req:
-                logger.warning(f"Incomplete HTTP event fields: {req}")
+    def series_counts(self) -> Dict[str, int]:
+        """
+        Number of series in each request accumulator, for sizing the hub.
+        """
+        with self._lock:
+            return {
+                "requests_total": len(self._accum_total),
+                "requests_by_worker": len(self._accum_by_worker),
+                "requests_duration": len(self._series),
+            }
 
+    def _rebalance_labels(self):
+        """
+        Let hot overflow label values replace cold ones, folding the series of
+        evicted values into `__other__` so totals are preserved.
+        """
+        for label, values in self._limiter.rebalance().items():
+            evicted = set(values)
             with self._lock:
-                self._accum_total[(agent_id, method, path, status)] += 1
-                self._accum_by_worker[(agent_id, pid)] += 1
-                self._accum_duration_sum[(agent_id, method, path)] += duration
-                self._accum_duration_count[(agent_id, method, path)] += 1
-                event_time = req.get("time")
-                if event_time and now - event_time < 4:
-                    self._accum_in_progress[(agent_id, method, path)] += 1
+                for attr, labels in self._accum_labels.items():
+                    if label not in labels:
+                        continue
+                    index = labels.index(label)
+                    accum = getattr(self, attr)
+                    for key in [k for k in accum if k[index] in evicted]:
+                        value = accum.pop(key)
+                        other_key = key[:index] + (OTHER,) + key[index + 1:]
+                        current = accum.get(other_key)
+                        if current is None:
+                            accum[other_key] = value
+                        elif isinstance(value, RequestSeries):
+                            current.merge(value)
+                        else:
+                            accum[other_key] = current + value
+                self._generation += 1
 
     def collect(self):
-        # Request metrics
+        for _, _, collect in self.collect_groups():
+            yield from collect()
+
+    def collect_groups(self) -> List[Tuple[str, Any, Callable[[], Iterable]]]:
+        """
+        The families of `collect()` split into `(key, marker, collect)` groups.
+
+        A group's `marker`, read before it is collected, moves whenever its
+        samples may have changed, so a caller holding the rendered group for
+        the same marker can skip collecting it again (see PromExpositionCache).
+        A None marker means the samples change with time and must be collected
+        every time.
+        """
+        state = self._state_provider()
+        now = time.time()
+        generation = self._generation
+        # Past the window after the latest request the in-progress gauge stays empty
+        in_progress = generation if int(now) - self._latest_second > IN_PROGRESS_WINDOW else None
+        return [
+            ("requests", generation, self._collect_requests),
+            ("requests_in_progress", in_progress, lambda: self._collect_in_progress(now)),
+            ("http_events", None, lambda: self._collect_http_events(state)),
+            ("servers", getattr(state, "servers_version", None), lambda: self._collect_servers(state)),
+            ("uptime", None, lambda: self._collect_uptime(state, now)),
+        ]
+
+    def _collect_requests(self):
         req_total = CounterMetricFamily(
             self.metric_requests_total,
             "Total number of HTTP requests",
@@ -112,119 +377,159 @@ class PromMetricsExporter:
             "Request duration (seconds)",
             labels=["agent_id", "method", "path"],
         )
-        req_in_progress = GaugeMetricFamily(
-            self.metric_requests_in_progress,
-            "Number of in-progress HTTP requests",
-            labels=["agent_id", "method", "path"],
-        )
 
-        for (agent_id, method, path, status), value in self._accum_total.items():
+        with self._lock:
+            totals = list(self._accum_total.items())
+            by_worker = list(self._accum_by_worker.items())
+            series = list(self._series.items())
+
+        for (agent_id, method, path, status), value in totals:
             req_total.add_metric([agent_id, method, path, status], value)
 
-        for (agent_id, pid), value in self._accum_by_worker.items():
+        for (agent_id, pid), value in by_worker:
             req_by_worker.add_metric([agent_id, pid], value)
 
-        for (agent_id, method, path), count in self._accum_duration_count.items():
-            req_duration.add_sample(
-                self.metric_requests_duration_seconds_sum,
-                value=self._accum_duration_sum[(agent_id, method, path)],
-                labels={"agent_id": agent_id, "method": method, "path": path},
-            )
-            req_duration.add_sample(
-                self.metric_requests_duration_seconds_count,
-                value=count,
-                labels={"agent_id": agent_id, "method": method, "path": path},
-            )
-
-        for (agent_id, method, path), value in self._accum_in_progress.items():
-            req_in_progress.add_metric([agent_id, method, path], value)
+        for key, s in series:
+            buckets = []
+            for bound, value, exemplar in zip(self._bucket_labels, s.cumulative_buckets(), s.exemplars):
+                if exemplar is None:
+                    buckets.append((bound, value))
+                else:
+                    request_id, duration, event_time = exemplar
+                    buckets.append((bound, value,
+                        Exemplar({"request_id": str(request_id)[:64]}, duration, event_time)))
+            req_duration.add_metric(list(key), buckets=buckets, sum_value=s.duration_sum)
 
         yield req_total
         yield req_duration
-        yield req_in_progress
         yield req_by_worker
 
-        # Worker + Master metrics
-        cpu_total = defaultdict(float)
-        mem_total = defaultdict(float)
-        worker_count = defaultdict(int)
+        dropped_events = CounterMetricFamily(
+            self.metric_cardinality_dropped_events_total,
+            "HTTP events whose label value was collapsed into the __other__ series",
+            labels=["label"],
+        )
+        for label, value in self._limiter.dropped().items():
+            dropped_events.add_metric([label], value)
+        yield dropped_events
 
-        state = self._state_provider()
+        tracked_values = GaugeMetricFamily(
+            self.metric_cardinality_tracked_values,
+            "Distinct label values currently retained by the cardinality limiter",
+            labels=["label"],
+        )
+        for label, value in self._limiter.tracked().items():
+            tracked_values.add_metric([label], value)
+        yield tracked_values
+
+    def _collect_in_progress(self, now: float):
+        req_in_progress = GaugeMetricFamily(
+            self.metric_requests_in_progress,
+            "Number of in-progress HTTP requests",
+            labels=["agent_id", "method", "path"],
+        )
+        with self._lock:
+            series = list(self._series.items())
+        for key, s in series:
+            in_progress = s.recent_count(now, IN_PROGRESS_WINDOW)
+            if in_progress:
+                req_in_progress.add_metric(list(key), in_progress)
+        yield req_in_progress
+
+    def _collect_http_events(self, state):
+        events_accepted = CounterMetricFamily(
+            self.metric_http_events_accepted_total,
+            "HTTP events accepted into the hub buffer per agent",
+            labels=["agent_id"])
+        events_evicted = CounterMetricFamily(
+            self.metric_http_events_evicted_total,
+            "HTTP events evicted before their TTL to keep the agent within its fair share",
+            labels=["agent_id"])
+        events_buffered = GaugeMetricFamily(
+            self.metric_http_events_buffered,
+            "HTTP events currently held in the hub buffer per agent",
+            labels=["agent_id"])
+        for agent_id, stats in state.http_event_stats().items():
+            events_accepted.add_metric([agent_id], stats["accepted"])
+            events_evicted.add_metric([agent_id], stats["evicted"])
+            events_buffered.add_metric([agent_id], stats["buffered"])
+        yield events_accepted
+        yield events_evicted
+        yield events_buffered
+
+    def _collect_servers(self, state):
+        # Worker + Master metrics: one family per metric name, filled in a single pass
+        worker_labels = ["agent_id", "pid"]
+        worker_cpu = GaugeMetricFamily(
+            self.metric_worker_cpu_percent,
+            "CPU usage (%) per worker",
+            labels=worker_labels)
+        worker_memory = GaugeMetricFamily(
+            self.metric_worker_memory_bytes,
+            "Memory usage in bytes",
+            labels=worker_labels)
+        worker_threads = GaugeMetricFamily(
+            self.metric_worker_thread_count,
+            "Thread count per worker",
+            labels=worker_labels)
+        cpu_total = GaugeMetricFamily(
+            self.metric_total_cpu_percent,
+            "Total CPU usage (%) per agent",
+            labels=["agent_id"])
+        mem_total = GaugeMetricFamily(
+            self.metric_total_memory_bytes,
+            "Total memory usage (bytes) per agent",
+            labels=["agent_id"])
+        worker_count = GaugeMetricFamily(
+            self.metric_active_worker_count,
+            "Number of active workers",
+            labels=["agent_id"])
 
         for agent_id, info in state.get_all_servers().items():
             workers = info.get("workers", {})
-            master = info.get("master", {})
 
+            agent_cpu = 0.0
+            agent_memory = 0.0
             for pid_str, w in workers.items():
                 labels = [agent_id, pid_str]
+                cpu = w.get("cpu", 0.0)
+                memory = w.get("memory", 0.0)
+                worker_cpu.add_metric(labels, cpu)
+                worker_memory.add_metric(labels, memory)
+                worker_threads.add_metric(labels, w.get("num_threads", 0))
+                agent_cpu += cpu
+                agent_memory += memory
 
-                g = GaugeMetricFamily(
-                    self.metric_worker_cpu_percent,
-                    "CPU usage (%) per worker",
-                    labels=["agent_id", "pid"]
-                )
-                g.add_metric(labels, w.get("cpu", 0.0))
-                yield g
-
-                g2 =GaugeMetricFamily(
-                    self.metric_worker_memory_bytes,
-                    "Memory usage in bytes",
-                    labels=["agent_id", "pid"]
-                )
-                g2.add_metric(labels, w.get("memory", 0.0))
-                yield g2
-
-                g3 = GaugeMetricFamily(
-                    self.metric_worker_thread_count,
-                    "Thread count per worker",
-                    labels=["agent_id", "pid"]
-                )
-                g3.add_metric(labels, w.get("num_threads", 0))
-                yield g3
-
-                now = time.time()
-                uptime = max(0, now - w.get("start_time", now))
-                g4 = GaugeMetricFamily(
-                    self.metric_worker_uptime_seconds,
-                    "Worker uptime in seconds",
-                    labels=["agent_id", "pid"]
-                )
-                g4.add_metric(labels, uptime)
-                yield g4
-
-                cpu_total[agent_id] += w.get("cpu", 0.0)
-                mem_total[agent_id] += w.get("memory", 0.0)
-                worker_count[agent_id] += 1
+            if workers:
+                cpu_total.add_metric([agent_id], agent_cpu)
+                mem_total.add_metric([agent_id], agent_memory)
+                worker_count.add_metric([agent_id], len(workers))
 
+        yield worker_cpu
+        yield worker_memory
+        yield worker_threads
+        yield cpu_total
+        yield mem_total
+        yield worker_count
+
+    def _collect_uptime(self, state, now: float):
+        worker_labels = ["agent_id", "pid"]
+        worker_uptime = GaugeMetricFamily(
+            self.metric_worker_uptime_seconds,
+            "Worker uptime in seconds",
+            labels=worker_labels)
+        master_uptime = GaugeMetricFamily(
+            self.metric_master_uptime_seconds,
+            "Uptime of master process",
+            labels=worker_labels)
+
+        for agent_id, info in state.get_all_servers().items():
+            for pid_str, w in info.get("workers", {}).items():
+                worker_uptime.add_metric([agent_id, pid_str], max(0, now - w.get("start_time", now)))
+            master = info.get("master", {})
             if "start_time" in master:
                 pid = str(master.get("pid", "master"))
-                uptime = max(0, now - master.get("start_time", now))
-                g5 = GaugeMetricFamily(
-                    self.metric_master_uptime_seconds,
-                    "Uptime of master process",
-                    labels=["agent_id", "pid"]
-                )
-                g5.add_metric([agent_id, pid], uptime)
-                yield g5
-
-        for agent_id in cpu_total:
-            g6 = GaugeMetricFamily(
-                self.metric_total_cpu_percent,
-                "Total CPU usage (%) per agent",
-                labels=["agent_id"])
-            g6.add_metric([agent_id], cpu_total[agent_id])
-            yield g6
-
-            g7 = GaugeMetricFamily(
-                self.metric_total_memory_bytes,
-                "Total memory usage (bytes) per agent",
-                labels=["agent_id"])
-            g7.add_metric([agent_id], mem_total[agent_id])
-            yield g7
-
-            g8 = GaugeMetricFamily(
-                self.metric_active_worker_count,
-                "Number of active workers",
-                labels=["agent_id"])
-            g8.add_metric([agent_id], worker_count[agent_id])
-            yield g8
+                master_uptime.add_metric([agent_id, pid], max(0, now - master.get("start_time", now)))
+
+        yield worker_uptime
+        yield master_uptime
@@ -2,32 +2,89 @@ import time
 import threading
 import logging
 
-from prometheus_client import REGISTRY, make_wsgi_app
-from wsgiref.simple_server import make_server
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from prometheus_client import GC_COLLECTOR, PLATFORM_COLLECTOR, PROCESS_COLLECTOR
+
+from .prom_exposition_cache import PromExpositionCache
 
 logger = logging.getLogger(__name__)
 
+SCRAPE_DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
 class PromMetricsServer:
-    def __init__(self, exporter, prom_port=9100, prom_host=''):
+    """
+    Serve the Prometheus exposition over a threaded HTTP/1.1 server.
+
+    Each connection is handled on its own thread with keep-alive, so concurrent
+    or slow scrapers do not block each other. Payloads come pre-rendered (and
+    pre-gzipped) from a PromExpositionCache, which re-collects only the
+    exporter's groups that changed. The exporter is kept beside the server's
+    own registry (process, scrape and hub metrics) rather than on it, so the
+    cache can see its groups; `collect()` yields both.
+    """
+
+    def __init__(self, exporter, prom_port=9100, prom_host='', cache_max_age: float = 1.0):
         """
         state_provider: Callable trả về RealtimeState dict
         prom_port: cổng exporter Prometheus
+        cache_max_age: maximum age (seconds) of the pre-rendered exposition
         """
         self._exporter = exporter
+        self._registry = CollectorRegistry(auto_describe=False)
+        for collector in (PROCESS_COLLECTOR, PLATFORM_COLLECTOR, GC_COLLECTOR):
+            self._registry.register(collector)
+        self._scrape_duration = Histogram(
+            "dashcorn_hub_scrape_duration_seconds",
+            "Time spent answering a Prometheus scrape",
+            buckets=SCRAPE_DURATION_BUCKETS,
+            registry=self._registry,
+        )
+        self._scrape_requests = Counter(
+            "dashcorn_hub_scrape_requests",
+            "Prometheus scrapes served, by exposition format and content encoding",
+            labelnames=["format", "encoding"],
+            registry=self._registry,
+        )
+        self._cache = PromExpositionCache(exporter, self._registry, max_age=cache_max_age)
         self._prom_host = prom_host
         self._prom_port = prom_port
-        self._server = None
+        self._server: Optional[ThreadingHTTPServer] = None
         self._thread = None
         self._stop_event = threading.Event()
         self._running = False
 
+    @property
+    def registry(self) -> CollectorRegistry:
+        return self._registry
+
+    def collect(self):
+        """
+        Every family served, the exporter's and the registry's.
+        """
+        yield from self._exporter.collect()
+        yield from self._registry.collect()
+
+    @property
+    def server_address(self) -> Optional[Tuple[str, int]]:
+        return self._server.server_address if self._server else None
+
     def start(self):
         if self._running:
             logger.debug(f"[{self.__class__.__name__}] already running.")
             return
 
+        try:
+            self._server = ThreadingHTTPServer((self._prom_host, self._prom_port), self._make_handler())
+            self._server.daemon_threads = True
+        except Exception as e:
+            logger.warning(f"[{self.__class__.__name__}] running error: {e}")
+            return
+
         self._stop_event.clear()
-        self._thread = threading.Thread(target=self._run_prometheus_exporter, daemon=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
         self._thread.start()
         self._running = True
         logger.debug(f"[{self.__class__.__name__}] started on port {self._prom_port}.")
@@ -40,7 +97,9 @@ class PromMetricsServer:
         self._stop_event.set()
         if self._server:
             self._server.shutdown()
+            self._server.server_close()
         self._thread.join(timeout=5)
+        self._server = None
         self._running = False
         logger.debug(f"[{self.__class__.__name__}] stopped.")
 
@@ -49,11 +108,53 @@ class PromMetricsServer:
         self.stop()
         self.start()
 
-    def _run_prometheus_exporter(self):
-        try:
-            REGISTRY.register(self._exporter)
-            app = make_wsgi_app(registry=REGISTRY)
-            self._server = make_server(self._prom_host, self._prom_port, app)
-            self._server.serve_forever()
-        except Exception as e:
-            logger.warning(f"[{self.__class__.__name__}] running error: {e}")
+    def scrape(self, accept: Optional[str] = None,
+            accept_encoding: Optional[str] = None) -> Tuple[bytes, List[Tuple[str, str]]]:
+        """
+        Produce the body and headers of a scrape response.
+
+        This is transport independent, so the same cached exposition can also be
+        mounted as a route of the hub web application.
+        """
+        start = time.perf_counter()
+        exposition = self._cache.negotiate(accept)
+        headers = [("Content-Type", exposition.content_type)]
+        if accept_encoding and "gzip" in accept_encoding:
+            body = exposition.gzipped
+            encoding = "gzip"
+            headers.append(("Content-Encoding", "gzip"))
+        else:
+            body = exposition.body
+            encoding = "identity"
+        headers.append(("Content-Length", str(len(body))))
+        fmt = "openmetrics" if "openmetrics" in exposition.content_type else "text"
+        self._scrape_requests.labels(fmt, encoding).inc()
+        self._scrape_duration.observe(time.perf_counter() - start)
+        return body, headers
+
+    def _make_handler(self):
+        server = self
+
+        class ScrapeHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                try:
+                    body, headers = server.scrape(
+                        self.headers.get("Accept"),
+                        self.headers.get("Accept-Encoding"),
+                    )
+                except Exception as e:
+                    logger.warning(f"[{server.__class__.__name__}] scrape failed: {e}")
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"[{server.__class__.__name__}] {self.address_string()} {format % args}")
+
+        return ScrapeHandler
@@ -0,0 +1,167 @@
+import time
+import threading
+import logging
+
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from dashcorn.utils import protobuf_wire as pb
+from dashcorn.utils import snappy_util
+
+from .push_sender import PushSender
+
+logger = logging.getLogger(__name__)
+
+REMOTE_WRITE_HEADERS = {
+    "Content-Type": "application/x-protobuf",
+    "Content-Encoding": "snappy",
+    "X-Prometheus-Remote-Write-Version": "0.1.0",
+    "User-Agent": "dashcorn-hub",
+}
+
+_slow_codec_warned = False
+
+def _warn_if_slow_codec() -> None:
+    global _slow_codec_warned
+    if _slow_codec_warned or snappy_util.is_native():
+        return
+    _slow_codec_warned = True
+    logger.warning("[PromRemoteWriter] no native snappy codec installed, compressing in pure "
+        "python is slow on large payloads; install dashcorn[remote-write] (cramjam).")
+
+class PromRemoteWriter:
+    """
+    Push the hub's series to a Prometheus remote-write endpoint.
+
+    Every `interval` seconds the collector is read once, its samples are encoded
+    as `prometheus.WriteRequest` messages of at most `max_series_per_request`
+    series, snappy compressed and handed to a PushSender, which retries and
+    bounds the backlog of pending requests.
+
+    Args:
+        collector: Object exposing `collect()` (an exporter, a registry or the
+            PromMetricsServer, which yields both).
+        url: Remote-write endpoint.
+        external_labels: Labels added to every series (e.g. `{"hub": "eu-1"}`).
+    """
+
+    def __init__(self, collector: Any, url: str,
+            interval: float = 15.0,
+            max_series_per_request: int = 2000,
+            max_pending_requests: int = 32,
+            max_retries: int = 3,
+            retry_backoff: float = 0.5,
+            timeout: float = 10.0,
+            external_labels: Optional[Mapping[str, str]] = None,
+            headers: Optional[Mapping[str, str]] = None):
+        self._collector = collector
+        self._url = url
+        self._interval = interval
+        self._max_series_per_request = max_series_per_request
+        self._timeout = timeout
+        self._external_labels = tuple(sorted((external_labels or {}).items()))
+        # (sample name, labels) -> encoded Label fields, reused across pushes
+        self._label_cache: Dict[Tuple[str, tuple], bytes] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._sender = PushSender(url, {**REMOTE_WRITE_HEADERS, **(headers or {})},
+            max_pending_requests=max_pending_requests,
+            max_retries=max_retries,
+            retry_backoff=retry_backoff,
+            timeout=timeout,
+            stop_event=self._stop_event)
+
+    def stats(self) -> Dict[str, int]:
+        return self._sender.stats()
+
+    def _run_loop(self):
+        logger.debug(f"[{self.__class__.__name__}] loop is running...")
+        while not self._stop_event.wait(self._interval):
+            try:
+                self.push_once()
+            except Exception as e:
+                logger.warning(f"[{self.__class__.__name__}] push failed: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            logger.debug(f"[{self.__class__.__name__}] is already running.")
+            return
+        _warn_if_slow_codec()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+        logger.debug(f"[{self.__class__.__name__}] started, pushing to {self._url}.")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self._timeout + 2)
+        with self._lock:
+            self._sender.close()
+        logger.debug(f"[{self.__class__.__name__}] stopped.")
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def push_once(self) -> int:
+        """
+        Collect, encode and queue the current samples, then send what is pending.
+
+        Returns:
+            Number of requests successfully sent.
+        """
+        with self._lock:
+            for payload, series_count in self._encode(int(time.time() * 1000)):
+                self._sender.enqueue(payload, series_count)
+            return self._sender.flush()
+
+    def _encode(self, now_ms: int) -> List[Tuple[bytes, int]]:
+        previous = self._label_cache
+        current: Dict[Tuple[str, tuple], bytes] = {}
+        payloads = []
+        request = bytearray()
+        series_count = 0
+
+        for metric in self._collector.collect():
+            for sample in metric.samples:
+                if sample.name.endswith("_created"):
+                    continue
+                key = (sample.name, tuple(sorted(sample.labels.items())))
+                labels = previous.get(key)
+                if labels is None:
+                    labels = self._encode_labels(key)
+                current[key] = labels
+
+                series = bytearray(labels)
+                point = bytearray()
+                pb.write_double(point, 1, sample.value)
+                timestamp = now_ms if sample.timestamp is None else int(float(sample.timestamp) * 1000)
+                pb.write_varint(point, 2, timestamp)
+                pb.write_bytes(series, 2, point)
+                pb.write_bytes(request, 1, series)
+
+                series_count += 1
+                if series_count == self._max_series_per_request:
+                    payloads.append((snappy_util.compress(request), series_count))
+                    request = bytearray()
+                    series_count = 0
+
+        if series_count:
+            payloads.append((snappy_util.compress(request), series_count))
+        self._label_cache = current
+        return payloads
+
+    def _encode_labels(self, key: Tuple[str, tuple]) -> bytes:
+        name, labels = key
+        # Remote write requires labels sorted by name; "__name__" sorts first
+        merged = dict(self._external_labels)
+        merged.update(labels)
+        merged["__name__"] = name
+        out = bytearray()
+        for label_name, label_value in sorted(merged.items()):
+            label = bytearray()
+            pb.write_string(label, 1, label_name)
+            pb.write_string(label, 2, str(label_value))
+            pb.write_bytes(out, 1, label)
+        return bytes(out)
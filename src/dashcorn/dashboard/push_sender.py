@@ -0,0 +1,114 @@
+import threading
+import logging
+
+from collections import deque
+from typing import Deque, Dict, Mapping, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+class PushSender:
+    """
+    Bounded queue of encoded payloads posted in order to a push endpoint.
+
+    A payload that still fails after `max_retries` retryable errors (connection
+    errors, 5xx, 429) stays at the head of the queue for the next `flush()`.
+    Other 4xx responses can never succeed, so the payload is dropped. The queue
+    holds at most `max_pending_requests` payloads and drops the oldest when it
+    overflows, so an unreachable receiver costs bounded memory.
+
+    Args:
+        stop_event: Interrupts retry backoff when the owning exporter stops.
+    """
+
+    def __init__(self, url: str, headers: Mapping[str, str],
+            max_pending_requests: int = 32,
+            max_retries: int = 3,
+            retry_backoff: float = 0.5,
+            timeout: float = 10.0,
+            stop_event: Optional[threading.Event] = None):
+        self._url = url
+        self._headers = dict(headers)
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._timeout = timeout
+        self._stop_event = stop_event or threading.Event()
+        self._pending: Deque[Tuple[bytes, int]] = deque(maxlen=max_pending_requests)
+        self._client: Optional[httpx.Client] = None
+        self._stats = dict(sent_requests=0, sent_items=0, retries=0,
+            failed_requests=0, dropped_requests=0)
+
+    @property
+    def url(self) -> str:
+        return self._url
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self._stats)
+        stats["pending_requests"] = len(self._pending)
+        return stats
+
+    def enqueue(self, payload: bytes, items: int) -> None:
+        """
+        Queue a payload carrying `items` series or data points.
+        """
+        if len(self._pending) == self._pending.maxlen:
+            self._stats["dropped_requests"] += 1
+        self._pending.append((payload, items))
+
+    def flush(self) -> int:
+        """
+        Send pending payloads in order.
+
+        Returns:
+            Number of payloads accepted by the receiver.
+        """
+        sent = 0
+        while self._pending and not self._stop_event.is_set():
+            payload, items = self._pending[0]
+            delivered = self._send(payload)
+            if delivered is None:
+                break
+            self._pending.popleft()
+            if delivered:
+                self._stats["sent_requests"] += 1
+                self._stats["sent_items"] += items
+                sent += 1
+            else:
+                self._stats["failed_requests"] += 1
+        return sent
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def _send(self, payload: bytes) -> Optional[bool]:
+        """
+        Post one payload.
+
+        Returns:
+            True once accepted, False if the receiver rejected it for good and
+            None if it should be retried on the next flush.
+        """
+        if self._client is None:
+            self._client = httpx.Client(timeout=self._timeout)
+        for attempt in range(self._max_retries + 1):
+            if attempt:
+                self._stats["retries"] += 1
+                if self._stop_event.wait(self._retry_backoff * 2 ** (attempt - 1)):
+                    return None
+            try:
+                response = self._client.post(self._url, content=payload, headers=self._headers)
+            except httpx.HTTPError as e:
+                logger.debug(f"[{self.__class__.__name__}] send error: {e}")
+                continue
+            if response.status_code < 300:
+                return True
+            if response.status_code == 429 or response.status_code >= 500:
+                logger.debug(f"[{self.__class__.__name__}] retryable status {response.status_code}")
+                continue
+            logger.warning(f"[{self.__class__.__name__}] payload rejected with "
+                f"{response.status_code}: {response.text[:200]}")
+            return False
+        return None
@@ -1,46 +1,136 @@
 import logging
 import threading
+import weakref
 
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Callable, Dict, List, Literal, Mapping, Optional, Set, Tuple
 
-from dashcorn.utils.cache import ExpiringDeque
+from dashcorn.commons import consts
 from dashcorn.utils.cache import ExpireIfIdleDict
 from dashcorn.utils.cache import RefreshOnSetCache
+from dashcorn.utils.cache import get_timing_wheel
+from dashcorn.utils.memory_util import approx_size
+
+from .agent_registry import REMOVED, AgentRegistry, MembershipEvent
+from .cardinality_limiter import CardinalityLimiter
+from .fair_event_buffer import FairEventBuffer, merge_views, page_views
+from .metrics_rollup import RollupStore
 
 logger = logging.getLogger(__name__)
 
 Kind = Literal["http", "server"]
+HttpListener = Callable[[dict[str, Any]], None]
+ServerSnapshot = dict[str, dict[str, Any]]  # {"master": {...}, "workers": {...}}
 
 class RealtimeState:
     def __init__(self,
             http_event_ttl: Optional[float] = 60.0,
             http_events_maxlen: Optional[int] = 10000,
+            http_event_weights: Optional[Mapping[str, float]] = None,
             master_ttl: float = 5.0,
             worker_ttl: float = 5.0,
             workers_maxlen: int = 100,
+            rollup_resolution: float = 1.0,
+            rollup_retention: float = 900.0,
+            rollup_label_budgets: Optional[Dict[str, int]] = None,
+            agent_report_interval: float = consts.WORKER_REPORT_INTERVAL,
+            agent_stale_after_reports: float = 3.0,
+            agent_gone_after: float = 60.0,
+            agent_grace_period: float = 300.0,
+            memory_budget: Optional[int] = None,
+            rollup_memory_share: float = 0.5,
             logging_enabled: bool = False):
+        """
+        Args:
+            agent_report_interval: Seconds between two status reports of an agent.
+            agent_stale_after_reports: Report intervals without a report before
+                an agent is marked stale, so a single late report does not
+                flip it. The snapshot TTLs are unrelated: they drop entries.
+            http_events_maxlen: Events kept across all agents; with
+                `memory_budget` the events also stay within its bytes.
+            memory_budget: Approximate bytes for the events, rollups and server
+                snapshots together. Rollups may use up to `rollup_memory_share`
+                of it, losing their oldest buckets beyond that, and the events
+                buffer gets what the others leave. Rebalanced every second.
+        """
         self._http_event_ttl = http_event_ttl
         self._http_events_maxlen = http_events_maxlen
         self._http_events_lock = threading.Lock()
-        self._http_events: ExpiringDeque[dict[str, Any]] = ExpiringDeque(
+        self._memory_budget = memory_budget
+        self._rollup_memory_share = rollup_memory_share
+        # One sub-buffer per agent, sharing the budget by weight
+        self._http_events = FairEventBuffer(
                 ttl=self._http_event_ttl,
+                budget=self._http_events_maxlen if memory_budget is None else memory_budget,
+                weights=http_event_weights,
+                sizeof=None if memory_budget is None else approx_size,
                 maxlen=self._http_events_maxlen)
+        self._http_events_cursor = 0
+        self._rollups = RollupStore(
+                resolution=rollup_resolution,
+                retention=rollup_retention,
+                limiter=CardinalityLimiter(rollup_label_budgets))
         self._server_state = {} # dict[str, RefreshOnSetCache[str, dict[str, Any]]] = {}
         self._master_ttl = master_ttl
         self._worker_ttl = worker_ttl
         self._workers_maxlen = workers_maxlen
         self._workers_lock = threading.Lock()
+        # Published, never mutated per-agent views of _server_state
+        self._server_snapshots: Dict[str, ServerSnapshot] = {}
+        # Approximate bytes of each published snapshot, and their sum
+        self._server_nbytes: Dict[str, int] = {}
+        self._servers_nbytes = 0
+        self._servers_version = 0
+        self._published_servers: Tuple[int, Dict[str, ServerSnapshot]] = (0, {})
+        self._dirty_agents: Set[str] = set()
+        self._agents = AgentRegistry(
+                stale_after=agent_report_interval * agent_stale_after_reports,
+                gone_after=max(agent_gone_after, agent_report_interval * agent_stale_after_reports),
+                grace_period=agent_grace_period,
+                sweep_interval=1.0)
+        self._agents.add_listener(self._on_membership_event)
+        self._http_listeners: List[HttpListener] = []
         self._logging_enabled = logging_enabled
+        self._memory_timer = None
+        if memory_budget is not None:
+            ref = weakref.ref(self)
+            self._memory_timer = get_timing_wheel().schedule_repeating(
+                1.0, lambda: _run_scheduled_enforce(ref))
+
+    def close(self) -> None:
+        if self._memory_timer is not None:
+            self._memory_timer.cancel()
+            self._memory_timer = None
+        self._agents.close()
+
+    def __del__(self):
+        self.close()
+
+    def add_http_listener(self, listener: HttpListener) -> None:
+        """
+        Register a callback invoked with every ingested HTTP event.
+
+        Listeners run on the ingest thread, so they must be cheap (O(1) per
+        event) and must not block.
+        """
+        self._http_listeners.append(listener)
 
     def update(self, kind: Kind, data: dict[str, Any]) -> None:
         if kind == "http":
             with self._http_events_lock:
                 if self._logging_enabled:
                     _len1 = len(self._http_events)
+                self._http_events_cursor += 1
+                data["cursor"] = self._http_events_cursor
                 self._http_events.append(data)
                 if self._logging_enabled:
                     _len2 = len(self._http_events)
                     logger.debug(f"HTTP event has been appended. Total {_len1} -> {_len2}")
+            self._rollups.observe(data)
+            for listener in self._http_listeners:
+                try:
+                    listener(data)
+                except Exception as e:
+                    logger.warning(f"HTTP event listener {listener} failed: {e}")
 
         elif kind == "server":
             agent_id = data.get("agent_id")
@@ -49,25 +139,165 @@ class RealtimeState:
                     logger.debug(f"Missing agent_id in server data: {data}")
                 return
 
-            if agent_id not in self._server_state:
-                self._server_state[agent_id] = {
-                    "master": ExpireIfIdleDict(ttl=self._master_ttl),
-                    "workers": RefreshOnSetCache(ttl=self._worker_ttl, maxlen=self._workers_maxlen),
-                    "last_index": -1,
-                }
+            self._agents.touch(agent_id)
+            with self._workers_lock:
+                cache = self._server_state.get(agent_id)
+                if cache is None:
+                    cache = self._server_state[agent_id] = self._new_server_cache(agent_id)
 
-            _master = data.get("master", {})
-            if _master:
-                self._server_state[agent_id]["master"].update(_master)
+                _master = data.get("master", {})
+                if _master:
+                    cache["master"].update(_master)
 
-            workers = data.get("workers", {})
-            if workers:
-                for worker_id, worker_info in workers.items():
-                    self._server_state[agent_id]["workers"][worker_id] = worker_info
+                workers = data.get("workers", {})
+                if workers:
+                    for worker_id, worker_info in workers.items():
+                        cache["workers"][worker_id] = worker_info
+
+                self._publish_server(agent_id, cache)
 
             if self._logging_enabled:
                 logger.debug(f"Server state updated for {agent_id} with {len(workers)} workers")
 
+    def append_http_events(self, events: List[Any]) -> None:
+        """
+        Buffer HTTP events whose aggregates were already merged elsewhere.
+
+        Used with sharded ingestion: the events get cursors and go to the
+        events buffer, but skip the rollups and the HTTP listeners.
+        """
+        with self._http_events_lock:
+            for data in events:
+                self._http_events_cursor += 1
+                data["cursor"] = self._http_events_cursor
+                self._http_events.append(data)
+
+    def _new_server_cache(self, agent_id: str) -> dict[str, Any]:
+        # Expiry callbacks may run under the cache's own lock, so they only
+        # flag the agent; the snapshot is republished on the next read
+        mark_dirty = lambda *_: self._dirty_agents.add(agent_id)
+        return {
+            "master": ExpireIfIdleDict(ttl=self._master_ttl, on_expire=mark_dirty),
+            "workers": RefreshOnSetCache(ttl=self._worker_ttl, maxlen=self._workers_maxlen,
+                on_expire=mark_dirty, cleanup_interval=self._worker_ttl / 10),
+            "last_index": -1,
+        }
+
+    def _publish_server(self, agent_id: str, cache: dict[str, Any]) -> None:
+        # Called with _workers_lock held
+        self._dirty_agents.discard(agent_id)
+        snapshot = {
+            "master": cache["master"].snapshot(),
+            "workers": cache["workers"].snapshot(),
+        }
+        # A report repeating the last one leaves the version, and readers' copies, as they are
+        if self._server_snapshots.get(agent_id) == snapshot:
+            return
+        self._server_snapshots[agent_id] = snapshot
+        nbytes = approx_size(snapshot, max_depth=4)
+        self._servers_nbytes += nbytes - self._server_nbytes.get(agent_id, 0)
+        self._server_nbytes[agent_id] = nbytes
+        self._servers_version += 1
+
+    def _republish_dirty(self) -> None:
+        if not self._dirty_agents:
+            return
+        with self._workers_lock:
+            for agent_id in list(self._dirty_agents):
+                cache = self._server_state.get(agent_id)
+                if cache is not None:
+                    self._publish_server(agent_id, cache)
+                else:
+                    self._dirty_agents.discard(agent_id)
+
+    def _on_membership_event(self, event: MembershipEvent) -> None:
+        if event.kind != REMOVED:
+            return
+        with self._http_events_lock:
+            self._http_events.remove(event.agent_id)
+        with self._workers_lock:
+            cache = self._server_state.pop(event.agent_id, None)
+            if cache is None:
+                return
+            cache["workers"].stop_auto_cleanup()
+            self._server_snapshots.pop(event.agent_id, None)
+            self._servers_nbytes -= self._server_nbytes.pop(event.agent_id, 0)
+            self._dirty_agents.discard(event.agent_id)
+            self._servers_version += 1
+
+    def enforce_memory_budget(self) -> None:
+        """
+        Trim the rollups to their share of `memory_budget` and hand the rest,
+        net of the server snapshots, to the events buffer.
+
+        Snapshots are sized once, when published, so apart from trimming this
+        costs O(1) whatever the size of the fleet.
+        """
+        budget = self._memory_budget
+        if budget is None:
+            return
+        rollup_limit = int(budget * self._rollup_memory_share)
+        if self._rollups.nbytes > rollup_limit:
+            dropped = self._rollups.trim(rollup_limit)
+            if self._logging_enabled:
+                logger.debug(f"Dropped {dropped} rollup buckets to fit {rollup_limit} bytes")
+        self._republish_dirty()
+        servers = self._servers_nbytes
+        events_budget = max(budget - self._rollups.nbytes - servers, budget // 10)
+        with self._http_events_lock:
+            self._http_events.budget = events_budget
+
+    def _server_nbytes_by_agent(self) -> Dict[str, int]:
+        self._republish_dirty()
+        with self._workers_lock:
+            return dict(self._server_nbytes)
+
+    def memory_usage(self) -> Dict[str, Any]:
+        """
+        Approximate bytes held by the hub state, by structure and by agent.
+
+        Walks every rollup series, and every buffered event without a
+        `memory_budget`, so it is meant for diagnostics rather than polling.
+        """
+        with self._http_events_lock:
+            events = self._http_events.nbytes_by_agent()
+            events_budget = self._http_events.budget
+        structures = {
+            "http_events": events,
+            "rollups": self._rollups.nbytes_by_agent(),
+            "servers": self._server_nbytes_by_agent(),
+        }
+        agents: Dict[str, Dict[str, int]] = {}
+        for structure, usage in structures.items():
+            for agent_id, nbytes in usage.items():
+                agents.setdefault(agent_id, {})[structure] = nbytes
+        totals = {structure: sum(usage.values()) for structure, usage in structures.items()}
+        # Rollup buckets also cost something on their own, beyond their series
+        totals["rollups"] = self._rollups.nbytes
+        return {
+            "budget": self._memory_budget,
+            "http_events_budget": events_budget,
+            "total": sum(totals.values()),
+            "structures": totals,
+            "agents": agents,
+        }
+
+    @property
+    def agents(self) -> AgentRegistry:
+        return self._agents
+
+    @property
+    def servers_version(self) -> int:
+        """
+        Counter bumped whenever any agent's server snapshot is republished.
+        """
+        self._republish_dirty()
+        return self._servers_version
+
+    @property
+    def rollups(self) -> RollupStore:
+        return self._rollups
+
     def elect_leaders(self) -> List[Dict[str, Any]]:
         """
         Perform round-robin election over current live workers.
@@ -75,13 +305,18 @@ class RealtimeState:
             pid of selected worker or None if no candidate found.
         """
         leaders = []
+        servers = self.get_all_servers()
 
-        for agent_id, cache in self._server_state.items():
+        for agent_id in self._agents.live():
+            snapshot = servers.get(agent_id)
+            cache = self._server_state.get(agent_id)
+            if snapshot is None or cache is None:
+                continue
             heartbeat = cache.get("heartbeat", 0)
             cache["heartbeat"] = heartbeat + 1
 
             candidates = []
-            for worker_id, worker in cache.get("workers",{}).items():
+            for worker_id, worker in snapshot["workers"].items():
                 pid = worker.get("pid")
                 if pid:
                     candidates.append(dict(agent_id=agent_id, leader=pid, heartbeat=heartbeat))
@@ -97,33 +332,67 @@ class RealtimeState:
 
         return leaders
 
-    def get_http_events(self, cleancut: bool=False) -> list[dict[str, Any]]:
+    def get_http_events(self) -> list[dict[str, Any]]:
         with self._http_events_lock:
-            http_snapshot = list(self._http_events)
-            if cleancut:
-                self._http_events.clear()
-            return http_snapshot
+            views = self._http_events.views()
+        return merge_views(views)
 
-    def get_server_workers(self, agent_id: str) -> dict[str, dict[str, Any]]:
-        return self._extract_server_state(self._server_state.get(agent_id))
+    def http_event_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Accepted, evicted and buffered HTTP events per agent.
+        """
+        with self._http_events_lock:
+            return self._http_events.stats()
 
-    def _extract_server_state(self, cache) -> dict[str, dict[str, Any]]:
-        return {
-            "master": cache.get("master", {}),
-            "workers": {
-                worker_id: worker_data
-                for worker_id, worker_data in cache.get("workers", {}).items()
-            }
-        } if cache else {}
-
-    def get_all_servers(self) -> dict[str, dict[str, dict[str, Any]]]:
-        return {
-            agent_id: self._extract_server_state(cache)
-            for agent_id, cache in self._server_state.items()
-        }
+    def get_http_events_page(self, since: int = 0, limit: Optional[int] = None
+            ) -> Tuple[list[dict[str, Any]], int]:
+        """
+        Return HTTP events whose cursor is greater than `since`, oldest first.
+
+        Only views of the per-agent buffers are taken under the ingest lock;
+        they are bisected and merged by cursor outside of it.
+
+        Returns:
+            (events, next_since): the page of events and the cursor to pass as
+            `since` on the next call.
+        """
+        with self._http_events_lock:
+            views = self._http_events.views()
+        return page_views(views, since, limit)
+
+    def get_server_workers(self, agent_id: str) -> ServerSnapshot:
+        """
+        Return the published snapshot of one agent. It must not be mutated.
+        """
+        self._republish_dirty()
+        return self._server_snapshots.get(agent_id, {})
+
+    def get_all_servers(self) -> dict[str, ServerSnapshot]:
+        """
+        Return the published snapshots of all agents, keyed by agent_id.
+
+        Snapshots are replaced, never modified, when an agent is updated or one
+        of its entries expires, so the result is a consistent view that costs no
+        copying; it is shared between callers and must not be mutated. The
+        outer mapping is rebuilt only when `servers_version` has moved.
+        """
+        version = self.servers_version
+        published_version, servers = self._published_servers
+        if published_version != version:
+            with self._workers_lock:
+                version = self._servers_version
+                servers = dict(self._server_snapshots)
+                self._published_servers = (version, servers)
+        return servers
 
     def dict(self):
         return {
             "http": self.get_http_events(),
             "server": self.get_all_servers(),
         }
+
+
+def _run_scheduled_enforce(ref: "weakref.ref[RealtimeState]") -> None:
+    state = ref()
+    if state is not None:
+        state.enforce_memory_budget()
@@ -0,0 +1,147 @@
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, Optional, Set, Tuple
+
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+StreamKey = Tuple[Hashable, Hashable]
+
+_COUNTERS = ("received", "lost", "duplicated", "reordered", "resets")
+
+class StreamState:
+    """
+    Sequence bookkeeping of one sender: the highest `seq` seen and the
+    numbers still missing below it, within the reorder window.
+    """
+
+    __slots__ = ("high", "missing", "missing_order", "counts")
+
+    def __init__(self, seq: int):
+        self.high = seq
+        self.missing: Set[int] = set()
+        # Missing numbers in increasing order, pruned lazily
+        self.missing_order: Deque[int] = deque()
+        self.counts = dict.fromkeys(_COUNTERS, 0)
+
+
+class SequenceTracker:
+    """
+    Detect loss, duplication and reordering of agent messages from the
+    per-sender `seq` numbers stamped by MetricsSender.
+
+    Messages are grouped in streams keyed by (agent_id, pid). A jump ahead in
+    `seq` marks the skipped numbers as missing; one that shows up later, while
+    still within `window` numbers of the highest seen, is counted as reordered.
+    Numbers that leave the window still missing are counted as lost, so `lost`
+    only ever grows. A number already seen within the window is a duplicate.
+    A number behind the window that is itself below `window` means the sender
+    restarted (its counter began again at 0), which resets the stream; any
+    other number behind the window is a late arrival, counted as reordered.
+
+    The first message of a stream only sets its starting point: what was sent
+    before the hub (re)started is not counted as lost.
+    """
+
+    def __init__(self, window: int = 1024, max_streams: int = 4096):
+        self._window = window
+        self._max_streams = max_streams
+        self._streams: "OrderedDict[StreamKey, StreamState]" = OrderedDict()
+        # Totals per agent, kept when streams are dropped
+        self._agent_counts: Dict[Hashable, Dict[str, int]] = {}
+
+    def observe(self, agent_id: Hashable, pid: Hashable, seq: int) -> None:
+        key = (agent_id, pid)
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = self._add_stream(key, seq)
+            self._count(agent_id, stream, "received")
+            return
+        self._streams.move_to_end(key)
+        self._count(agent_id, stream, "received")
+
+        high = stream.high
+        if seq == high + 1:
+            stream.high = seq
+        elif seq > high:
+            first_tracked = max(high + 1, seq - self._window + 1)
+            self._count(agent_id, stream, "lost", first_tracked - high - 1)
+            stream.missing.update(range(first_tracked, seq))
+            stream.missing_order.extend(range(first_tracked, seq))
+            stream.high = seq
+        elif seq in stream.missing:
+            stream.missing.discard(seq)
+            self._count(agent_id, stream, "reordered")
+        elif high - seq < self._window:
+            self._count(agent_id, stream, "duplicated")
+        elif seq < self._window:
+            self._count(agent_id, stream, "resets")
+            stream.high = seq
+            self._expire(agent_id, stream, lost_all=True)
+            return
+        else:
+            # Arrived after leaving the window, it stays counted as lost too
+            self._count(agent_id, stream, "reordered")
+        self._expire(agent_id, stream)
+
+    def _add_stream(self, key: StreamKey, seq: int) -> StreamState:
+        while len(self._streams) >= self._max_streams:
+            (agent_id, _), dropped = self._streams.popitem(last=False)
+            self._expire(agent_id, dropped, lost_all=True)
+        stream = self._streams[key] = StreamState(seq)
+        return stream
+
+    def _expire(self, agent_id: Hashable, stream: StreamState, lost_all: bool = False) -> None:
+        order = stream.missing_order
+        floor = stream.high - self._window
+        while order and (lost_all or order[0] <= floor):
+            seq = order.popleft()
+            if seq in stream.missing:
+                stream.missing.discard(seq)
+                self._count(agent_id, stream, "lost")
+
+    def _count(self, agent_id: Hashable, stream: StreamState, name: str, value: int = 1) -> None:
+        if not value:
+            return
+        stream.counts[name] += value
+        totals = self._agent_counts.get(agent_id)
+        if totals is None:
+            totals = self._agent_counts[agent_id] = dict.fromkeys(_COUNTERS, 0)
+        totals[name] += value
+
+    def pending(self) -> Dict[Hashable, int]:
+        """
+        Missing numbers per agent that may still arrive reordered.
+        """
+        result: Dict[Hashable, int] = {}
+        for (agent_id, _), stream in list(self._streams.items()):
+            result[agent_id] = result.get(agent_id, 0) + len(stream.missing)
+        return result
+
+    def stats(self) -> Dict[Hashable, Dict[str, int]]:
+        """
+        Counters per agent: received, lost, duplicated, reordered and resets.
+        """
+        return {agent_id: dict(counts) for agent_id, counts in list(self._agent_counts.items())}
+
+    def stream_stats(self, agent_id: Hashable, pid: Hashable) -> Optional[Dict[str, int]]:
+        stream = self._streams.get((agent_id, pid))
+        return dict(stream.counts, high=stream.high, pending=len(stream.missing)) if stream else None
+
+    def collect(self, prefix: str = "dashcorn_hub"):
+        families = {name: CounterMetricFamily(f"{prefix}_sequence_{name}",
+            documentation, labels=["agent_id"]) for name, documentation in (
+                ("received", "Sequenced messages received per agent"),
+                ("lost", "Sequence numbers never received within the reorder window"),
+                ("duplicated", "Sequence numbers received more than once"),
+                ("reordered", "Sequence numbers received after a greater one"),
+                ("resets", "Sender restarts detected from their sequence going back"),
+            )}
+        for agent_id, counts in self.stats().items():
+            for name, family in families.items():
+                family.add_metric([str(agent_id)], counts[name])
+        yield from families.values()
+
+        pending = GaugeMetricFamily(f"{prefix}_sequence_pending",
+            "Missing sequence numbers that may still arrive reordered", labels=["agent_id"])
+        for agent_id, value in self.pending().items():
+            pending.add_metric([str(agent_id)], value)
+        yield pending
@@ -1,5 +1,6 @@
 import zmq
 import time
+import asyncio
 import logging
 from typing import Optional
 
@@ -59,6 +60,20 @@ class SettingsPublisher:
         except Exception as e:
             logger.warning(f"[{self.__class__.__name__}] Error publishing data via ZMQ: {e}")
 
+    async def publish_async(self, data: dict):
+        """
+        Like `publish()`, but wait out the pre-send delay without blocking the event loop.
+
+        PUB sockets never block on send, so the socket itself is used as is.
+        """
+        await asyncio.sleep(self._delay)
+        try:
+            self._socket.send_json(data)
+            if self._publish_log_enabled:
+                logger.debug(f"[{self.__class__.__name__}] Message: {data} published")
+        except Exception as e:
+            logger.warning(f"[{self.__class__.__name__}] Error publishing data via ZMQ: {e}")
+
     def close(self):
         """Cleanly close the PUB socket."""
         try:
@@ -1,8 +1,10 @@
+import asyncio
 import threading
 import time
 import logging
 from typing import Optional
 
+from dashcorn.dashboard.hub_telemetry import HubTelemetry
 from dashcorn.dashboard.realtime_metrics import RealtimeState
 from dashcorn.dashboard.settings_publisher import SettingsPublisher
 
@@ -13,17 +15,22 @@ class SettingsSelector:
     """
     Run a background thread to periodically elect a leader worker
     and broadcast it via SettingsPublisher.
+
+    `serve()` runs the same rounds as a coroutine for the asyncio hub runtime.
     """
 
     def __init__(self, interval: float = 5.0,
             settings_publisher: Optional[SettingsPublisher] = None,
-            state_store: Optional[RealtimeState] = None):
+            state_store: Optional[RealtimeState] = None,
+            telemetry: Optional[HubTelemetry] = None):
         """
         :param interval: Time (in seconds) between leader elections.
+        :param telemetry: Receives the duration of each election round.
         """
         self._interval = interval
         self._publisher = settings_publisher
         self._state_store = state_store
+        self._telemetry = telemetry
         self._thread: Optional[threading.Thread] = None
         self._stop_event = threading.Event()
 
@@ -32,14 +39,41 @@ class SettingsSelector:
             logger.warning(f"[{self.__class__.__name__}] 'state_store' is None, loop is stopped")
         logger.debug(f"[{self.__class__.__name__}] loop is running...")
         while not self._stop_event.is_set():
-            try:
-                for control_packet in self._state_store.elect_leaders():
-                    self._publisher.publish(control_packet)
-                    logger.debug(f"[{self.__class__.__name__}] Published new packet: {control_packet}")
-            except Exception as e:
-                logger.warning(f"[{self.__class__.__name__}] Leader election failed: {e}")
+            start = time.perf_counter()
+            control_packets = self._elect_leaders()
+            for control_packet in control_packets or ():
+                self._publisher.publish(control_packet)
+                logger.debug(f"[{self.__class__.__name__}] Published new packet: {control_packet}")
+            self._observe_round(start, control_packets)
             time.sleep(self._interval)
 
+    async def serve(self):
+        """Run leader elections on the current event loop until the task is cancelled."""
+        if self._state_store is None:
+            logger.warning(f"[{self.__class__.__name__}] 'state_store' is None, loop is stopped")
+        logger.debug(f"[{self.__class__.__name__}] loop is running (asyncio)...")
+        while True:
+            start = time.perf_counter()
+            control_packets = self._elect_leaders()
+            for control_packet in control_packets or ():
+                await self._publisher.publish_async(control_packet)
+                logger.debug(f"[{self.__class__.__name__}] Published new packet: {control_packet}")
+            self._observe_round(start, control_packets)
+            await asyncio.sleep(self._interval)
+
+    def _elect_leaders(self) -> Optional[list]:
+        """Run one election, None if it failed."""
+        try:
+            return list(self._state_store.elect_leaders())
+        except Exception as e:
+            logger.warning(f"[{self.__class__.__name__}] Leader election failed: {e}")
+            return None
+
+    def _observe_round(self, start: float, control_packets: Optional[list]) -> None:
+        if self._telemetry is not None:
+            self._telemetry.observe_election(time.perf_counter() - start,
+                failed=control_packets is None)
+
     def start(self):
         """Start the background leader election thread."""
         if self._thread and self._thread.is_alive():
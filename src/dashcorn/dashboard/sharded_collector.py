@@ -0,0 +1,309 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import logging
+import multiprocessing
+import time
+
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import zmq
+
+from dashcorn.commons import consts
+from dashcorn.utils.zmq_util import Protocol, renew_zmq_ipc_socket
+
+from .cardinality_limiter import CardinalityLimiter
+from .http_event import InternTable
+from .hub_telemetry import HubTelemetry
+from .metrics_rollup import RollupStore, SeriesKey, SeriesRollup
+from .metrics_schema import MessageRejected, decode_message
+from .prom_metrics_exporter import PromMetricsExporter
+from .realtime_metrics import RealtimeState
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ShardPartial:
+    """
+    What one ingest shard saw since its previous merge.
+    """
+    shard: int
+    received: int = 0
+    rejects: Dict[str, int] = field(default_factory=dict)
+    rollups: List[Tuple[float, Dict[SeriesKey, SeriesRollup]]] = field(default_factory=list)
+    requests: Dict[str, Dict[tuple, Any]] = field(default_factory=dict)
+    events: List[Any] = field(default_factory=list)
+    servers: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class ShardedMetricsCollector:
+    """
+    Ingest metrics with `shards` decoder processes instead of one thread.
+
+    The hub binds the public PULL endpoint and a zmq proxy, which moves frames
+    without holding the GIL, fans them out over a PUSH socket to the shards.
+    Each shard decodes and validates its frames (see `metrics_schema`) and
+    keeps partial aggregates: rollup buckets, Prometheus request series and
+    the latest `max_events_per_merge` raw events. Every `merge_interval`
+    seconds it sends them to the hub, which folds them into the state store
+    and the exporter. Worker status messages are forwarded as they are.
+
+    Only the merge is done under the hub's GIL, so ingest scales with the
+    number of shards as long as the merge stays small next to decoding. The
+    price is that aggregates lag by up to `merge_interval`, and that the
+    events buffer holds a sample of at most `max_events_per_merge` events per
+    shard and interval rather than every event.
+
+    Internal sockets live in a private temporary directory, since merge
+    messages are pickled. A HubTelemetry only gets per-kind and reject counts
+    from the merges; latencies are not measured in the shards.
+    """
+
+    def __init__(self,
+            protocol: Protocol = "tcp",
+            address: Optional[str] = f"*:{consts.ZMQ_CONNECTION_METRICS_PORT}",
+            endpoint: Optional[str] = None,
+            state_store: Optional[RealtimeState] = None,
+            exporter: Optional[PromMetricsExporter] = None,
+            shards: int = 2,
+            merge_interval: float = 0.25,
+            max_events_per_merge: int = 1000,
+            telemetry: Optional[HubTelemetry] = None):
+        self._protocol = protocol
+        self._address = renew_zmq_ipc_socket(address, protocol)
+        self._endpoint = endpoint or f"{self._protocol}://{self._address}"
+        self._state_store = state_store
+        self._exporter = exporter
+        self._shards = shards
+        self._merge_interval = merge_interval
+        self._max_events_per_merge = max_events_per_merge
+        self._received = 0
+        self._rejects: Counter = Counter()
+        self._merges = 0
+        self._telemetry = telemetry
+        self._context: Optional[zmq.Context] = None
+        self._processes: List[multiprocessing.process.BaseProcess] = []
+        self._shard_stop: Optional[Any] = None
+        self._proxy_thread: Optional[threading.Thread] = None
+        self._control_endpoint = f"inproc://dashcorn-ingest-control-{id(self)}"
+        self._control_socket: Optional[zmq.Socket] = None
+        self._merge_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._sock_dir: Optional[str] = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Messages received and rejected (per reason) by all shards, as merged so far.
+        """
+        return {
+            "received": self._received,
+            "rejected": dict(self._rejects),
+            "merges": self._merges,
+            "shards": self._shards,
+        }
+
+    def start(self):
+        if self._merge_thread and self._merge_thread.is_alive():
+            logger.debug(f"[{self.__class__.__name__}] is already running.")
+            return
+        self._stop_event.clear()
+        self._sock_dir = tempfile.mkdtemp(prefix="dashcorn-ingest-")
+        backend = f"ipc://{os.path.join(self._sock_dir, 'backend')}"
+        merges = f"ipc://{os.path.join(self._sock_dir, 'merges')}"
+        self._context = zmq.Context()
+
+        frontend_socket = self._context.socket(zmq.PULL)
+        try:
+            frontend_socket.bind(self._endpoint)
+        except zmq.ZMQError as e:
+            logger.warning(f"[{self.__class__.__name__}] bind error: {e}")
+            frontend_socket.close(linger=0)
+            raise e
+        backend_socket = self._context.socket(zmq.PUSH)
+        backend_socket.bind(backend)
+        control_socket = self._context.socket(zmq.PAIR)
+        control_socket.bind(self._control_endpoint)
+        merge_socket = self._context.socket(zmq.PULL)
+        merge_socket.bind(merges)
+
+        spawn = multiprocessing.get_context("spawn")
+        self._shard_stop = spawn.Event()
+        rollups = self._state_store.rollups if self._state_store else RollupStore()
+        self._processes = [
+            spawn.Process(target=run_shard, name=f"dashcorn-ingest-{shard}", daemon=True, kwargs=dict(
+                shard=shard,
+                backend=backend,
+                merges=merges,
+                stop_event=self._shard_stop,
+                merge_interval=self._merge_interval,
+                max_events=self._max_events_per_merge,
+                resolution=rollups.resolution,
+                retention=rollups.retention,
+                scale=rollups.scale,
+                buckets=self._exporter.buckets if self._exporter else None,
+            ))
+            for shard in range(self._shards)
+        ]
+        for process in self._processes:
+            process.start()
+
+        self._proxy_thread = threading.Thread(target=self._run_proxy,
+            args=(frontend_socket, backend_socket), daemon=True)
+        self._proxy_thread.start()
+        self._control_socket = control_socket
+        self._merge_thread = threading.Thread(target=self._run_merge_loop,
+            args=(merge_socket,), daemon=True)
+        self._merge_thread.start()
+        logger.debug(f"[{self.__class__.__name__}] Listening on {self._endpoint} "
+            f"with {self._shards} shards...")
+
+    def _run_proxy(self, frontend_socket: zmq.Socket, backend_socket: zmq.Socket):
+        control = self._context.socket(zmq.PAIR)
+        control.connect(self._control_endpoint)
+        try:
+            zmq.proxy_steerable(frontend_socket, backend_socket, None, control)
+        except zmq.ZMQError as e:
+            logger.debug(f"[{self.__class__.__name__}] proxy exited: {e}")
+        finally:
+            control.close(linger=0)
+            frontend_socket.close(linger=0)
+            backend_socket.close(linger=0)
+
+    def _run_merge_loop(self, merge_socket: zmq.Socket):
+        try:
+            # Keep draining after stop until every shard sent its final merge
+            while True:
+                stopped = self._stop_event.is_set() and not any(p.is_alive() for p in self._processes)
+                if not merge_socket.poll(0 if stopped else 100):
+                    if stopped:
+                        break
+                    continue
+                try:
+                    self.merge(pickle.loads(merge_socket.recv(copy=False).buffer))
+                except Exception as e:
+                    logger.warning(f"[{self.__class__.__name__}] Error while merging shard data: {e}")
+        finally:
+            merge_socket.close(linger=0)
+
+    def merge(self, partial: ShardPartial) -> None:
+        """
+        Fold one shard's partial aggregates into the state store and exporter.
+        """
+        self._merges += 1
+        self._received += partial.received
+        self._rejects.update(partial.rejects)
+        store = self._state_store
+        if store is not None:
+            for start, series in partial.rollups:
+                for key, rollup in series.items():
+                    store.rollups.merge(start, key, rollup)
+            if partial.events:
+                store.append_http_events(partial.events)
+            for msg in partial.servers:
+                store.update("server", msg)
+        if self._exporter is not None and partial.requests:
+            self._exporter.merge(partial.requests)
+        if self._telemetry is not None:
+            rejected = sum(partial.rejects.values())
+            self._telemetry.record_messages("http", partial.received - rejected - len(partial.servers))
+            self._telemetry.record_messages("server", len(partial.servers))
+            for reason, count in partial.rejects.items():
+                self._telemetry.record_reject(reason, count)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._shard_stop is not None:
+            self._shard_stop.set()
+        for process in self._processes:
+            process.join(timeout=self._merge_interval + 5)
+            if process.is_alive():
+                process.terminate()
+        if self._merge_thread:
+            self._merge_thread.join(timeout=2)
+        if self._proxy_thread:
+            self._control_socket.send(b"TERMINATE")
+            self._proxy_thread.join(timeout=2)
+            self._control_socket.close(linger=0)
+            self._control_socket = None
+        if self._context:
+            self._context.term()
+            self._context = None
+        if self._sock_dir:
+            shutil.rmtree(self._sock_dir, ignore_errors=True)
+            self._sock_dir = None
+        self._processes = []
+        logger.debug(f"[{self.__class__.__name__}] stopped.")
+
+    def restart(self):
+        self.stop()
+        time.sleep(0.5)
+        self.start()
+
+
+def run_shard(shard: int, backend: str, merges: str, stop_event: Any,
+        merge_interval: float = 0.25,
+        max_events: int = 1000,
+        resolution: float = 1.0,
+        retention: float = 900.0,
+        scale: int = 3,
+        buckets: Optional[Sequence[float]] = None) -> None:
+    """
+    Body of an ingest shard process: decode frames from `backend` and push a
+    ShardPartial to `merges` every `merge_interval` seconds until `stop_event`.
+    """
+    context = zmq.Context()
+    pull = context.socket(zmq.PULL)
+    pull.connect(backend)
+    push = context.socket(zmq.PUSH)
+    push.connect(merges)
+
+    strings = InternTable()
+    rollups = RollupStore(resolution=resolution, retention=retention, scale=scale)
+    # Label budgets are applied by the hub when merging
+    exporter = PromMetricsExporter(None, buckets=buckets,
+        cardinality_limiter=CardinalityLimiter({}))
+    events: deque = deque(maxlen=max_events)
+    partial = ShardPartial(shard)
+    rejects: Counter = Counter()
+    now = time.monotonic()
+    next_merge = now + merge_interval
+    try:
+        while True:
+            if pull.poll(max(0, int((next_merge - now) * 1000))):
+                frame = pull.recv(copy=False)
+                partial.received += 1
+                try:
+                    kind, data = decode_message(frame.buffer, strings)
+                except MessageRejected as e:
+                    rejects[e.reason] += 1
+                    kind = None
+                if kind == "http":
+                    rollups.observe(data)
+                    exporter.observe(data)
+                    events.append(data)
+                elif kind == "server":
+                    partial.servers.append(data)
+            now = time.monotonic()
+            if now < next_merge:
+                continue
+            if partial.received:
+                partial.rejects = dict(rejects)
+                partial.rollups = [(bucket.start, bucket.series) for bucket in rollups.drain()]
+                partial.requests = exporter.drain()
+                partial.events = list(events)
+                push.send(pickle.dumps(partial, protocol=pickle.HIGHEST_PROTOCOL))
+                partial = ShardPartial(shard)
+                rejects.clear()
+                events.clear()
+            next_merge = now + merge_interval
+            # Checked once per interval, as it takes a cross-process lock
+            if stop_event.is_set():
+                break
+    finally:
+        pull.close(linger=0)
+        push.close(linger=1000)
+        context.term()
@@ -0,0 +1,94 @@
+import asyncio
+import signal
+import logging
+
+from typing import List, Protocol, Sequence, Set
+
+logger = logging.getLogger(__name__)
+
+class AsyncService(Protocol):
+    async def serve(self) -> None: ...
+
+
+class AsyncHubRuntime:
+    """
+    Run the hub's service loops as tasks on one asyncio event loop.
+
+    Each service exposes a `serve()` coroutine that runs until cancelled (the
+    metrics collector, the settings selector, the process manager). Their
+    sockets are zmq.asyncio sockets woken by the loop, so an idle hub does not
+    spin one polling thread per component, and `stop()` cancels every task and
+    waits for its sockets to close before returning.
+
+    A service whose `serve()` fails (e.g. its address is already bound) is
+    logged and left stopped, as a crashed thread would be.
+    """
+
+    def __init__(self, services: Sequence[AsyncService], stop_timeout: float = 5.0):
+        self._services = list(services)
+        self._stop_timeout = stop_timeout
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def services(self) -> List[AsyncService]:
+        return list(self._services)
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def start(self) -> None:
+        if self.running:
+            logger.debug(f"[{self.__class__.__name__}] is already running.")
+            return
+        loop = asyncio.get_running_loop()
+        self._tasks = set()
+        for service in self._services:
+            task = loop.create_task(service.serve(), name=service.__class__.__name__)
+            task.add_done_callback(self._on_task_done)
+            self._tasks.add(task)
+        # Let every service bind its sockets before the caller goes on
+        await asyncio.sleep(0)
+        logger.debug(f"[{self.__class__.__name__}] started {len(self._tasks)} services.")
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, set()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=self._stop_timeout)
+            for task in pending:
+                logger.warning(f"[{self.__class__.__name__}] {task.get_name()} did not stop "
+                    f"within {self._stop_timeout}s.")
+        logger.debug(f"[{self.__class__.__name__}] stopped.")
+
+    async def restart(self) -> None:
+        await self.stop()
+        await self.start()
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        e = task.exception()
+        if e is not None:
+            logger.warning(f"[{self.__class__.__name__}] {task.get_name()} failed: {e!r}")
+
+
+async def wait_for_signal(signals: Sequence[int] = (signal.SIGTERM, signal.SIGINT)) -> int:
+    """
+    Wait on the running loop until one of `signals` is received, and return it.
+    """
+    loop = asyncio.get_running_loop()
+    received: asyncio.Future = loop.create_future()
+
+    def _handle(signum: int) -> None:
+        if not received.done():
+            received.set_result(signum)
+
+    for signum in signals:
+        loop.add_signal_handler(signum, _handle, signum)
+    try:
+        return await received
+    finally:
+        for signum in signals:
+            loop.remove_signal_handler(signum)
@@ -1,10 +1,32 @@
-from .hooks import start_threads, stop_threads
+import asyncio
+import logging
+
+from .async_runtime import wait_for_signal
+from .hooks import async_runtime, start_hub, stop_hub, start_threads, stop_threads
 from ..dashboard.lifecycle_service import LifecycleService
 
-service = LifecycleService(
-    on_startup=[start_threads],
-    on_shutdown=[stop_threads],
-    self_managed=True,
-)
+logger = logging.getLogger(__name__)
+
+async def serve_until_signal():
+    await start_hub()
+    try:
+        await wait_for_signal()
+    finally:
+        await stop_hub()
+
+if async_runtime is None:
+    service = LifecycleService(
+        on_startup=[start_threads],
+        on_shutdown=[stop_threads],
+        self_managed=True,
+    )
 
-service.start()
+    service.start()
+elif LifecycleService.is_pid_alive():
+    logger.warning("[dashcorn] Hub daemon already running. Aborting startup.")
+else:
+    LifecycleService.write_pid_file()
+    try:
+        asyncio.run(serve_until_signal())
+    finally:
+        LifecycleService.remove_pid_file()
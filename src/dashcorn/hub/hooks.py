@@ -1,19 +1,38 @@
 from dashcorn.dashboard.config import DashboardConfig
 from dashcorn.dashboard.realtime_metrics import RealtimeState
+from dashcorn.dashboard.fair_event_buffer import parse_weights
+from dashcorn.utils.memory_util import parse_bytes
 from dashcorn.dashboard.settings_selector import SettingsSelector
 from dashcorn.dashboard.settings_publisher import SettingsPublisher
 from dashcorn.dashboard.metrics_collector import MetricsCollector
+from dashcorn.dashboard.sharded_collector import ShardedMetricsCollector
 
+from dashcorn.dashboard.histogram_buckets import parse_buckets
+from dashcorn.dashboard.hub_telemetry import HubTelemetry
 from dashcorn.dashboard.prom_metrics_exporter import PromMetricsExporter
-from dashcorn.dashboard.prom_metrics_scheduler import PromMetricsScheduler
 from dashcorn.dashboard.prom_metrics_server import PromMetricsServer
+from dashcorn.dashboard.prom_remote_writer import PromRemoteWriter
+from dashcorn.dashboard.otlp_exporter import OtlpMetricsExporter
 
 from dashcorn.dashboard.process_executor import ProcessExecutor
 from dashcorn.dashboard.process_manager import ProcessManager
 
+from dashcorn.hub.async_runtime import AsyncHubRuntime
+
 config = DashboardConfig()
 
-store = RealtimeState()
+store = RealtimeState(
+    http_events_maxlen=config.http_events_budget,
+    http_event_weights=parse_weights(config.http_event_weights),
+    memory_budget=parse_bytes(config.hub_memory_budget),
+    agent_report_interval=config.agent_report_interval,
+    agent_stale_after_reports=config.agent_stale_after_reports,
+)
+
+prom_metrics_exporter = PromMetricsExporter(lambda: store,
+    buckets=parse_buckets(config.prom_histogram_buckets),
+)
+hub_telemetry = HubTelemetry(exporter=prom_metrics_exporter)
 
 settings_publisher = SettingsPublisher(
     protocol=config.zmq_pub_control_protocol,
@@ -22,33 +41,84 @@ settings_publisher = SettingsPublisher(
 settings_selector = SettingsSelector(state_store=store,
     settings_publisher=settings_publisher,
     interval=config.leader_rotation_interval,
-)
-metrics_collector = MetricsCollector(state_store=store,
-    protocol=config.zmq_pull_metrics_protocol,
-    address=config.zmq_pull_metrics_address,
+    telemetry=hub_telemetry,
 )
 
-prom_metrics_exporter = PromMetricsExporter(lambda: store)
-prom_metrics_scheduler = PromMetricsScheduler(prom_metrics_exporter)
+if config.ingest_shards > 0:
+    # Shards merge request series into the exporter themselves
+    metrics_collector = ShardedMetricsCollector(state_store=store,
+        exporter=prom_metrics_exporter,
+        shards=config.ingest_shards,
+        protocol=config.zmq_pull_metrics_protocol,
+        address=config.zmq_pull_metrics_address,
+        telemetry=hub_telemetry,
+    )
+else:
+    metrics_collector = MetricsCollector(state_store=store,
+        protocol=config.zmq_pull_metrics_protocol,
+        address=config.zmq_pull_metrics_address,
+        telemetry=hub_telemetry,
+    )
+    store.add_http_listener(prom_metrics_exporter.observe)
 prom_metrics_server = PromMetricsServer(prom_metrics_exporter)
+prom_metrics_server.registry.register(hub_telemetry)
+prom_remote_writer = PromRemoteWriter(prom_metrics_server,
+    url=config.prom_remote_write_url,
+    interval=config.prom_remote_write_interval,
+) if config.prom_remote_write_url else None
+otlp_metrics_exporter = OtlpMetricsExporter(store.rollups,
+    endpoint=config.otlp_metrics_endpoint,
+    interval=config.otlp_export_interval,
+) if config.otlp_metrics_endpoint else None
 
 process_executor = ProcessExecutor()
 process_manager = ProcessManager(
     process_executor=process_executor,
 )
 
+# The sharded collector's proxy and merge threads stay threads in either runtime
+async_runtime = AsyncHubRuntime([process_manager, settings_selector]
+    + ([] if config.ingest_shards > 0 else [metrics_collector])
+) if config.hub_runtime == "asyncio" else None
+
+def _threaded(component) -> bool:
+    return async_runtime is None or component not in async_runtime.services
+
 def start_threads():
-    process_manager.start()
+    if _threaded(process_manager):
+        process_manager.start()
     prom_metrics_server.start()
-    prom_metrics_scheduler.start()
-    metrics_collector.start()
-    settings_selector.start()
+    if prom_remote_writer:
+        prom_remote_writer.start()
+    if otlp_metrics_exporter:
+        otlp_metrics_exporter.start()
+    if _threaded(metrics_collector):
+        metrics_collector.start()
+    if _threaded(settings_selector):
+        settings_selector.start()
     settings_publisher.open()
 
 def stop_threads():
     settings_publisher.close()
-    settings_selector.stop()
-    metrics_collector.stop()
-    prom_metrics_scheduler.stop()
+    if _threaded(settings_selector):
+        settings_selector.stop()
+    if _threaded(metrics_collector):
+        metrics_collector.stop()
+    if otlp_metrics_exporter:
+        otlp_metrics_exporter.stop()
+    if prom_remote_writer:
+        prom_remote_writer.stop()
     prom_metrics_server.stop()
-    process_manager.stop()
+    if _threaded(process_manager):
+        process_manager.stop()
+
+async def start_hub():
+    start_threads()
+    if async_runtime:
+        await async_runtime.start()
+
+async def stop_hub():
+    # Cancel the coroutines first, they publish through sockets closed below
+    if async_runtime:
+        await async_runtime.stop()
+    stop_threads()
@@ -1,18 +1,153 @@
-from fastapi import FastAPI
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 
 import dashcorn.utils.logging
 
-from dashcorn.hub.hooks import store, start_threads, stop_threads
+from dashcorn.dashboard.metrics_broadcaster import MetricsBroadcaster
+from dashcorn.dashboard.metrics_query import MetricsQuery, MetricsQueryEngine
+from dashcorn.hub.hooks import store, prom_metrics_server, start_hub, stop_hub
+from dashcorn.utils import json_util
+
+NDJSON_BATCH_SIZE = 500
+
+broadcaster = MetricsBroadcaster(store)
 
 app = FastAPI(
-    on_startup=[start_threads],
-    on_shutdown=[stop_threads],
+    on_startup=[start_hub],
+    on_shutdown=[stop_hub, broadcaster.stop],
 )
 
+query_engine = MetricsQueryEngine(store.rollups)
+
 @app.get("/metrics")
-def get_metrics():
-    return store.dict()
+def get_metrics(
+    since: Optional[int] = Query(None, ge=0, description="Only return events with a greater cursor"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of events to return"),
+):
+    if since is None and limit is None:
+        return Response(json_util.dumps(store.dict()), media_type="application/json")
+
+    events, next_since = store.get_http_events_page(since=since or 0, limit=limit)
+    return Response(json_util.dumps({
+        "http": events,
+        "next_since": next_since,
+        "server": store.get_all_servers(),
+    }), media_type="application/json")
+
+@app.get("/agents")
+def get_agents(
+    since: int = Query(0, ge=0, description="Only return membership events with a greater seq"),
+):
+    events, next_since = store.agents.events(since=since)
+    return Response(json_util.dumps({
+        "agents": [record.to_dict() for record in store.agents.records()],
+        "counts": store.agents.counts(),
+        "events": [event.to_dict() for event in events],
+        "next_since": next_since,
+    }), media_type="application/json")
+
+@app.get("/debug/memory")
+def get_memory_usage():
+    return Response(json_util.dumps(store.memory_usage()), media_type="application/json")
+
+@app.get("/metrics/stream")
+def stream_metrics(
+    since: int = Query(0, ge=0, description="Only stream events with a greater cursor"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of events to stream"),
+):
+    events, next_since = store.get_http_events_page(since=since, limit=limit)
+
+    def ndjson_lines():
+        for i in range(0, len(events), NDJSON_BATCH_SIZE):
+            yield b"".join(json_util.dumps(event) + b"\n"
+                for event in events[i:i + NDJSON_BATCH_SIZE])
+
+    return StreamingResponse(ndjson_lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Dashcorn-Next-Since": str(next_since)},
+    )
+
+@app.get("/prometheus")
+def prometheus_scrape(request: Request):
+    body, headers = prom_metrics_server.scrape(
+        request.headers.get("accept"),
+        request.headers.get("accept-encoding"),
+    )
+    return Response(body, headers=dict(headers))
+
+@app.get("/query")
+def query_metrics(
+    start: float = Query(-60.0, description="Range start (epoch seconds, or negative offset from now)"),
+    end: Optional[float] = Query(None, description="Range end (epoch seconds, or negative offset from now)"),
+    agent_id: Optional[str] = None,
+    method: Optional[str] = None,
+    path: Optional[str] = Query(None, description="Exact path, or prefix ending with '*'"),
+    status_class: Optional[str] = Query(None, description="e.g. 2xx, 4xx, 5xx"),
+    group_by: Optional[str] = Query(None, description="Comma-separated dimensions"),
+    aggs: Optional[str] = Query(None, description="Comma-separated aggregations"),
+):
+    query = MetricsQuery(
+        start=start,
+        end=end,
+        agent_id=agent_id,
+        method=method,
+        path=path,
+        status_class=status_class,
+        group_by=_split_csv(group_by),
+    )
+    if aggs:
+        query.aggs = _split_csv(aggs)
+    try:
+        return query_engine.execute(query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.websocket("/stream/ws")
+async def stream_ws(websocket: WebSocket,
+    agent_id: Optional[str] = None,
+    path: Optional[str] = None,
+):
+    await websocket.accept()
+    subscriber = broadcaster.subscribe(agent_id=agent_id, path=path)
+    try:
+        while True:
+            frame = await subscriber.queue.get()
+            if subscriber.closed:
+                await websocket.close(code=1013, reason="Client too slow")
+                break
+            await websocket.send_bytes(json_util.dumps(frame))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+@app.get("/stream/sse")
+async def stream_sse(
+    agent_id: Optional[str] = None,
+    path: Optional[str] = None,
+):
+    subscriber = broadcaster.subscribe(agent_id=agent_id, path=path)
+
+    async def events():
+        try:
+            while True:
+                frame = await subscriber.queue.get()
+                if subscriber.closed:
+                    break
+                yield b"data: " + json_util.dumps(frame) + b"\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
 
 @app.get("/")
 def root():
     return {"status": "Dashcorn dashboard running"}
+
+def _split_csv(value: Optional[str]) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()] if value else []
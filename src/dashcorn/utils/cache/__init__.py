@@ -1,3 +1,4 @@
 from .expire_if_idle_dict import ExpireIfIdleDict
-from .expiring_deque import ExpiringDeque
+from .expiring_deque import DequeView, ExpiringDeque
 from .refresh_on_set_cache import RefreshOnSetCache
+from .timing_wheel import TimingWheel, get_timing_wheel
@@ -1,34 +1,104 @@
 import time
+import weakref
+import threading
+import logging
 from collections.abc import MutableMapping
-from typing import Any, Iterator
+from typing import Any, Callable, Iterator, Optional
+
+from .timing_wheel import TimerHandle, get_timing_wheel
+
+logger = logging.getLogger(__name__)
+
+IdleExpireCallback = Optional[Callable[[dict], None]]
 
 class ExpireIfIdleDict(MutableMapping):
-    def __init__(self, ttl: float = 60.0):
+    """
+    A dict that drops all of its items once it has not been written for `ttl`.
+
+    Expiry is checked lazily on access. With `on_expire`, the dict also
+    registers its idle deadline with the shared timing wheel, and the callback
+    receives the dropped items as soon as the deadline passes.
+    """
+
+    def __init__(self, ttl: float = 60.0, on_expire: IdleExpireCallback = None):
         self._store: dict[Any, Any] = {}
         self._ttl = ttl
         self._last_write = time.monotonic()
+        self._on_expire = on_expire
+        self._lock = threading.Lock()
+        self._expiry_timer: Optional[TimerHandle] = None
 
     def _touch(self):
+        # Called with _lock held
         self._last_write = time.monotonic()
+        if self._on_expire and self._expiry_timer is None:
+            ref = weakref.ref(self)
+            self._expiry_timer = get_timing_wheel().schedule(
+                self._ttl, lambda: _run_scheduled_expiry(ref))
+
+    def _take_if_idle(self) -> Optional[dict]:
+        # Called with _lock held; returns the expired items, if any
+        if time.monotonic() - self._last_write >= self._ttl and self._store:
+            expired, self._store = self._store, {}
+            return expired
+        return None
+
+    def _notify(self, expired: Optional[dict]) -> None:
+        if expired and self._on_expire:
+            try:
+                self._on_expire(expired)
+            except Exception as e:
+                logger.warning(f"[{self.__class__.__name__}] on_expire callback failed: {e}")
 
     def _maybe_expire(self):
-        if time.monotonic() - self._last_write >= self._ttl:
-            self._store.clear()
+        with self._lock:
+            expired = self._take_if_idle()
+        self._notify(expired)
+
+    def _scheduled_expiry(self) -> None:
+        with self._lock:
+            self._expiry_timer = None
+            expired = self._take_if_idle()
+            if expired is None and self._store:
+                # Written since the timer was armed, wait for the new deadline
+                ref = weakref.ref(self)
+                self._expiry_timer = get_timing_wheel().schedule(
+                    self._last_write + self._ttl - time.monotonic(),
+                    lambda: _run_scheduled_expiry(ref))
+        self._notify(expired)
+
+    def snapshot(self) -> dict:
+        """
+        The items as a plain dict, copied under the lock.
+        """
+        with self._lock:
+            expired = self._take_if_idle()
+            items = dict(self._store)
+        self._notify(expired)
+        return items
 
     # --- MutableMapping interface ---
     def __setitem__(self, key: Any, value: Any) -> None:
-        self._maybe_expire()
-        self._store[key] = value
-        self._touch()
+        with self._lock:
+            expired = self._take_if_idle()
+            self._store[key] = value
+            self._touch()
+        self._notify(expired)
 
     def __getitem__(self, key: Any) -> Any:
         self._maybe_expire()
         return self._store[key]
 
     def __delitem__(self, key: Any) -> None:
-        self._maybe_expire()
-        del self._store[key]
-        self._touch()
+        with self._lock:
+            expired = self._take_if_idle()
+            found = key in self._store
+            if found:
+                del self._store[key]
+                self._touch()
+        self._notify(expired)
+        if not found:
+            raise KeyError(key)
 
     def __iter__(self) -> Iterator:
         self._maybe_expire()
@@ -39,14 +109,23 @@ class ExpireIfIdleDict(MutableMapping):
         return len(self._store)
 
     def clear(self) -> None:
-        self._store.clear()
-        self._touch()
+        with self._lock:
+            self._store = {}
+            self._touch()
 
     def update(self, *args, **kwargs) -> None:
-        self._maybe_expire()
-        self._store.update(*args, **kwargs)
-        self._touch()
+        with self._lock:
+            expired = self._take_if_idle()
+            self._store.update(*args, **kwargs)
+            self._touch()
+        self._notify(expired)
 
     def __repr__(self) -> str:
         self._maybe_expire()
         return f"{self.__class__.__name__}({self._store})"
+
+
+def _run_scheduled_expiry(ref: "weakref.ref[ExpireIfIdleDict]") -> None:
+    d = ref()
+    if d is not None:
+        d._scheduled_expiry()
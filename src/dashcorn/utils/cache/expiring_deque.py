@@ -1,64 +1,321 @@
+from bisect import bisect_right
 from collections import deque
-from typing import Generic, TypeVar, Deque, List, Optional
+from collections.abc import Sequence
+from itertools import islice
+from typing import Callable, Generic, Iterator, TypeVar, Deque, List, Optional, Tuple
 import time
+import weakref
+import threading
+import logging
+
+from .timing_wheel import TimerHandle, get_timing_wheel
+
+logger = logging.getLogger(__name__)
 
 T = TypeVar("T")
 
+CHUNK_SIZE = 256
+
+class _Chunk:
+    """
+    Items appended within a short time window, sharing their timestamps.
+    """
+
+    __slots__ = ("opened", "stamp", "items")
+
+    def __init__(self, now: float):
+        self.opened = now
+        self.stamp = now  # time of the most recent append, drives expiry
+        self.items: List = []
+
+
+class DequeView(Sequence, Generic[T]):
+    """
+    Read-only view of an ExpiringDeque at the time it was taken.
+
+    It references the deque's chunks instead of copying items, so taking it
+    costs O(number of chunks). Later appends and expiries do not change it.
+    """
+
+    __slots__ = ("_parts", "_offsets", "_len")
+
+    def __init__(self, parts: List[Tuple[List[T], int, int]]):
+        self._parts = parts
+        self._offsets: List[int] = []
+        total = 0
+        for _, start, stop in parts:
+            self._offsets.append(total)
+            total += stop - start
+        self._len = total
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[T]:
+        for items, start, stop in self._parts:
+            yield from islice(items, start, stop)
+
+    def iter_from(self, start: int) -> Iterator[T]:
+        """
+        Iterate the items from index `start` on without walking the ones before.
+        """
+        start = max(start, 0)
+        if start >= self._len:
+            return
+        part = bisect_right(self._offsets, start) - 1
+        skip = start - self._offsets[part]
+        for items, begin, stop in islice(self._parts, part, None):
+            yield from islice(items, begin + skip, stop)
+            skip = 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._len))]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("DequeView index out of range")
+        part = bisect_right(self._offsets, index) - 1
+        items, start, _ = self._parts[part]
+        return items[start + index - self._offsets[part]]
+
+    def __repr__(self) -> str:
+        return f"<DequeView size={self._len}>"
+
+
 class ExpiringDeque(Generic[T]):
     """
     A FIFO queue that holds items only for a limited amount of time (TTL).
     Once TTL has passed since insertion, items are automatically purged on access.
+
+    Items are stored in chunks of up to CHUNK_SIZE that were filled within
+    `ttl / 64` seconds of each other. A chunk keeps a single timestamp, its
+    latest append, and expires as a whole, so an item may outlive its TTL by
+    at most that window. Readers get a DequeView over the chunks instead of
+    a copy.
+
+    With `on_expire`, the deque also registers the expiry of its oldest chunk
+    with the shared timing wheel, and the callback receives each batch of
+    purged items without waiting for the next access.
+
+    With `sizeof`, the deque keeps the running total of `sizeof(item)` over its
+    live items as `cost`. Items must not change size while queued.
     """
 
-    def __init__(self, ttl: Optional[float] = None, maxlen: Optional[int] = None):
+    def __init__(self, ttl: Optional[float] = None, maxlen: Optional[int] = None,
+            on_expire: Optional[Callable[[List[T]], None]] = None,
+            sizeof: Optional[Callable[[T], int]] = None):
         """
         Args:
             ttl (float): Time-to-live in seconds for each item
+            on_expire: Called with the items purged because of their TTL
+            sizeof: Cost of an item, summed up by `cost`
         """
         self.ttl = ttl
         self.maxlen = maxlen
-        self._data: Deque[tuple[float, T]] = deque()
+        self._granularity = ttl / 64 if ttl else float("inf")
+        self._chunks: Deque[_Chunk] = deque()
+        self._head = 0  # index of the first live item in the first chunk
+        self._size = 0
+        self._sizeof = sizeof
+        self._cost = 0
+        self._on_expire = on_expire
+        self._lock = threading.Lock()
+        self._expiry_timer: Optional[TimerHandle] = None
 
     def append(self, item: T) -> None:
         """
         Add a new item to the queue.
         """
-        self._expire_old()
-        self._data.append((time.monotonic(), item))
-        if self.maxlen and len(self._data) > self.maxlen:
-            self._data.popleft()
+        expired = None
+        with self._lock:
+            now = time.monotonic()
+            chunks = self._chunks
+            if chunks and self.ttl is not None and now - chunks[0].stamp > self.ttl:
+                expired = self._expire_old(now)
+            tail = chunks[-1] if chunks else None
+            if (tail is None
+                    or len(tail.items) >= CHUNK_SIZE
+                    or now - tail.opened > self._granularity):
+                tail = _Chunk(now)
+                chunks.append(tail)
+            tail.items.append(item)
+            tail.stamp = now
+            self._size += 1
+            if self._sizeof is not None:
+                self._cost += self._sizeof(item)
+            if self.maxlen and self._size > self.maxlen:
+                self._drop_first()
+            if self._on_expire is not None:
+                self._arm_expiry()
+        if expired:
+            self._notify(expired)
 
     def appendleft(self, item: T):
-        self._expire_old()
-        self._data.appendleft((time.monotonic(), item))
-        if self.maxlen and len(self._data) > self.maxlen:
-            self._data.pop()
+        with self._lock:
+            now = time.monotonic()
+            expired = self._expire_old(now)
+            if self._chunks and self._head:
+                # Reuse a slot before the head, on a copy: views taken before
+                # the slot was dropped still cover it
+                self._head -= 1
+                head = self._chunks[0]
+                head.items = list(head.items)
+                head.items[self._head] = item
+                head.stamp = max(head.stamp, now)
+            else:
+                chunk = _Chunk(now)
+                chunk.items.append(item)
+                self._chunks.appendleft(chunk)
+                self._head = 0
+            self._size += 1
+            if self._sizeof is not None:
+                self._cost += self._sizeof(item)
+            if self.maxlen and self._size > self.maxlen:
+                self._drop_last()
+            self._arm_expiry()
+        self._notify(expired)
+
+    def discard_oldest(self, count: int = 1) -> int:
+        """
+        Drop up to `count` of the oldest items before their TTL.
 
-    def _expire_old(self) -> None:
+        Returns:
+            Number of items dropped.
+        """
+        dropped = 0
+        with self._lock:
+            while dropped < count and self._chunks:
+                items = self._chunks[0].items
+                take = min(count - dropped, len(items) - self._head)
+                if self._sizeof is not None:
+                    self._cost -= sum(map(self._sizeof, islice(items, self._head, self._head + take)))
+                self._head += take
+                self._size -= take
+                dropped += take
+                if self._head == len(items):
+                    self._chunks.popleft()
+                    self._head = 0
+        return dropped
+
+    def _drop_first(self) -> None:
+        if self._sizeof is not None:
+            self._cost -= self._sizeof(self._chunks[0].items[self._head])
+        self._head += 1
+        self._size -= 1
+        if self._head == len(self._chunks[0].items):
+            self._chunks.popleft()
+            self._head = 0
+
+    def _drop_last(self) -> None:
+        tail = self._chunks[-1]
+        if self._sizeof is not None:
+            self._cost -= self._sizeof(tail.items[-1])
+        # Copy rather than pop in place, views may still cover the last slot
+        tail.items = tail.items[:-1]
+        self._size -= 1
+        if len(self._chunks) == 1 and len(tail.items) == self._head:
+            self._chunks.clear()
+            self._head = 0
+        elif not tail.items:
+            self._chunks.pop()
+
+    def _expire_old(self, now: Optional[float] = None) -> Optional[List[T]]:
+        # Called with _lock held; returns the purged items if there is a callback
         if self.ttl is None:
+            return None
+        now = time.monotonic() if now is None else now
+        chunks = self._chunks
+        expired = [] if self._on_expire is not None else None
+        while chunks and now - chunks[0].stamp > self.ttl:
+            chunk = chunks.popleft()
+            if expired is not None:
+                expired.extend(islice(chunk.items, self._head, None))
+            if self._sizeof is not None:
+                self._cost -= sum(map(self._sizeof, islice(chunk.items, self._head, None)))
+            self._size -= len(chunk.items) - self._head
+            self._head = 0
+        return expired
+
+    def _purge(self) -> None:
+        with self._lock:
+            expired = self._expire_old()
+        self._notify(expired)
+
+    def _notify(self, expired: Optional[List[T]]) -> None:
+        if expired and self._on_expire:
+            try:
+                self._on_expire(expired)
+            except Exception as e:
+                logger.warning(f"[{self.__class__.__name__}] on_expire callback failed: {e}")
+
+    def _arm_expiry(self) -> None:
+        # Called with _lock held
+        if self._on_expire is None or self.ttl is None or self._expiry_timer is not None:
+            return
+        if not self._chunks:
             return
-        now = time.monotonic()
-        while self._data and (now - self._data[0][0] > self.ttl):
-            self._data.popleft()
+        ref = weakref.ref(self)
+        delay = self._chunks[0].stamp + self.ttl - time.monotonic()
+        self._expiry_timer = get_timing_wheel().schedule(delay, lambda: _run_scheduled_expiry(ref))
+
+    def _scheduled_expiry(self) -> None:
+        with self._lock:
+            self._expiry_timer = None
+            expired = self._expire_old()
+            self._arm_expiry()
+        self._notify(expired)
 
     def get_items(self) -> List[T]:
         """
         Get a list of items that are still within TTL.
         """
-        self._expire_old()
-        return [item for _, item in self._data]
+        return list(self.snapshot())
+
+    def snapshot(self) -> DequeView[T]:
+        """
+        Get a read-only view of the live items.
+
+        Taking the view costs O(number of chunks) and copies no items, so it is
+        cheap enough to take while holding a lock that guards concurrent appends.
+        """
+        with self._lock:
+            expired = self._expire_old()
+            parts = []
+            head = self._head
+            for chunk in self._chunks:
+                parts.append((chunk.items, head, len(chunk.items)))
+                head = 0
+        self._notify(expired)
+        return DequeView(parts)
 
     def __len__(self) -> int:
-        self._expire_old()
-        return len(self._data)
+        self._purge()
+        return self._size
+
+    @property
+    def cost(self) -> int:
+        """
+        Total `sizeof` of the live items, or their number without `sizeof`.
+        """
+        self._purge()
+        return self._size if self._sizeof is None else self._cost
 
-    def __iter__(self) -> iter:
-        self._expire_old()
-        for _, value in self._data:
-            yield value
+    def __iter__(self) -> Iterator[T]:
+        return iter(self.snapshot())
 
     def clear(self) -> None:
-        self._data.clear()
+        with self._lock:
+            self._chunks.clear()
+            self._head = 0
+            self._size = 0
+            self._cost = 0
 
     def __repr__(self) -> str:
         return f"<TTLDeque ttl={self.ttl}s size={len(self)}>"
+
+
+def _run_scheduled_expiry(ref: "weakref.ref[ExpiringDeque]") -> None:
+    q = ref()
+    if q is not None:
+        q._scheduled_expiry()
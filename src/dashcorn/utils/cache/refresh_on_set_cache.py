@@ -1,15 +1,27 @@
 import time
+import weakref
 import threading
 from collections.abc import MutableMapping
 from collections import OrderedDict
 from typing import Any, Callable, Optional, Iterator, Tuple
 
+from .timing_wheel import TimerHandle, get_timing_wheel
+
 T = Any
 K = Any
 V = Any
 ExpireCallback = Optional[Callable[[K, V], None]]
 
 class RefreshOnSetCache(MutableMapping[K, V]):
+    """
+    Mapping whose entries expire `ttl` seconds after they were last set.
+
+    Expired entries are purged lazily on access. With `cleanup_interval`, the
+    cache also registers its next expiry with the shared timing wheel, so
+    `on_expire` fires without any access, at most `cleanup_interval` after the
+    entry expired (consecutive expiries are batched within that interval).
+    """
+
     def __init__(
         self,
         ttl: float,
@@ -24,10 +36,7 @@ class RefreshOnSetCache(MutableMapping[K, V]):
         self._cleanup_interval = cleanup_interval
         self._cleanup_lock = threading.Lock()
         self._stop_event = threading.Event()
-        self._timer_thread: Optional[threading.Timer] = None
-
-        if cleanup_interval:
-            self._start_auto_cleanup()
+        self._cleanup_timer: Optional[TimerHandle] = None
 
     def __setitem__(self, key: K, value: V) -> None:
         with self._cleanup_lock:
@@ -35,6 +44,8 @@ class RefreshOnSetCache(MutableMapping[K, V]):
             self._store[key] = (value, now)
             self._store.move_to_end(key)
             self._evict_if_needed()
+            if self._cleanup_interval and self._cleanup_timer is None:
+                self._schedule_cleanup(self._ttl)
 
     def _evict_if_needed(self) -> None:
         if self._maxlen is not None:
@@ -55,8 +66,19 @@ class RefreshOnSetCache(MutableMapping[K, V]):
                 maxlen=self._maxlen
             )
             new_cache._store = OrderedDict(self._store.copy())
+            if new_cache._cleanup_interval and new_cache._store:
+                new_cache._schedule_cleanup(0)
             return new_cache
 
+    def snapshot(self) -> dict:
+        """
+        The live entries as a plain dict, copied under the lock, so a
+        scheduled expiry cannot change the store while it is read.
+        """
+        self._cleanup()
+        with self._cleanup_lock:
+            return {k: v for k, (v, _) in self._store.items()}
+
     def __repr__(self) -> str:
         self._cleanup()
         keys = list(self._store.keys())
@@ -91,29 +113,40 @@ class RefreshOnSetCache(MutableMapping[K, V]):
                 pass  # không làm crash cache nếu callback lỗi
 
     def _cleanup(self) -> None:
-        now = time.monotonic()
-        expired = []
+        # Entries are kept in set-time order (see __setitem__), so expiry stops
+        # at the first live entry and costs O(expired) instead of O(size)
         with self._cleanup_lock:
-            for key, (value, set_time) in list(self._store.items()):
-                if now - set_time > self._ttl:
-                    expired.append((key, value))
-            for key, value in expired:
+            now = time.monotonic()
+            store = self._store
+            while store:
+                key, (value, set_time) = next(iter(store.items()))
+                if now - set_time <= self._ttl:
+                    break
                 self._expire_key(key, value)
 
-    def _start_auto_cleanup(self) -> None:
+    def _schedule_cleanup(self, delay: float) -> None:
+        # Called with _cleanup_lock held. The wheel keeps only a weak
+        # reference, so a pending expiry does not keep the cache alive.
         if self._stop_event.is_set():
             return
+        ref = weakref.ref(self)
+        self._cleanup_timer = get_timing_wheel().schedule(
+            max(delay, self._cleanup_interval), lambda: _run_scheduled_cleanup(ref))
+
+    def _scheduled_cleanup(self) -> None:
         self._cleanup()
-        self._timer_thread = threading.Timer(
-            self._cleanup_interval, self._start_auto_cleanup
-        )
-        self._timer_thread.daemon = True
-        self._timer_thread.start()
+        with self._cleanup_lock:
+            self._cleanup_timer = None
+            if self._store:
+                _, set_time = next(iter(self._store.values()))
+                self._schedule_cleanup(set_time + self._ttl - time.monotonic())
 
     def stop_auto_cleanup(self) -> None:
         self._stop_event.set()
-        if self._timer_thread:
-            self._timer_thread.cancel()
+        with self._cleanup_lock:
+            if self._cleanup_timer:
+                self._cleanup_timer.cancel()
+                self._cleanup_timer = None
 
     def keys(self) -> Iterator[K]:
         self._cleanup()
@@ -128,9 +161,9 @@ class RefreshOnSetCache(MutableMapping[K, V]):
         return (v[0] for v in self._store.values())
 
     def get_set_time(self, key: K) -> Optional[float]:
-        if key in self._store:
-            return self._store[key][1]
-        return None
+        with self._cleanup_lock:
+            entry = self._store.get(key)
+        return entry[1] if entry is not None else None
     
     def update(self, other=None, **kwargs):
         if other:
@@ -165,6 +198,12 @@ class RefreshOnSetCache(MutableMapping[K, V]):
             self._store.clear()
 
 
+def _run_scheduled_cleanup(ref: "weakref.ref[RefreshOnSetCache]") -> None:
+    cache = ref()
+    if cache is not None:
+        cache._scheduled_cleanup()
+
+
 if __name__ == "__main__":
     import time
 
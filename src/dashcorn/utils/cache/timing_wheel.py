@@ -0,0 +1,203 @@
+import math
+import time
+import threading
+import logging
+
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class TimerHandle:
+    """
+    A timer scheduled on a TimingWheel. `cancel()` is O(1); the entry is
+    discarded when the wheel reaches its slot.
+    """
+
+    __slots__ = ("deadline", "callback", "interval", "cancelled")
+
+    def __init__(self, deadline: int, callback: Callable[[], None], interval: int = 0):
+        self.deadline = deadline
+        self.callback = callback
+        self.interval = interval
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class TimingWheel:
+    """
+    Hierarchical hashed timing wheel driving timers from a single thread.
+
+    Level 0 has one slot per tick; every higher level has slots
+    `wheel_size` times wider. A timer goes into the lowest level that covers
+    its deadline, and when a higher level slot comes due its timers are
+    cascaded down. Scheduling and cancelling are O(1), and a tick only touches
+    the one slot that is due, so the cost does not grow with the number of
+    pending timers. Callbacks fire at most about one tick late.
+
+    Callbacks run on the wheel thread, so they must be short and must not
+    block. The thread starts with the first timer and sleeps until the next
+    tick that has a slot to fire or cascade, skipping the empty ones; it sleeps
+    for good while no timers are pending.
+    """
+
+    def __init__(self, tick: float = 0.01, wheel_size: int = 256, levels: int = 4):
+        if wheel_size & (wheel_size - 1):
+            raise ValueError("wheel_size must be a power of two")
+        self._tick = tick
+        self._bits = wheel_size.bit_length() - 1
+        self._mask = wheel_size - 1
+        self._levels = levels
+        self._wheels: List[List[List[TimerHandle]]] = [
+            [[] for _ in range(wheel_size)] for _ in range(levels)
+        ]
+        self._max_delta = (1 << (self._bits * levels)) - 1
+        self._origin = time.monotonic()
+        self._current = 0
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def tick(self) -> float:
+        return self._tick
+
+    def __len__(self) -> int:
+        return self._pending
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> TimerHandle:
+        """
+        Run `callback` once after `delay` seconds.
+        """
+        return self._add(delay, callback, 0)
+
+    def schedule_repeating(self, interval: float, callback: Callable[[], None]) -> TimerHandle:
+        """
+        Run `callback` every `interval` seconds until the handle is cancelled.
+        """
+        return self._add(interval, callback, max(1, math.ceil(interval / self._tick)))
+
+    def _add(self, delay: float, callback: Callable[[], None], interval: int) -> TimerHandle:
+        with self._cond:
+            now_tick = self._now_tick()
+            if not self._pending:
+                # Nothing to fire in between, so the idle wheel can jump ahead
+                self._current = max(self._current, now_tick)
+            deadline = max(math.ceil(now_tick + delay / self._tick), self._current + 1)
+            handle = TimerHandle(deadline, callback, interval)
+            self._place(handle)
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="TimingWheel", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return handle
+
+    def _now_tick(self) -> int:
+        return int((time.monotonic() - self._origin) / self._tick)
+
+    def _place(self, handle: TimerHandle) -> None:
+        delta = min(handle.deadline - self._current, self._max_delta)
+        target = self._current + delta
+        level = 0
+        while level < self._levels - 1 and delta >> (self._bits * (level + 1)):
+            level += 1
+        self._wheels[level][(target >> (self._bits * level)) & self._mask].append(handle)
+
+    def _next_tick(self) -> Optional[int]:
+        """
+        First tick after the current one whose slot has timers, at any level.
+        """
+        best = None
+        for level, slots in enumerate(self._wheels):
+            shift = self._bits * level
+            base = self._current >> shift
+            for step in range(1, self._mask + 2):
+                if slots[(base + step) & self._mask]:
+                    # A higher level slot is handled when its first tick comes
+                    tick = (base + step) << shift
+                    if best is None or tick < best:
+                        best = tick
+                    break
+        return best
+
+    def _advance(self) -> List[TimerHandle]:
+        """
+        Move one tick forward and return the timers due on it.
+        """
+        self._current += 1
+        current = self._current
+        # Cascade from the highest level whose slot boundary was crossed
+        level = 0
+        while level < self._levels - 1 and not current & ((1 << (self._bits * (level + 1))) - 1):
+            level += 1
+        for upper in range(level, 0, -1):
+            slot = self._wheels[upper][(current >> (self._bits * upper)) & self._mask]
+            if slot:
+                handles = slot[:]
+                slot.clear()
+                for handle in handles:
+                    self._place(handle)
+        slot = self._wheels[0][current & self._mask]
+        handles = slot[:]
+        slot.clear()
+        due = []
+        for handle in handles:
+            if handle.deadline <= current:
+                due.append(handle)
+            else:
+                # Clamped beyond the range of the wheel, go around again
+                self._place(handle)
+        self._pending -= len(due)
+        return due
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                next_tick = self._next_tick()
+                if next_tick is None:
+                    self._cond.wait()
+                    continue
+                wait = next_tick * self._tick - (time.monotonic() - self._origin)
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                due = []
+                now_tick = self._now_tick()
+                while next_tick is not None and next_tick <= now_tick:
+                    # The ticks in between have nothing to fire or cascade
+                    self._current = next_tick - 1
+                    due.extend(self._advance())
+                    next_tick = self._next_tick()
+                self._current = max(self._current, now_tick)
+                for handle in due:
+                    if handle.interval and not handle.cancelled:
+                        handle.deadline = self._current + handle.interval
+                        self._place(handle)
+                        self._pending += 1
+
+            for handle in due:
+                if handle.cancelled:
+                    continue
+                try:
+                    handle.callback()
+                except Exception as e:
+                    logger.warning(f"[{self.__class__.__name__}] timer callback failed: {e}")
+
+
+_default_wheel: Optional[TimingWheel] = None
+_default_wheel_lock = threading.Lock()
+
+def get_timing_wheel() -> TimingWheel:
+    """
+    Return the process-wide timing wheel shared by the caches.
+    """
+    global _default_wheel
+    if _default_wheel is None:
+        with _default_wheel_lock:
+            if _default_wheel is None:
+                _default_wheel = TimingWheel()
+    return _default_wheel
@@ -0,0 +1,52 @@
+import re
+
+from sys import getsizeof
+from typing import Any, Optional
+
+_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30}
+_CONTAINERS = (dict, list, tuple, set, frozenset)
+_CONTAINERS_SET = frozenset(_CONTAINERS)
+_SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?\s*$", re.IGNORECASE)
+
+def approx_size(obj: Any, max_depth: int = 3) -> int:
+    """
+    Approximate number of bytes held by `obj` and the containers inside it.
+
+    Walks dicts, lists, tuples and sets down to `max_depth` levels and adds up
+    `sys.getsizeof` of every object met. Objects shared with other structures
+    (interned strings, small ints) are counted as if they were owned, so the
+    result is an upper bound that is good enough for budgeting, not an exact
+    measure.
+    """
+    size = getsizeof(obj)
+    if max_depth <= 0:
+        return size
+    if isinstance(obj, dict):
+        size += sum(map(getsizeof, obj)) + sum(map(getsizeof, obj.values()))
+        values = obj.values()
+    elif isinstance(obj, _CONTAINERS):
+        size += sum(map(getsizeof, obj))
+        values = obj
+    else:
+        return size
+    if _CONTAINERS_SET.isdisjoint(map(type, values)):
+        return size
+    for value in values:
+        if isinstance(value, _CONTAINERS):
+            # Replace the shallow size counted above with the deep one
+            size += approx_size(value, max_depth - 1) - getsizeof(value)
+    return size
+
+def parse_bytes(spec: Optional[str]) -> Optional[int]:
+    """
+    Parse a size such as `65536`, `512K`, `64MB` or `1GiB` (binary units) into bytes.
+
+    An empty spec gives None.
+    """
+    if spec is None or not spec.strip():
+        return None
+    match = _SIZE_PATTERN.match(spec)
+    if not match:
+        raise ValueError(f"invalid size {spec!r}, expected e.g. 512K, 64M or 1G")
+    number, unit = match.groups()
+    return int(float(number) * _UNITS[unit.lower()])
@@ -0,0 +1,116 @@
+"""
+Minimal protobuf wire-format encoder and decoder.
+
+Only what the push exporters need: varints, 64-bit fixed values and
+length-delimited fields. Messages are built bottom-up as `bytearray`s, so no
+generated code or protobuf runtime is required.
+"""
+
+import struct
+
+from typing import Iterator, Tuple, Union
+
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LEN = 2
+WIRE_FIXED32 = 5
+
+_pack_double = struct.Struct("<d").pack
+_pack_fixed64 = struct.Struct("<Q").pack
+_unpack_fixed64 = struct.Struct("<Q").unpack_from
+_unpack_fixed32 = struct.Struct("<I").unpack_from
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+def encode_varint(out: bytearray, value: int) -> None:
+    """
+    Append `value` as a base-128 varint. Negative values use the 10-byte
+    two's complement form, as protobuf does for int64.
+    """
+    if value < 0:
+        value += 1 << 64
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def encode_tag(out: bytearray, field: int, wire_type: int) -> None:
+    encode_varint(out, (field << 3) | wire_type)
+
+def write_varint(out: bytearray, field: int, value: int) -> None:
+    encode_tag(out, field, WIRE_VARINT)
+    encode_varint(out, value)
+
+def write_sint(out: bytearray, field: int, value: int) -> None:
+    """
+    Append a zigzag encoded `sint32`/`sint64` field.
+    """
+    encode_tag(out, field, WIRE_VARINT)
+    encode_varint(out, (value << 1) ^ (value >> 63))
+
+def write_double(out: bytearray, field: int, value: float) -> None:
+    encode_tag(out, field, WIRE_FIXED64)
+    out += _pack_double(value)
+
+def write_fixed64(out: bytearray, field: int, value: int) -> None:
+    encode_tag(out, field, WIRE_FIXED64)
+    out += _pack_fixed64(value)
+
+def write_bytes(out: bytearray, field: int, value: Buffer) -> None:
+    encode_tag(out, field, WIRE_LEN)
+    encode_varint(out, len(value))
+    out += value
+
+def write_string(out: bytearray, field: int, value: str) -> None:
+    write_bytes(out, field, value.encode("utf-8"))
+
+def write_packed_varints(out: bytearray, field: int, values) -> None:
+    packed = bytearray()
+    for value in values:
+        encode_varint(packed, value)
+    write_bytes(out, field, packed)
+
+def decode_varint(data: Buffer, pos: int) -> Tuple[int, int]:
+    """
+    Read a varint at `pos`. Returns the value and the position after it.
+    """
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+def iter_fields(data: Buffer) -> Iterator[Tuple[int, int, Union[int, Buffer]]]:
+    """
+    Iterate over `(field, wire_type, value)` of a serialized message.
+
+    Varint and fixed values are returned as unsigned ints, length-delimited
+    values as a slice of `data`.
+    """
+    pos = 0
+    end = len(data)
+    while pos < end:
+        key, pos = decode_varint(data, pos)
+        field, wire_type = key >> 3, key & 0x07
+        if wire_type == WIRE_VARINT:
+            value, pos = decode_varint(data, pos)
+        elif wire_type == WIRE_FIXED64:
+            value = _unpack_fixed64(data, pos)[0]
+            pos += 8
+        elif wire_type == WIRE_LEN:
+            length, pos = decode_varint(data, pos)
+            value = data[pos:pos + length]
+            pos += length
+        elif wire_type == WIRE_FIXED32:
+            value = _unpack_fixed32(data, pos)[0]
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported wire type {wire_type} for field {field}")
+        yield field, wire_type, value
+
+def fixed64_to_double(value: int) -> float:
+    return struct.unpack("<d", _pack_fixed64(value))[0]
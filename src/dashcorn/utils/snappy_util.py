@@ -0,0 +1,148 @@
+"""
+Snappy block-format compression.
+
+Uses python-snappy or cramjam when one of them is installed (cramjam comes
+with the `remote-write` and `speedups` extras), otherwise a small pure-python
+codec, which takes about a second per 5 MB. The fallback is a greedy LZ77 matcher over 64 KiB blocks:
+it compresses far less tightly than the C library, but the repetitive label
+sets of metric payloads still shrink well and the output is valid snappy that
+any receiver can decode.
+"""
+
+from typing import Union
+
+from .protobuf_wire import decode_varint, encode_varint
+
+try:
+    import snappy as _snappy
+except ImportError:  # pragma: no cover - optional speedup
+    _snappy = None
+
+try:
+    import cramjam as _cramjam
+except ImportError:  # pragma: no cover - optional speedup
+    _cramjam = None
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+_BLOCK_SIZE = 1 << 16
+_MIN_MATCH = 4
+_MAX_COPY = 64
+
+def is_native() -> bool:
+    """
+    Whether a C implementation is used rather than the pure-python codec.
+    """
+    return _snappy is not None or _cramjam is not None
+
+def compress(data: Buffer) -> bytes:
+    if _snappy is not None:
+        return _snappy.compress(bytes(data))
+    if _cramjam is not None:
+        return bytes(_cramjam.snappy.compress_raw(bytes(data)))
+    return _compress(bytes(data))
+
+def decompress(data: Buffer) -> bytes:
+    if _snappy is not None:
+        return _snappy.uncompress(bytes(data))
+    if _cramjam is not None:
+        return bytes(_cramjam.snappy.decompress_raw(bytes(data)))
+    return _decompress(bytes(data))
+
+def _compress(data: bytes) -> bytes:
+    out = bytearray()
+    encode_varint(out, len(data))
+    for start in range(0, len(data), _BLOCK_SIZE):
+        _compress_block(data, start, min(start + _BLOCK_SIZE, len(data)), out)
+    return bytes(out)
+
+def _compress_block(data: bytes, start: int, end: int, out: bytearray) -> None:
+    # Offsets never leave the block, so they always fit a 2-byte copy
+    table = {}
+    pos = start
+    literal_start = start
+    limit = end - _MIN_MATCH
+    while pos <= limit:
+        key = data[pos:pos + _MIN_MATCH]
+        candidate = table.get(key)
+        table[key] = pos
+        if candidate is None:
+            pos += 1
+            continue
+        length = _MIN_MATCH
+        while pos + length < end and data[candidate + length] == data[pos + length]:
+            length += 1
+        _emit_literal(out, data, literal_start, pos)
+        _emit_copy(out, pos - candidate, length)
+        pos += length
+        literal_start = pos
+    _emit_literal(out, data, literal_start, end)
+
+def _emit_literal(out: bytearray, data: bytes, start: int, end: int) -> None:
+    length = end - start
+    if length <= 0:
+        return
+    n = length - 1
+    if n < 60:
+        out.append(n << 2)
+    else:
+        size = (n.bit_length() + 7) // 8
+        out.append((59 + size) << 2)
+        out += n.to_bytes(size, "little")
+    out += data[start:end]
+
+def _emit_copy(out: bytearray, offset: int, length: int) -> None:
+    # Split like the reference encoder so that no chunk is shorter than _MIN_MATCH
+    while length >= _MAX_COPY + _MIN_MATCH:
+        _emit_copy_chunk(out, offset, _MAX_COPY)
+        length -= _MAX_COPY
+    if length > _MAX_COPY:
+        _emit_copy_chunk(out, offset, _MAX_COPY - _MIN_MATCH)
+        length -= _MAX_COPY - _MIN_MATCH
+    _emit_copy_chunk(out, offset, length)
+
+def _emit_copy_chunk(out: bytearray, offset: int, length: int) -> None:
+    out.append(((length - 1) << 2) | 0x02)
+    out += offset.to_bytes(2, "little")
+
+def _decompress(data: bytes) -> bytes:
+    expected, pos = decode_varint(data, 0)
+    out = bytearray()
+    end = len(data)
+    while pos < end:
+        tag = data[pos]
+        pos += 1
+        kind = tag & 0x03
+        if kind == 0:
+            length = tag >> 2
+            if length >= 60:
+                size = length - 59
+                length = int.from_bytes(data[pos:pos + size], "little")
+                pos += size
+            length += 1
+            out += data[pos:pos + length]
+            pos += length
+            continue
+        if kind == 1:
+            length = ((tag >> 2) & 0x07) + 4
+            offset = ((tag >> 5) << 8) | data[pos]
+            pos += 1
+        elif kind == 2:
+            length = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos:pos + 2], "little")
+            pos += 2
+        else:
+            length = (tag >> 2) + 1
+            offset = int.from_bytes(data[pos:pos + 4], "little")
+            pos += 4
+        if offset == 0 or offset > len(out):
+            raise ValueError("Corrupt snappy input: invalid copy offset")
+        begin = len(out) - offset
+        if offset >= length:
+            out += out[begin:begin + length]
+        else:
+            for i in range(length):
+                out.append(out[begin + i])
+    if len(out) != expected:
+        raise ValueError("Corrupt snappy input: length mismatch")
+    return bytes(out)
@@ -0,0 +1,33 @@
+import os
+import socket
+
+import zmq
+
+from dashcorn.agent.worker_sender import MetricsSender
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_sender_stamps_sequence_and_send_time():
+    port = _free_port()
+    context = zmq.Context()
+    pull = context.socket(zmq.PULL)
+    pull.bind(f"tcp://127.0.0.1:{port}")
+    sender = MetricsSender(address=f"127.0.0.1:{port}")
+    try:
+        sender.send({"type": "http", "pid": 42})
+        sender.send({"type": "worker_status"})
+        first = pull.recv_json()
+        second = pull.recv_json()
+    finally:
+        sender.close()
+        pull.close(linger=0)
+        context.term()
+
+    assert (first["seq"], second["seq"]) == (0, 1)
+    assert first["pid"] == 42 and second["pid"] == os.getpid()
+    assert 0 < first["sent_at"] <= second["sent_at"]
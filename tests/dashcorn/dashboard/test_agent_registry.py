@@ -0,0 +1,63 @@
+from dashcorn.dashboard.agent_registry import AgentRegistry
+from dashcorn.dashboard.realtime_metrics import RealtimeState
+
+
+def test_lifecycle_and_membership_events():
+    registry = AgentRegistry(stale_after=5, gone_after=20, grace_period=60)
+    seen = []
+    registry.add_listener(lambda event: seen.append((event.agent_id, event.kind)))
+
+    registry.touch("a", now=0)
+    registry.touch("b", now=0)
+    registry.touch("a", now=10)
+    registry.sweep(now=11)
+    assert registry.get("b").state == "stale"
+    assert registry.live() == ["a"]
+
+    registry.sweep(now=31)
+    assert registry.get("a").state == "gone" and registry.get("b").state == "gone"
+
+    registry.touch("a", now=40)  # comes back within the grace period
+    registry.sweep(now=95)
+    assert "b" not in registry
+    assert registry.get("a").state == "gone"
+    assert registry.counts() == {"active": 0, "stale": 0, "gone": 1}
+
+    assert seen == [
+        ("a", "joined"), ("b", "joined"),
+        ("b", "stale"),
+        ("b", "gone"), ("a", "stale"), ("a", "gone"),
+        ("a", "returned"),
+        ("a", "stale"), ("a", "gone"), ("b", "removed"),
+    ]
+    events, next_since = registry.events(since=8)
+    assert [(e.agent_id, e.kind) for e in events] == [("a", "gone"), ("b", "removed")]
+    assert next_since == 10
+
+
+def test_removed_agents_release_server_state():
+    state = RealtimeState(worker_ttl=1.0, master_ttl=1.0, agent_report_interval=0.5,
+        agent_gone_after=2.0, agent_grace_period=0)
+    state.update("server", {"agent_id": "h1", "workers": {"w1": {"pid": 1}}})
+    state.update("server", {"agent_id": "h2", "workers": {"w2": {"pid": 2}}})
+    version = state.servers_version
+
+    last_seen = state.agents.get("h1").last_seen
+    state.agents.touch("h2", now=last_seen + 10)
+    state.agents.sweep(now=last_seen + 5)
+
+    assert "h1" not in state.get_all_servers()
+    assert state.servers_version > version
+    assert [leader["agent_id"] for leader in state.elect_leaders()] == ["h2"]
+
+
+def test_one_late_report_does_not_make_an_agent_stale():
+    state = RealtimeState(agent_report_interval=4.0, agent_stale_after_reports=3)
+    state.update("server", {"agent_id": "h1", "workers": {"w1": {"pid": 1}}})
+    last_seen = state.agents.get("h1").last_seen
+
+    # Past the 5s snapshot TTLs, but within three report intervals
+    state.agents.sweep(now=last_seen + 9)
+    assert state.agents.get("h1").state == "active"
+    state.agents.sweep(now=last_seen + 13)
+    assert state.agents.get("h1").state == "stale"
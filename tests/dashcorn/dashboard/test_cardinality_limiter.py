@@ -0,0 +1,89 @@
+import time
+from unittest.mock import MagicMock
+
+from dashcorn.dashboard.cardinality_limiter import OTHER, CardinalityLimiter
+from dashcorn.dashboard.prom_metrics_exporter import PromMetricsExporter
+
+
+def test_values_over_budget_collapse_into_other():
+    limiter = CardinalityLimiter({"path": 2})
+    assert limiter.admit("path", "/a") == "/a"
+    assert limiter.admit("path", "/b") == "/b"
+    assert limiter.admit("path", "/c") == OTHER
+    assert limiter.admit("path", "/a") == "/a"
+    # Labels without a budget pass through
+    assert limiter.admit("method", "GET") == "GET"
+    assert limiter.dropped() == {"path": 1}
+    assert limiter.tracked() == {"path": 2}
+
+
+def test_rebalance_promotes_hot_overflow_value():
+    limiter = CardinalityLimiter({"path": 2})
+    limiter.admit("path", "/cold")
+    for _ in range(5):
+        limiter.admit("path", "/warm")
+    for _ in range(20):
+        limiter.admit("path", "/hot")
+
+    assert limiter.rebalance() == {"path": ["/cold"]}
+    assert limiter.admit("path", "/hot") == "/hot"
+    assert limiter.admit("path", "/cold") == OTHER
+
+
+def test_candidate_table_is_bounded():
+    limiter = CardinalityLimiter({"path": 1}, candidate_slots=8)
+    for i in range(10000):
+        limiter.admit("path", f"/random/{i}")
+    assert len(limiter._budgets["path"]._candidates) <= 8
+
+
+def _events(paths):
+    return [
+        dict(agent_id="agent-A", method="GET", path=p, status=404, duration=0.01, time=time.time(), pid=1)
+        for p in paths
+    ]
+
+
+def test_exporter_bounds_series_and_exports_drops():
+    state = MagicMock()
+    state.get_http_events.return_value = _events(f"/scan/{i}" for i in range(1000))
+
+    exporter = PromMetricsExporter(state_provider=lambda: state,
+        cardinality_limiter=CardinalityLimiter({"path": 10}))
+    exporter.observe_many(state.get_http_events())
+
+    assert len(exporter._accum_total) == 11
+    assert exporter._accum_total[("agent-A", "GET", OTHER, "404")] == 990
+    assert sum(exporter._accum_total.values()) == 1000
+
+    dropped = next(m for m in exporter.collect() if m.name == "uvicorn_cardinality_dropped_events")
+    assert any(s.labels == {"label": "path"} and s.value == 990 for s in dropped.samples)
+
+
+def test_exporter_folds_evicted_series_into_other():
+    exporter = PromMetricsExporter(state_provider=MagicMock,
+        cardinality_limiter=CardinalityLimiter({"path": 1}),
+        rebalance_interval=3600)
+
+    exporter.observe_many(_events(["/cold"]))
+    exporter.observe_many(_events(["/hot"] * 10))
+    exporter._rebalance_labels()
+
+    assert ("agent-A", "GET", "/cold", "404") not in exporter._accum_total
+    assert exporter._accum_total[("agent-A", "GET", OTHER, "404")] == 11
+    assert exporter._series[("agent-A", "GET", OTHER)].count == 11
+
+
+def test_merged_series_count_dropped_events_like_observe():
+    events = _events(f"/scan/{i % 20}" for i in range(100))
+    direct = PromMetricsExporter(state_provider=MagicMock,
+        cardinality_limiter=CardinalityLimiter({"path": 10}))
+    direct.observe_many(events)
+
+    shard = PromMetricsExporter(state_provider=MagicMock, cardinality_limiter=CardinalityLimiter({}))
+    shard.observe_many(events)
+    merged = PromMetricsExporter(state_provider=MagicMock,
+        cardinality_limiter=CardinalityLimiter({"path": 10}))
+    merged.merge(shard.drain())
+
+    assert direct._limiter.dropped() == merged._limiter.dropped() == {"path": 50}
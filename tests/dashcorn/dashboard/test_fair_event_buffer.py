@@ -0,0 +1,104 @@
+import pytest
+
+from dashcorn.dashboard.fair_event_buffer import FairEventBuffer, merge_views, page_views, parse_weights
+from dashcorn.dashboard.prom_metrics_exporter import PromMetricsExporter
+from dashcorn.dashboard.realtime_metrics import RealtimeState
+
+
+def _fill(buffer, agent_id, count, cursor):
+    for _ in range(count):
+        cursor += 1
+        buffer.append(dict(agent_id=agent_id, cursor=cursor))
+    return cursor
+
+
+def test_noisy_agent_does_not_evict_quiet_one():
+    buffer = FairEventBuffer(ttl=None, budget=100, evict_batch=1)
+    cursor = _fill(buffer, "quiet", 10, 0)
+    _fill(buffer, "noisy", 10000, cursor)
+
+    stats = buffer.stats()
+    assert stats["quiet"] == dict(accepted=10, evicted=0, buffered=10)
+    assert stats["noisy"] == dict(accepted=10000, evicted=9910, buffered=90)
+    # The newest events of the noisy agent are kept
+    noisy = [e["cursor"] for e in merge_views(buffer.views()) if e["agent_id"] == "noisy"]
+    assert noisy == list(range(10011 - 90, 10011))
+
+
+def test_weights_split_the_budget():
+    buffer = FairEventBuffer(ttl=None, budget=90, weights={"big": 2})
+    cursor = 0
+    for _ in range(200):
+        cursor = _fill(buffer, "big", 1, cursor)
+        cursor = _fill(buffer, "small", 1, cursor)
+
+    stats = buffer.stats()
+    assert stats["big"]["buffered"] + stats["small"]["buffered"] <= 90
+    assert stats["big"]["buffered"] == pytest.approx(2 * stats["small"]["buffered"], abs=2)
+
+
+def test_page_merges_agents_by_cursor():
+    buffer = FairEventBuffer(ttl=None, budget=None)
+    for cursor in range(1, 11):
+        buffer.append(dict(agent_id="ab"[cursor % 2], cursor=cursor))
+
+    events, next_since = page_views(buffer.views(), since=3, limit=4)
+    assert [e["cursor"] for e in events] == [4, 5, 6, 7]
+    assert next_since == 7
+    events, next_since = page_views(buffer.views(), since=next_since)
+    assert [e["cursor"] for e in events] == [8, 9, 10]
+    assert page_views(buffer.views(), since=10) == ([], 10)
+
+
+def test_parse_weights():
+    assert parse_weights("") == {}
+    assert parse_weights("a=2, b:1=0.5") == {"a": 2.0, "b:1": 0.5}
+    with pytest.raises(ValueError):
+        parse_weights("a")
+
+
+def test_realtime_state_exports_per_agent_accounting():
+    state = RealtimeState(http_event_ttl=None, http_events_maxlen=20)
+    for i in range(50):
+        state.update("http", dict(agent_id="noisy", method="GET", path="/", status=200, duration=0.01))
+    state.update("http", dict(agent_id="quiet", method="GET", path="/", status=200, duration=0.01))
+
+    assert [e["agent_id"] for e in state.get_http_events()][-1] == "quiet"
+    exporter = PromMetricsExporter(state_provider=lambda: state)
+    metrics = {m.name: m for m in exporter.collect()}
+    evicted = {s.labels["agent_id"]: s.value for s in metrics["uvicorn_http_events_evicted"].samples
+        if s.name.endswith("_total")}
+    assert evicted == {"noisy": 31, "quiet": 0}
+    buffered = {s.labels["agent_id"]: s.value for s in metrics["uvicorn_http_events_buffered"].samples}
+    assert buffered == {"noisy": 19, "quiet": 1}
+
+
+def test_byte_budget_keeps_small_events_of_quiet_agent():
+    sizeof = lambda event: len(event.get("body", "")) + 100
+    buffer = FairEventBuffer(ttl=None, budget=10000, sizeof=sizeof)
+    cursor = _fill(buffer, "quiet", 20, 0)
+    for _ in range(500):
+        cursor += 1
+        buffer.append(dict(agent_id="noisy", cursor=cursor, body="x" * 900))
+
+    assert buffer.cost <= 10000
+    assert buffer.stats()["quiet"]["evicted"] == 0
+    nbytes = buffer.nbytes_by_agent()
+    assert nbytes["quiet"] == 20 * 100
+    assert nbytes["noisy"] <= 10000 - 2000
+
+    # Shrinking the budget applies on the next append
+    buffer.budget = 5000
+    buffer.append(dict(agent_id="noisy", cursor=cursor + 1, body="x" * 900))
+    assert buffer.cost <= 5000
+
+
+def test_count_cap_applies_with_a_byte_budget():
+    buffer = FairEventBuffer(ttl=None, budget=1_000_000, sizeof=lambda event: 100,
+        maxlen=100, evict_batch=1)
+    cursor = _fill(buffer, "quiet", 10, 0)
+    _fill(buffer, "noisy", 1000, cursor)
+
+    assert len(buffer) == 100 and buffer.cost == 100 * 100
+    assert buffer.stats()["quiet"]["evicted"] == 0
+    assert buffer.stats()["noisy"]["buffered"] == 90
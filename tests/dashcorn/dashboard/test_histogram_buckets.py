@@ -0,0 +1,28 @@
+import pytest
+
+from dashcorn.dashboard.histogram_buckets import (
+    DEFAULT_BUCKETS,
+    exponential_bucket_index,
+    native_exponential_buckets,
+    parse_buckets,
+)
+
+def test_parse_explicit_and_default():
+    assert parse_buckets("") == DEFAULT_BUCKETS
+    assert parse_buckets("1, 0.1, 0.5, +Inf") == (0.1, 0.5, 1.0)
+
+def test_parse_layouts():
+    assert parse_buckets("linear:0.1,0.1,3") == pytest.approx((0.1, 0.2, 0.3))
+    assert parse_buckets("exp:0.001,2,4") == pytest.approx((0.001, 0.002, 0.004, 0.008))
+    assert parse_buckets("loglinear:-2,-1") == (0.01, 0.02, 0.05, 0.1, 0.2, 0.5)
+
+def test_native_layout_matches_bucket_index():
+    bounds = native_exponential_buckets(scale=1, min_value=0.9, max_value=4.0)
+    assert bounds == pytest.approx((1.0, 2 ** 0.5, 2.0, 2 ** 1.5, 4.0))
+    # Values land in the bucket whose upper bound is the first bound >= value
+    assert exponential_bucket_index(2.0, 1) == 1
+    assert exponential_bucket_index(2.1, 1) == 2
+
+def test_parse_rejects_unknown_layout():
+    with pytest.raises(ValueError):
+        parse_buckets("weird:1,2")
@@ -0,0 +1,74 @@
+import json
+import sys
+
+from dashcorn.dashboard.http_event import HttpEvent, InternTable
+from dashcorn.dashboard.metrics_collector import MetricsCollector
+from dashcorn.dashboard.prom_metrics_exporter import PromMetricsExporter
+from dashcorn.dashboard.realtime_metrics import RealtimeState
+from dashcorn.utils import json_util
+from dashcorn.utils.memory_util import approx_size
+
+
+def _message(**extra):
+    # Decode from JSON so that equal strings are distinct objects, as on the wire
+    return json.loads(json.dumps(dict(type="http", agent_id="agent-A", method="GET",
+        path="/users/{id}", status=200, duration=0.01, time=1.7e9, pid=12, **extra)))
+
+
+def test_record_behaves_like_the_decoded_dict():
+    msg = _message(request_id="abc", tenant="t1")
+    event = HttpEvent.from_message(msg, InternTable())
+
+    assert event == msg and dict(event) == msg
+    assert event["path"] == "/users/{id}" and event.get("tenant") == "t1"
+    assert event.get("cursor") is None and "cursor" not in event
+    event["cursor"] = 7
+    assert event["cursor"] == 7 and event.cursor == 7
+    assert json.loads(json_util.dumps([event])) == [dict(msg, cursor=7)]
+    assert approx_size(event) < approx_size(msg) / 2
+
+
+def test_intern_table_shares_strings_up_to_its_bound():
+    strings = InternTable(maxsize=3)
+    first = HttpEvent.from_message(_message(), strings)
+    second = HttpEvent.from_message(_message(), strings)
+    assert second.agent_id is first.agent_id and second.path is first.path
+    assert len(strings) == 4
+
+    # Paths have a table of their own, they do not fill the one of agent ids
+    msg = _message()
+    msg["path"] = "/orders"
+    other = HttpEvent.from_message(msg, strings)
+    assert "/orders" in strings
+
+    # Full: new values are kept as they are, not admitted
+    msg = _message()
+    msg["agent_id"] = "agent-B"
+    late = HttpEvent.from_message(msg, strings)
+    assert late.agent_id == "agent-B" and "agent-B" not in strings
+    assert other.path is strings.intern_path("/orders")
+
+
+def test_size_counts_strings_left_out_of_the_intern_table():
+    strings = InternTable(maxsize=3)
+    shared = HttpEvent.from_message(_message(), strings)
+    msg = _message()
+    msg["agent_id"] = "agent-B"
+    owned = HttpEvent.from_message(msg, strings)
+    assert "agent-B" not in strings
+    assert sys.getsizeof(owned) == sys.getsizeof(shared) + sys.getsizeof(owned.agent_id)
+
+
+def test_collector_stores_records_consumed_by_exporter():
+    state = RealtimeState()
+    exporter = PromMetricsExporter(state_provider=lambda: state)
+    state.add_http_listener(exporter.observe)
+    collector = MetricsCollector(state_store=state)
+    for _ in range(2):
+        collector._handle_message(_message())
+
+    events = state.get_http_events()
+    assert all(isinstance(event, HttpEvent) for event in events)
+    assert events[0]["agent_id"] is events[1]["agent_id"]
+    assert exporter._accum_total[("agent-A", "GET", "/users/{id}", "200")] == 2
+    assert json.loads(json_util.dumps(state.dict()))["http"][1]["cursor"] == 2
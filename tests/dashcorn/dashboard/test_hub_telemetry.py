@@ -0,0 +1,92 @@
+import socket
+import time
+
+import zmq
+
+from prometheus_client import CollectorRegistry, generate_latest
+
+from dashcorn.dashboard.hub_telemetry import HubTelemetry
+from dashcorn.dashboard.metrics_collector import MetricsCollector
+from dashcorn.dashboard.prom_metrics_exporter import PromMetricsExporter
+from dashcorn.dashboard.realtime_metrics import RealtimeState
+from dashcorn.dashboard.settings_selector import SettingsSelector
+from dashcorn.utils import json_util
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _samples(registry):
+    return {(s.name, tuple(sorted(s.labels.items()))): s.value
+        for metric in registry.collect() for s in metric.samples}
+
+
+def test_collector_reports_ingest_telemetry():
+    state = RealtimeState()
+    exporter = PromMetricsExporter(state_provider=lambda: state)
+    state.add_http_listener(exporter.observe)
+    telemetry = HubTelemetry(exporter=exporter)
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(telemetry)
+
+    port = _free_port()
+    collector = MetricsCollector(address=f"127.0.0.1:{port}", state_store=state, telemetry=telemetry)
+    collector.start()
+    context = zmq.Context()
+    push = context.socket(zmq.PUSH)
+    push.connect(f"tcp://127.0.0.1:{port}")
+    try:
+        for i in range(300):
+            push.send(json_util.dumps(dict(type="http", agent_id="ab"[i % 2], method="GET",
+                path="/", status=200, duration=0.01)) if i % 10 else b"[1]")
+        push.send(json_util.dumps(dict(type="worker_status", agent_id="a", workers={})))
+        deadline = time.time() + 10
+        while collector.stats()["received"] < 301 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        push.close(linger=0)
+        context.term()
+        collector.stop()
+
+    samples = _samples(registry)
+    assert samples[("dashcorn_hub_ingest_messages_total", (("kind", "http"),))] == 270
+    assert samples[("dashcorn_hub_ingest_messages_total", (("kind", "server"),))] == 1
+    assert samples[("dashcorn_hub_agent_messages_total", (("agent_id", "a"),))] == 121
+    assert samples[("dashcorn_hub_agent_messages_total", (("agent_id", "b"),))] == 150
+    assert samples[("dashcorn_hub_ingest_rejected_total", (("reason", "not_an_object"),))] == 30
+    assert samples[("dashcorn_hub_decode_duration_seconds_count", ())] == 271
+    assert samples[("dashcorn_hub_update_duration_seconds_bucket", (("le", "+Inf"),))] == 271
+    assert samples[("dashcorn_hub_ingest_queue_depth", ())] >= 1
+    assert samples[("dashcorn_hub_exporter_series", (("family", "requests_total"),))] == 2
+    assert b"dashcorn_hub_decode_duration_seconds_bucket" in generate_latest(registry)
+
+
+def test_selector_reports_election_rounds():
+    class FailingStore:
+        def elect_leaders(self):
+            raise RuntimeError("boom")
+
+    telemetry = HubTelemetry()
+    selector = SettingsSelector(state_store=FailingStore(), telemetry=telemetry)
+    selector._observe_round(time.perf_counter(), selector._elect_leaders())
+    selector._observe_round(time.perf_counter(), [])
+
+    stats = telemetry.stats()
+    assert stats["elections"] == 2
+    assert stats["elections_failed"] == 1
+
+
+def test_queue_depth_keeps_the_previous_window():
+    telemetry = HubTelemetry(depth_window=0.05)
+    telemetry.record_queue_depth(40)
+    time.sleep(0.06)
+    telemetry.record_queue_depth(3)
+    assert telemetry.queue_depth() == 40
+    time.sleep(0.06)
+    telemetry.record_queue_depth(2)
+    assert telemetry.queue_depth() == 3
+    time.sleep(0.11)
+    assert telemetry.queue_depth() == 0
@@ -0,0 +1,85 @@
+import asyncio
+import time
+import pytest
+
+from dashcorn.dashboard.realtime_metrics import RealtimeState
+from dashcorn.dashboard.metrics_broadcaster import MetricsBroadcaster, StreamSubscriber
+
+
+def _http(agent_id, path, at):
+    return dict(agent_id=agent_id, method="GET", path=path, status=200, duration=0.1, time=at)
+
+
+def test_build_frame_emits_completed_buckets_and_changed_servers():
+    state = RealtimeState()
+    broadcaster = MetricsBroadcaster(state)
+    now = float(int(time.time()))
+
+    broadcaster.build_frame(now=now)  # establish the baseline
+
+    state.update("http", _http("agent-A", "/a", now + 0.2))
+    state.update("http", _http("agent-B", "/b", now + 0.4))
+    state.update("server", {"agent_id": "agent-A", "workers": {"1": {"pid": 1}}})
+
+    frame = broadcaster.build_frame(now=now + 1.5)
+    assert [b["start"] for b in frame["buckets"]] == [now]
+    assert {s["agent_id"] for s in frame["buckets"][0]["series"]} == {"agent-A", "agent-B"}
+    assert list(frame["servers"]) == ["agent-A"]
+
+    # Nothing changed since the previous frame
+    frame = broadcaster.build_frame(now=now + 1.6)
+    assert frame["buckets"] == [] and frame["servers"] == {}
+
+
+@pytest.mark.asyncio
+async def test_broadcast_filters_per_subscriber():
+    state = RealtimeState()
+    broadcaster = MetricsBroadcaster(state, interval=3600)
+    sub_a = broadcaster.subscribe(agent_id="agent-A")
+    sub_all = broadcaster.subscribe()
+
+    broadcaster.broadcast({
+        "type": "delta", "time": 1.0,
+        "buckets": [{"start": 0.0, "series": [
+            {"agent_id": "agent-A", "path": "/a"},
+            {"agent_id": "agent-B", "path": "/b"},
+        ]}],
+        "servers": {"agent-B": {}},
+        "removed_agents": [],
+    })
+
+    frame_a = sub_a.queue.get_nowait()
+    assert [s["agent_id"] for s in frame_a["buckets"][0]["series"]] == ["agent-A"]
+    assert frame_a["servers"] == {}
+    assert len(sub_all.queue.get_nowait()["buckets"][0]["series"]) == 2
+    await broadcaster.stop()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_downsampled_then_dropped():
+    subscriber = StreamSubscriber(maxsize=2, max_lagging_ticks=3)
+
+    def frame(i, servers=None, removed=()):
+        return {"type": "delta", "time": i, "buckets": [{"start": i, "series": []}],
+            "servers": servers or {}, "removed_agents": list(removed)}
+
+    subscriber.offer(frame(0, servers={"a": {"workers": {}}}))
+    subscriber.offer(frame(1, removed=["a"]))
+    subscriber.offer(frame(2))
+    subscriber.offer(frame(3))
+    assert subscriber.queue.qsize() == 2
+    assert subscriber.downsampled == 2
+    # Downsampled frames keep every bucket, in order
+    merged = [subscriber.queue.get_nowait() for _ in range(2)]
+    assert [b["start"] for f in merged for b in f["buckets"]] == [0, 1, 2, 3]
+    # Replaying the frames in order leaves the removed agent removed
+    servers = {}
+    for f in merged:
+        servers.update(f["servers"])
+        for agent_id in f["removed_agents"]:
+            servers.pop(agent_id, None)
+    assert servers == {}
+
+    for i in range(10):
+        subscriber.offer(frame(i))
+    assert subscriber.closed
@@ -0,0 +1,93 @@
+import time
+import pytest
+
+from dashcorn.dashboard.metrics_rollup import RollupStore, SeriesRollup
+from dashcorn.dashboard.metrics_query import MetricsQuery, MetricsQueryEngine
+
+
+def _event(agent_id="agent-A", method="GET", path="/a", status=200, duration=0.1, at=None):
+    return dict(type="http", agent_id=agent_id, method=method, path=path,
+        status=status, duration=duration, time=at or time.time())
+
+
+@pytest.fixture
+def engine():
+    store = RollupStore(resolution=1.0, retention=60.0)
+    now = int(time.time())
+    for i in range(90):
+        store.observe(_event(duration=0.01 * (i + 1), at=now - 1))
+    for _ in range(10):
+        store.observe(_event(path="/b", status=503, duration=1.0, at=now - 2))
+    store.observe(_event(agent_id="agent-B", path="/a", status=404, at=now - 3))
+    return MetricsQueryEngine(store)
+
+
+def test_count_and_error_ratio_total(engine):
+    result = engine.execute(MetricsQuery(start=-30, aggs=["count", "error_ratio"]))
+    assert len(result["groups"]) == 1
+    row = result["groups"][0]
+    assert row["count"] == 101
+    assert row["error_ratio"] == pytest.approx(10 / 101)
+
+
+def test_group_by_path_and_filters(engine):
+    result = engine.execute(MetricsQuery(start=-30, agent_id="agent-A",
+        group_by=["path"], aggs=["count"]))
+    counts = {row["key"]["path"]: row["count"] for row in result["groups"]}
+    assert counts == {"/a": 90, "/b": 10}
+
+    result = engine.execute(MetricsQuery(start=-30, status_class="4xx",
+        group_by=["agent_id", "status_class"], aggs=["count"]))
+    assert result["groups"] == [{"key": {"agent_id": "agent-B", "status_class": "4xx"}, "count": 1}]
+
+
+def test_percentiles_within_histogram_error(engine):
+    result = engine.execute(MetricsQuery(start=-30, path="/a", agent_id="agent-A",
+        aggs=["p50", "p99"]))
+    row = result["groups"][0]
+    # Exponential buckets at scale 3 have ~9% relative error
+    assert row["p50"] == pytest.approx(0.45, rel=0.1)
+    assert row["p99"] == pytest.approx(0.9, rel=0.1)
+
+
+def test_time_range_excludes_old_buckets(engine):
+    now = int(time.time())
+    result = engine.execute(MetricsQuery(start=now - 1, end=now, aggs=["count"]))
+    assert result["groups"][0]["count"] == 90
+
+
+def test_invalid_query_rejected(engine):
+    with pytest.raises(ValueError):
+        engine.execute(MetricsQuery(group_by=["bogus"]))
+    with pytest.raises(ValueError):
+        engine.execute(MetricsQuery(aggs=["p42x"]))
+    with pytest.raises(ValueError):
+        engine.execute(MetricsQuery(status_class="abc"))
+
+
+def test_series_rollup_merge():
+    a, b = SeriesRollup(scale=3), SeriesRollup(scale=3)
+    a.observe(0.5, 200)
+    b.observe(0.5, 500)
+    b.observe(0.0, 200)
+    a.merge(b)
+    assert (a.count, a.errors, a.zero_count) == (3, 1, 1)
+    assert a.duration_sum == pytest.approx(1.0)
+
+
+def test_rollup_trim_drops_oldest_buckets_to_fit_bytes():
+    store = RollupStore(resolution=1.0, retention=900.0)
+    now = time.time()
+    for age in range(10, 0, -1):
+        store.observe(dict(agent_id="a", method="GET", path="/x", status=200,
+            duration=0.01 * age, time=now - age))
+    full = store.nbytes
+    assert full > 0 and len(store) == 10
+
+    assert store.trim(full // 2) > 0
+    assert store.nbytes <= full // 2
+    assert min(b.start for b in store) > now - 10
+    # The most recent bucket is always kept
+    remaining = len(store)
+    assert store.trim(0) == remaining - 1
+    assert len(store) == 1
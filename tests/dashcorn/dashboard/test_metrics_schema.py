@@ -0,0 +1,68 @@
+import socket
+import time
+
+import pytest
+import zmq
+
+from dashcorn.dashboard.http_event import HttpEvent
+from dashcorn.dashboard.metrics_collector import MetricsCollector
+from dashcorn.dashboard.metrics_schema import (
+    INVALID_FIELD, INVALID_JSON, MISSING_FIELD, NOT_AN_OBJECT, UNKNOWN_TYPE,
+    MessageRejected, decode_message,
+)
+from dashcorn.dashboard.realtime_metrics import RealtimeState
+from dashcorn.utils import json_util
+
+HTTP = dict(type="http", agent_id="a", method="GET", path="/x", status=200, duration=0.01,
+    time=1.7e9, pid=1, request_id="r1")
+
+
+def test_decode_valid_messages_from_buffer():
+    kind, event = decode_message(memoryview(json_util.dumps(HTTP)))
+    assert kind == "http" and isinstance(event, HttpEvent) and event == HTTP
+
+    status = dict(type="worker_status", agent_id="a", master={}, workers={"1": {"pid": 1}})
+    assert decode_message(json_util.dumps(status)) == ("server", status)
+
+
+@pytest.mark.parametrize("frame, reason", [
+    (b"{not json", INVALID_JSON),
+    (b"[1, 2]", NOT_AN_OBJECT),
+    (json_util.dumps(dict(type="nope")), UNKNOWN_TYPE),
+    (json_util.dumps({k: v for k, v in HTTP.items() if k != "path"}), MISSING_FIELD),
+    (json_util.dumps(dict(HTTP, status="200")), INVALID_FIELD),
+    (json_util.dumps(dict(HTTP, duration=True)), INVALID_FIELD),
+    (json_util.dumps(dict(type="worker_status", agent_id="a", workers={"1": 5})), INVALID_FIELD),
+])
+def test_malformed_messages_are_rejected_with_reason(frame, reason):
+    with pytest.raises(MessageRejected) as e:
+        decode_message(frame)
+    assert e.value.reason == reason
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_collector_counts_rejects_without_stalling():
+    state = RealtimeState()
+    port = _free_port()
+    collector = MetricsCollector(address=f"127.0.0.1:{port}", state_store=state)
+    collector.start()
+    context = zmq.Context()
+    push = context.socket(zmq.PUSH)
+    push.connect(f"tcp://127.0.0.1:{port}")
+    try:
+        for i in range(20):
+            push.send(b"garbage" if i % 2 else json_util.dumps(HTTP))
+        deadline = time.time() + 2
+        while collector.stats()["received"] < 20 and time.time() < deadline:
+            time.sleep(0.01)
+        assert collector.stats() == {"received": 20, "rejected": {INVALID_JSON: 10}}
+        assert len(state.get_http_events()) == 10
+    finally:
+        push.close(linger=0)
+        context.term()
+        collector.stop()
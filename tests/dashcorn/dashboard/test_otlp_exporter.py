@@ -0,0 +1,109 @@
+import gzip
+import time
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from dashcorn.dashboard.metrics_rollup import RollupStore
+from dashcorn.dashboard.otlp_exporter import OtlpMetricsExporter, exponential_bucket_counts
+from dashcorn.utils import protobuf_wire as pb
+
+
+@pytest.fixture
+def collector():
+    """Stand-in OTLP/HTTP receiver recording every request."""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append((dict(self.headers), body))
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://%s:%d/v1/metrics" % server.server_address, received
+    server.shutdown()
+    server.server_close()
+
+
+def fields(data):
+    result = {}
+    for field, _, value in pb.iter_fields(data):
+        result.setdefault(field, []).append(value)
+    return result
+
+
+def decode_points(body):
+    request = fields(gzip.decompress(body))
+    resource_metrics = fields(request[1][0])
+    scope_metrics = fields(resource_metrics[2][0])
+    metric = fields(scope_metrics[2][0])
+    assert bytes(metric[1][0]) == b"http.server.request.duration"
+    histogram = fields(metric[10][0])
+    assert histogram[2] == [1]  # delta temporality
+    points = []
+    for raw in histogram[1]:
+        point = fields(raw)
+        attributes = {}
+        for attribute in point[1]:
+            attribute = fields(attribute)
+            value_field, _, value = next(pb.iter_fields(attribute[2][0]))
+            attributes[bytes(attribute[1][0]).decode()] = (
+                bytes(value).decode() if value_field == 1 else value)
+        positive = fields(point[8][0])
+        counts = []
+        for packed in positive[2]:
+            pos = 0
+            while pos < len(packed):
+                value, pos = pb.decode_varint(packed, pos)
+                counts.append(value)
+        points.append(dict(attributes=attributes, count=point[4][0],
+            sum=pb.fixed64_to_double(point[5][0]), counts=counts,
+            start=point[2][0], end=point[3][0]))
+    return points
+
+
+def test_exports_completed_buckets_as_delta_histograms(collector):
+    url, received = collector
+    store = RollupStore(resolution=1.0, retention=60.0)
+    base = float(int(time.time()) - 30)
+    for i, duration in enumerate((0.01, 0.02, 0.5)):
+        store.observe(dict(agent_id="a", method="GET", path="/x", status=200,
+            duration=duration, time=base + i * 0.1))
+    store.observe(dict(agent_id="a", method="GET", path="/y", status=500, duration=0.1, time=base + 1.5))
+
+    exporter = OtlpMetricsExporter(store, url, max_points_per_request=1)
+    # Only the bucket at `base` has completed at base + 1.2
+    assert exporter.export_once(now=base + 1.2) == 1
+    points = decode_points(received[0][1])
+    assert received[0][0]["Content-Encoding"] == "gzip"
+    assert len(points) == 1
+    assert points[0]["attributes"] == {"dashcorn.agent.id": "a", "http.request.method": "GET",
+        "http.route": "/x", "http.response.status_code": 200}
+    assert points[0]["count"] == 3
+    assert sum(points[0]["counts"]) == 3
+    assert points[0]["sum"] == pytest.approx(0.53)
+    assert points[0]["end"] == int((base + 1) * 1e9)
+
+    # The next export is a delta: it only carries the later bucket
+    assert exporter.export_once(now=base + 5) == 1
+    points = decode_points(received[1][1])
+    assert [p["attributes"]["http.route"] for p in points] == ["/y"]
+    assert points[0]["start"] == int((base + 1) * 1e9)
+    assert exporter.stats()["sent_items"] == 2
+
+
+def test_exponential_bucket_counts_downscale():
+    assert exponential_bucket_counts({}, 3) == (3, 0, [])
+    assert exponential_bucket_counts({-2: 1, 0: 2}, 3) == (3, -2, [1, 0, 2])
+    scale, offset, counts = exponential_bucket_counts({0: 1, 1: 1, 7: 3}, 3, max_buckets=4)
+    assert scale == 2  # halved once: 8 buckets -> 4
+    assert offset == 0 and counts == [2, 0, 0, 3]
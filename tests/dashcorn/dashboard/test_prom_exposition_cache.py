@@ -0,0 +1,115 @@
+import gzip
+
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.openmetrics.exposition import generate_latest as generate_openmetrics
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+from prometheus_client.samples import Exemplar
+
+from dashcorn.dashboard.prom_exposition_cache import PromExpositionCache
+
+
+class FakeCollector:
+    def __init__(self):
+        self.requests = 3
+        self.collect_calls = 0
+
+    def collect(self):
+        self.collect_calls += 1
+        c = CounterMetricFamily("demo_requests", "Total requests", labels=["path"])
+        c.add_metric(['/a"b'], self.requests)
+        yield c
+        g = GaugeMetricFamily("demo_memory_bytes", "Memory\nusage", labels=["agent_id"])
+        g.add_metric(["agent-A"], 1024.5)
+        yield g
+        h = HistogramMetricFamily("demo_duration_seconds", "Duration", labels=["path"])
+        h.add_metric(["/a"], buckets=[
+            ("0.1", 1, Exemplar({"request_id": "req-1"}, 0.07, 1700000000.5)),
+            ("+Inf", 3),
+        ], sum_value=0.7)
+        yield h
+
+
+class GroupedCollector:
+    def __init__(self):
+        self.markers = {"stable": 1, "live": None}
+        self.values = {"stable": 1, "live": 1}
+        self.collect_calls = {"stable": 0, "live": 0}
+
+    def collect_groups(self):
+        return [(key, self.markers[key], lambda key=key: self._collect(key)) for key in self.markers]
+
+    def _collect(self, key):
+        self.collect_calls[key] += 1
+        g = GaugeMetricFamily(f"demo_{key}", "Demo group")
+        g.add_metric([], self.values[key])
+        yield g
+
+
+def _registry(collector):
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(collector)
+    return registry
+
+
+def test_render_matches_prometheus_client_output():
+    collector = FakeCollector()
+    cache = PromExpositionCache(collector)
+    assert cache.render("text").body == generate_latest(_registry(collector))
+    assert cache.render("openmetrics").body == generate_openmetrics(_registry(collector))
+
+
+def test_exemplars_only_in_openmetrics():
+    cache = PromExpositionCache(FakeCollector())
+    assert b"req-1" not in cache.render("text").body
+    assert (b'demo_duration_seconds_bucket{le="0.1",path="/a"} 1.0 # {request_id="req-1"} 0.07 1700000000.5\n'
+        in cache.render("openmetrics").body)
+
+
+def test_cached_for_max_age_only():
+    collector = FakeCollector()
+    cache = PromExpositionCache(collector, max_age=60)
+
+    first = cache.render()
+    collector.requests = 4
+    assert cache.render() is first
+    assert collector.collect_calls == 1
+
+    cache.invalidate()
+    second = cache.render()
+    assert second is not first
+    assert b'demo_requests_total{path="/a\\"b"} 4.0' in second.body
+
+
+def test_expired_payload_is_rendered_again():
+    collector = FakeCollector()
+    cache = PromExpositionCache(collector, max_age=0)
+    cache.render()
+    cache.render()
+    assert collector.collect_calls == 2
+
+
+def test_only_groups_whose_marker_moved_are_collected_again():
+    collector = GroupedCollector()
+    cache = PromExpositionCache(collector, FakeCollector(), max_age=0)
+    first = cache.render().body
+    assert b"demo_stable 1.0" in first and b"demo_requests_total" in first
+
+    # Same marker: the cached text is served, even though the value moved
+    collector.values = {"stable": 2, "live": 2}
+    second = cache.render().body
+    assert collector.collect_calls == {"stable": 1, "live": 2}
+    assert b"demo_stable 1.0" in second and b"demo_live 2.0" in second
+
+    collector.markers["stable"] = 2
+    third = cache.render().body
+    assert collector.collect_calls == {"stable": 2, "live": 3}
+    assert b"demo_stable 2.0" in third
+
+
+def test_negotiate_and_gzip():
+    cache = PromExpositionCache(FakeCollector())
+    exposition = cache.negotiate("application/openmetrics-text; version=1.0.0")
+    assert exposition.content_type.startswith("application/openmetrics-text")
+    assert exposition.body.endswith(b"# EOF\n")
+    assert gzip.decompress(exposition.gzipped) == exposition.body
+    assert cache.negotiate(None).content_type.startswith("text/plain")
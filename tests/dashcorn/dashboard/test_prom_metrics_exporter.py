@@ -51,17 +51,20 @@ class DummyState:
             }
         }
 
-    def get_http_events(self, cleancut=True):
+    def get_http_events(self):
         return self._http_events
 
     def get_all_servers(self):
         return self._servers
 
+    def http_event_stats(self):
+        return {}
+
 def test_prom_metrics_exporter_collect():
     state = DummyState()
     exporter = PromMetricsExporter(state_provider=lambda: state)
 
-    exporter.aggregate_http_events()
+    exporter.observe_many(state.get_http_events())
     collected = list(exporter.collect())
 
     # Helper to find metric by name
@@ -112,7 +115,7 @@ def test_prom_exporter_with_prefix():
     # Giả lập state
     def fake_state():
         return type("FakeState", (), {
-            "get_http_events": lambda self, cleancut=False: [
+            "get_http_events": lambda self: [
                 {
                     "agent_id": "agentX",
                     "method": "POST",
@@ -123,6 +126,7 @@ def test_prom_exporter_with_prefix():
                     "pid": 1234
                 }
             ],
+            "http_event_stats": lambda self: {"agentX": dict(accepted=1, evicted=0, buffered=1)},
             "get_all_servers": lambda self: {
                 "agentX": {
                     "workers": {
@@ -143,7 +147,7 @@ def test_prom_exporter_with_prefix():
         })()
 
     exporter = PromMetricsExporter(state_provider=fake_state, metric_label_prefix="demo")
-    exporter.aggregate_http_events()
+    exporter.observe_many(fake_state().get_http_events())
     collected = list(exporter.collect())
 
     # Kiểm tra tên các metric đều có prefix
@@ -174,7 +178,7 @@ def test_event_missing_optional_fields():
     exporter = PromMetricsExporter(state_provider=lambda: state_mock)
 
     with patch("dashcorn.dashboard.prom_metrics_exporter.logger.warning") as warn_log:
-        exporter.aggregate_http_events()
+        exporter.observe_many(state_mock.get_http_events())
 
         # Because agent_id exists. So this should not be called.
         # If called, we fail:
@@ -184,8 +188,8 @@ def test_event_missing_optional_fields():
 
         # Check metrics fallback values are inserted
         assert exporter._accum_total[("agent1", "unknown", "unknown", "000")] == 1
-        assert exporter._accum_duration_sum[("agent1", "unknown", "unknown")] == 0.0
-        assert exporter._accum_duration_count[("agent1", "unknown", "unknown")] == 1
+        assert exporter._series[("agent1", "unknown", "unknown")].duration_sum == 0.0
+        assert exporter._series[("agent1", "unknown", "unknown")].count == 1
         assert exporter._accum_by_worker[("agent1", "0")] == 1
 
 def test_event_missing_agent_id():
@@ -206,8 +210,105 @@ def test_event_missing_agent_id():
     exporter = PromMetricsExporter(state_provider=lambda: state_mock)
 
     with patch("dashcorn.dashboard.prom_metrics_exporter.logger.warning") as warn_log:
-        exporter.aggregate_http_events()
+        exporter.observe_many(state_mock.get_http_events())
 
         # Should skip the event and log warning
         warn_log.assert_any_call("'agent_id' not found in http_event: {}".format(event))
         assert len(exporter._accum_total) == 0
+
+def test_duration_histogram_has_cumulative_buckets():
+    events = [
+        dict(agent_id="agent-A", method="GET", path="/h", status=200, duration=d, time=time.time(), pid=1)
+        for d in (0.05, 0.2, 0.2, 3.0)
+    ]
+    state_mock = MagicMock()
+    state_mock.get_http_events.return_value = events
+
+    exporter = PromMetricsExporter(state_provider=lambda: state_mock, buckets=[0.1, 1.0])
+    exporter.observe_many(events)
+    exporter.observe_many(events)  # second batch accumulates onto the first
+
+    histogram = next(m for m in exporter.collect() if m.name == "uvicorn_requests_duration_seconds")
+    buckets = {s.labels["le"]: s.value for s in histogram.samples if s.name.endswith("_bucket")}
+    assert buckets == {"0.1": 2, "1.0": 6, "+Inf": 8}
+
+    count = next(s.value for s in histogram.samples if s.name.endswith("_count"))
+    assert count == 8
+
+def test_one_family_per_metric_name():
+    state = DummyState()
+    state._servers["agent-B"] = state._servers["agent-A"]
+    exporter = PromMetricsExporter(state_provider=lambda: state)
+    exporter.observe_many(state.get_http_events())
+
+    collected = list(exporter.collect())
+    names = [m.name for m in collected]
+    assert len(names) == len(set(names))
+
+    cpu = next(m for m in collected if m.name == "uvicorn_worker_cpu_percent")
+    assert len(cpu.samples) == 4
+
+
+def test_ingest_listener_counts_events_once_and_keeps_json_view():
+    from dashcorn.dashboard.realtime_metrics import RealtimeState
+
+    store = RealtimeState()
+    exporter = PromMetricsExporter(state_provider=lambda: store)
+    store.add_http_listener(exporter.observe)
+
+    for _ in range(3):
+        store.update("http", dict(agent_id="a", method="GET", path="/x", status=200,
+            duration=0.01, time=time.time(), pid=1))
+
+    # Scraping twice does not drain or double count
+    for _ in range(2):
+        req_total = next(m for m in exporter.collect() if m.name == "uvicorn_requests")
+        assert [s.value for s in req_total.samples if s.name.endswith("_total")] == [3]
+    assert len(store.get_http_events()) == 3
+
+
+def test_bucket_exemplar_keeps_slowest_recent_request():
+    now = time.time()
+    def event(request_id, duration, at=now):
+        return dict(agent_id="a", method="GET", path="/x", status=200,
+            duration=duration, time=at, pid=1, request_id=request_id)
+
+    exporter = PromMetricsExporter(state_provider=MagicMock(), buckets=[0.1, 1.0])
+    exporter.observe_many([
+        event("old-slow", 0.9, now - 120),
+        event("fast", 0.2),
+        event("slow", 0.8),
+        event("faster", 0.3),
+        event("tiny", 0.01),
+    ])
+
+    histogram = next(m for m in exporter.collect() if m.name == "uvicorn_requests_duration_seconds")
+    exemplars = {s.labels["le"]: s.exemplar for s in histogram.samples if s.name.endswith("_bucket")}
+    assert exemplars["0.1"].labels == {"request_id": "tiny"}
+    assert exemplars["1.0"].labels == {"request_id": "slow"}
+    assert exemplars["1.0"].value == 0.8
+    assert exemplars["+Inf"] is None
+
+
+def test_group_markers_follow_requests_and_server_snapshots():
+    from dashcorn.dashboard.realtime_metrics import RealtimeState
+
+    store = RealtimeState()
+    exporter = PromMetricsExporter(state_provider=lambda: store)
+    store.add_http_listener(exporter.observe)
+    markers = lambda: {key: marker for key, marker, _ in exporter.collect_groups()}
+
+    before = markers()
+    assert before["http_events"] is None and before["uptime"] is None
+    # Nothing recent: the in-progress gauge can be cached too
+    assert before["requests_in_progress"] == before["requests"]
+
+    store.update("http", dict(agent_id="a", method="GET", path="/x", status=200,
+        duration=0.01, time=time.time(), pid=1))
+    after = markers()
+    assert after["requests"] != before["requests"]
+    assert after["requests_in_progress"] is None
+    assert after["servers"] == before["servers"]
+
+    store.update("server", {"agent_id": "a", "workers": {"1": {"cpu": 1.0}}})
+    assert markers()["servers"] != after["servers"]
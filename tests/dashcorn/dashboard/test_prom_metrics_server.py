@@ -0,0 +1,87 @@
+import gzip
+import http.client
+import threading
+
+from prometheus_client.core import GaugeMetricFamily
+
+from dashcorn.dashboard.prom_metrics_server import PromMetricsServer
+
+
+class FakeExporter:
+    def collect(self):
+        g = GaugeMetricFamily("demo_value", "Demo value")
+        g.add_metric([], 42)
+        yield g
+
+
+def _get(conn, headers=None):
+    conn.request("GET", "/metrics", headers=headers or {})
+    response = conn.getresponse()
+    return response, response.read()
+
+
+def test_keep_alive_gzip_and_self_metrics():
+    server = PromMetricsServer(FakeExporter(), prom_port=0, prom_host="127.0.0.1", cache_max_age=0)
+    server.start()
+    try:
+        host, port = server.server_address
+        conn = http.client.HTTPConnection(host, port, timeout=5)
+
+        response, body = _get(conn)
+        assert response.status == 200
+        assert b"demo_value 42.0" in body
+
+        # Same connection is reused (HTTP/1.1 keep-alive)
+        response, body = _get(conn, {"Accept-Encoding": "gzip"})
+        assert response.getheader("Content-Encoding") == "gzip"
+        text = gzip.decompress(body)
+        assert b"dashcorn_hub_scrape_duration_seconds_count" in text
+        assert b'dashcorn_hub_scrape_requests_total{encoding="identity",format="text"}' in text
+        conn.close()
+    finally:
+        server.stop()
+
+
+def test_collect_yields_exporter_and_registry_families():
+    server = PromMetricsServer(FakeExporter())
+    names = {metric.name for metric in server.collect()}
+    assert "demo_value" in names and "dashcorn_hub_scrape_duration_seconds" in names
+
+
+def test_concurrent_scrapes():
+    server = PromMetricsServer(FakeExporter(), prom_port=0, prom_host="127.0.0.1")
+    server.start()
+    try:
+        host, port = server.server_address
+        # A client that connects but never sends must not block others
+        idle = http.client.HTTPConnection(host, port, timeout=5)
+        idle.connect()
+
+        results = []
+        def scrape():
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            results.append(_get(conn)[0].status)
+            conn.close()
+
+        threads = [threading.Thread(target=scrape) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+        assert results == [200] * 8
+        idle.close()
+    finally:
+        server.stop()
+
+
+def test_restart_does_not_fail_on_duplicate_registration():
+    server = PromMetricsServer(FakeExporter(), prom_port=0, prom_host="127.0.0.1")
+    server.start()
+    server.restart()
+    try:
+        host, port = server.server_address
+        conn = http.client.HTTPConnection(host, port, timeout=5)
+        assert _get(conn)[0].status == 200
+        conn.close()
+    finally:
+        server.stop()
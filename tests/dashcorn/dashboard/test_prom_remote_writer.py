@@ -0,0 +1,132 @@
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from dashcorn.dashboard.prom_remote_writer import PromRemoteWriter
+from dashcorn.utils import protobuf_wire as pb
+from dashcorn.utils import snappy_util
+
+
+class FakeCollector:
+    def collect(self):
+        c = CounterMetricFamily("demo_requests", "Total requests", labels=["path"])
+        c.add_metric(["/a"], 3)
+        c.add_metric(["/b"], 5)
+        yield c
+        g = GaugeMetricFamily("demo_memory_bytes", "Memory usage")
+        g.add_metric([], 1024.5)
+        yield g
+
+
+class Receiver:
+    """Stand-in remote-write receiver answering with queued status codes."""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.requests = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                receiver.requests.append((dict(self.headers), body))
+                self.send_response(receiver.statuses.pop(0) if receiver.statuses else 204)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = "http://%s:%d/api/v1/write" % self.server.server_address
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def decode_write_request(body):
+    series = []
+    for _, _, ts in pb.iter_fields(snappy_util.decompress(body)):
+        labels, samples = {}, []
+        for field, _, value in pb.iter_fields(ts):
+            if field == 1:
+                label = {f: bytes(v).decode() for f, _, v in pb.iter_fields(value)}
+                labels[label[1]] = label[2]
+            else:
+                sample = dict((f, v) for f, _, v in pb.iter_fields(value))
+                samples.append((pb.fixed64_to_double(sample[1]), sample[2]))
+        series.append((labels, samples))
+    return series
+
+
+def test_push_batches_snappy_protobuf():
+    receiver = Receiver()
+    try:
+        writer = PromRemoteWriter(FakeCollector(), receiver.url,
+            max_series_per_request=2, external_labels={"hub": "h1"})
+        assert writer.push_once() == 2
+
+        headers, _ = receiver.requests[0]
+        assert headers["Content-Encoding"] == "snappy"
+        assert headers["Content-Type"] == "application/x-protobuf"
+
+        series = [s for _, body in receiver.requests for s in decode_write_request(body)]
+        by_name = {(labels["__name__"], labels.get("path")): samples for labels, samples in series}
+        assert by_name[("demo_requests_total", "/a")][0][0] == 3.0
+        assert by_name[("demo_memory_bytes", None)][0][0] == 1024.5
+        assert all(labels["hub"] == "h1" for labels, _ in series)
+        assert all(list(labels) == sorted(labels) for labels, _ in series)
+        assert writer.stats()["sent_items"] == 3
+    finally:
+        receiver.close()
+
+
+def test_retries_then_keeps_payload_for_next_push():
+    receiver = Receiver(statuses=[503, 503, 503])
+    try:
+        writer = PromRemoteWriter(FakeCollector(), receiver.url, max_retries=1, retry_backoff=0.01)
+        assert writer.push_once() == 0
+        assert writer.stats()["pending_requests"] == 1
+
+        assert writer.push_once() == 2
+        assert writer.stats()["retries"] == 2
+        assert writer.stats()["pending_requests"] == 0
+    finally:
+        receiver.close()
+
+
+def test_rejected_payload_is_dropped_and_queue_is_bounded():
+    receiver = Receiver(statuses=[400])
+    try:
+        writer = PromRemoteWriter(FakeCollector(), receiver.url)
+        assert writer.push_once() == 0
+        assert writer.stats()["failed_requests"] == 1
+        assert writer.stats()["pending_requests"] == 0
+    finally:
+        receiver.close()
+
+    writer = PromRemoteWriter(FakeCollector(), receiver.url,
+        max_pending_requests=2, max_retries=0, timeout=0.5)
+    for _ in range(4):
+        writer.push_once()
+    assert writer.stats()["pending_requests"] == 2
+    assert writer.stats()["dropped_requests"] == 2
+
+
+def test_warns_once_when_starting_on_the_pure_python_codec(monkeypatch, caplog):
+    from dashcorn.dashboard import prom_remote_writer
+
+    monkeypatch.setattr(snappy_util, "_snappy", None)
+    monkeypatch.setattr(snappy_util, "_cramjam", None)
+    monkeypatch.setattr(prom_remote_writer, "_slow_codec_warned", False)
+    writers = [PromRemoteWriter(FakeCollector(), "http://127.0.0.1:9/write", interval=60)
+        for _ in range(2)]
+    with caplog.at_level("WARNING", logger=prom_remote_writer.__name__):
+        for writer in writers:
+            writer.start()
+            writer.stop()
+    assert sum("native snappy" in r.getMessage() for r in caplog.records) == 1
@@ -2,6 +2,7 @@ import time
 import pytest
 
 from dashcorn.dashboard.realtime_metrics import RealtimeState
+from dashcorn.utils.memory_util import approx_size
 
 
 @pytest.fixture
@@ -106,3 +107,91 @@ def test_dict_output(realtime):
     assert isinstance(state["http"], list)
     assert "dhost" in state["server"]
     assert "w1" in state["server"]["dhost"]["workers"]
+
+
+def test_http_events_page_cursor(realtime):
+    for i in range(4):
+        realtime.update("http", {"event_id": i})
+
+    page, next_since = realtime.get_http_events_page(since=0, limit=3)
+    assert [e["event_id"] for e in page] == [0, 1, 2]
+
+    page, next_since = realtime.get_http_events_page(since=next_since, limit=3)
+    assert [e["event_id"] for e in page] == [3]
+
+    # Nothing new: cursor does not move
+    page, again = realtime.get_http_events_page(since=next_since)
+    assert page == [] and again == next_since
+
+
+def test_server_snapshots_are_versioned_and_shared(realtime):
+    realtime.update("server", {"agent_id": "h1", "workers": {"w1": {"pid": 1}}})
+    realtime.update("server", {"agent_id": "h2", "workers": {"w2": {"pid": 2}}})
+    version = realtime.servers_version
+    first = realtime.get_all_servers()
+
+    # No change: same objects, no copy
+    assert realtime.get_all_servers() is first
+    assert realtime.servers_version == version
+
+    # A report repeating the last one does not republish either
+    realtime.update("server", {"agent_id": "h2", "workers": {"w2": {"pid": 2}}})
+    assert realtime.servers_version == version
+    assert realtime.get_all_servers() is first
+
+    realtime.update("server", {"agent_id": "h1", "workers": {"w1": {"pid": 1, "cpu": 5}}})
+    second = realtime.get_all_servers()
+    assert realtime.servers_version > version
+    assert second["h1"] is not first["h1"]
+    assert second["h2"] is first["h2"]
+    assert first["h1"]["workers"]["w1"] == {"pid": 1}
+
+
+def test_expired_workers_are_republished():
+    realtime = RealtimeState(worker_ttl=0.1)
+    realtime.update("server", {"agent_id": "h1", "workers": {"w1": {"pid": 1}}})
+    version = realtime.servers_version
+
+    time.sleep(0.3)
+    assert realtime.get_server_workers("h1")["workers"] == {}
+    assert realtime.servers_version > version
+
+
+def test_memory_usage_and_budget_enforcement():
+    realtime = RealtimeState(http_event_ttl=None, memory_budget=200_000, rollup_memory_share=0.5)
+    realtime.close()  # enforce by hand
+    realtime.update("server", {"agent_id": "h1", "workers": {"w1": {"pid": 1}}})
+    now = time.time()
+    for i in range(1000):
+        realtime.update("http", {"agent_id": "h1", "method": "GET", "path": f"/item/{i}",
+            "status": 200, "duration": 0.01, "time": now - i % 100})
+
+    usage = realtime.memory_usage()
+    assert set(usage["structures"]) == {"http_events", "rollups", "servers"}
+    assert usage["agents"]["h1"]["servers"] > 0
+    assert usage["structures"]["http_events"] <= 200_000
+
+    realtime.enforce_memory_budget()
+    usage = realtime.memory_usage()
+    assert usage["structures"]["rollups"] <= 100_000
+    assert usage["http_events_budget"] == (200_000
+        - usage["structures"]["rollups"] - usage["structures"]["servers"])
+
+
+def test_server_snapshot_sizes_are_kept_at_publish():
+    realtime = RealtimeState(memory_budget=1_000_000, master_ttl=1.0, worker_ttl=1.0,
+        agent_report_interval=0.5, agent_gone_after=2.0, agent_grace_period=0)
+    realtime.close()
+    realtime.update("server", {"agent_id": "h1", "workers": {"w1": {"pid": 1}}})
+    realtime.update("server", {"agent_id": "h2", "workers": {"w2": {"pid": 2}, "w3": {"pid": 3}}})
+    servers = realtime.get_all_servers()
+    sizes = realtime.memory_usage()["agents"]
+    assert sizes["h1"]["servers"] == approx_size(servers["h1"], max_depth=4)
+    assert sizes["h2"]["servers"] == approx_size(servers["h2"], max_depth=4)
+    assert realtime.memory_usage()["structures"]["servers"] == (
+        sizes["h1"]["servers"] + sizes["h2"]["servers"])
+
+    last_seen = realtime.agents.get("h1").last_seen
+    realtime.agents.touch("h1", now=last_seen + 10)
+    realtime.agents.sweep(now=last_seen + 5)
+    assert realtime.memory_usage()["structures"]["servers"] == sizes["h1"]["servers"]
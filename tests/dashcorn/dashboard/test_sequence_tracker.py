@@ -0,0 +1,78 @@
+import time
+
+from dashcorn.dashboard.hub_telemetry import HubTelemetry
+from dashcorn.dashboard.metrics_collector import MetricsCollector
+from dashcorn.dashboard.realtime_metrics import RealtimeState
+from dashcorn.dashboard.sequence_tracker import SequenceTracker
+from dashcorn.utils import json_util
+
+
+def _observe(tracker, seqs, agent_id="a", pid=1):
+    for seq in seqs:
+        tracker.observe(agent_id, pid, seq)
+
+
+def test_in_order_stream_has_no_anomalies():
+    tracker = SequenceTracker()
+    _observe(tracker, range(100, 200))
+    assert tracker.stats()["a"] == dict(received=100, lost=0, duplicated=0, reordered=0, resets=0)
+
+
+def test_late_arrival_is_reordered_not_lost():
+    tracker = SequenceTracker(window=8)
+    _observe(tracker, [0, 1, 3, 4, 2, 5, 5])
+    assert tracker.stats()["a"] == dict(received=7, lost=0, duplicated=1, reordered=1, resets=0)
+    assert tracker.pending() == {"a": 0}
+
+
+def test_gap_becomes_lost_once_out_of_window():
+    tracker = SequenceTracker(window=8)
+    _observe(tracker, [0, 1, 4])
+    assert tracker.stats()["a"]["lost"] == 0
+    assert tracker.pending() == {"a": 2}
+    _observe(tracker, range(5, 13))
+    assert tracker.stats()["a"]["lost"] == 2
+    assert tracker.pending() == {"a": 0}
+    # Past the window: still lost, but the late arrival is seen
+    _observe(tracker, range(13, 30))
+    _observe(tracker, [25, 15])
+    stats = tracker.stats()["a"]
+    assert stats["duplicated"] == 1 and stats["reordered"] == 1 and stats["resets"] == 0
+
+
+def test_large_gap_and_sender_restart():
+    tracker = SequenceTracker(window=8)
+    _observe(tracker, [0, 100])
+    assert tracker.stats()["a"]["lost"] == 99 - 7
+    _observe(tracker, [0, 1])
+    stats = tracker.stats()["a"]
+    assert stats["resets"] == 1 and stats["lost"] == 99
+    assert tracker.stream_stats("a", 1)["high"] == 1
+
+
+def test_streams_are_per_agent_and_pid():
+    tracker = SequenceTracker(max_streams=2)
+    _observe(tracker, [0, 1], pid=1)
+    _observe(tracker, [0, 1], pid=2)
+    _observe(tracker, [5], agent_id="b")
+    assert tracker.stream_stats("a", 1) is None
+    assert tracker.stats()["a"]["received"] == 4
+
+
+def test_collector_tracks_stamped_messages():
+    telemetry = HubTelemetry()
+    collector = MetricsCollector(state_store=RealtimeState(), telemetry=telemetry)
+    now = time.time()
+    for seq in (0, 1, 3, 2, 2):
+        collector._handle_frame(json_util.dumps(dict(type="http", agent_id="a", method="GET", path="/",
+            status=200, duration=0.01, pid=7, seq=seq, sent_at=now - 0.05)))
+    collector._handle_frame(json_util.dumps(dict(type="worker_status", agent_id="a", pid=7, seq=4,
+        sent_at=now - 0.05)))
+
+    assert telemetry.sequences.stream_stats("a", 7) == dict(received=6, lost=0, duplicated=1,
+        reordered=1, resets=0, high=4, pending=0)
+    samples = {(s.name, tuple(s.labels.items())): s.value
+        for metric in telemetry.collect() for s in metric.samples}
+    assert samples[("dashcorn_hub_sequence_reordered_total", (("agent_id", "a"),))] == 1
+    assert samples[("dashcorn_hub_pipeline_latency_seconds_count", ())] == 6
+    assert samples[("dashcorn_hub_pipeline_latency_seconds_bucket", (("le", "0.02"),))] == 0
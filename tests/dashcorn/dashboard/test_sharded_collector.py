@@ -0,0 +1,57 @@
+import socket
+import time
+
+from pathlib import Path
+
+import zmq
+
+from dashcorn.dashboard import sharded_collector
+from dashcorn.dashboard.prom_metrics_exporter import PromMetricsExporter
+from dashcorn.dashboard.realtime_metrics import RealtimeState
+from dashcorn.dashboard.sharded_collector import ShardedMetricsCollector
+from dashcorn.utils import json_util
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_shards_merge_aggregates_into_hub_state(monkeypatch):
+    # Spawned shards inherit sys.path, where tests/dashcorn would shadow the package
+    monkeypatch.syspath_prepend(str(Path(sharded_collector.__file__).parents[2]))
+    state = RealtimeState()
+    exporter = PromMetricsExporter(state_provider=lambda: state)
+    port = _free_port()
+    collector = ShardedMetricsCollector(address=f"127.0.0.1:{port}", state_store=state,
+        exporter=exporter, shards=2, merge_interval=0.1, max_events_per_merge=50)
+    collector.start()
+    context = zmq.Context()
+    push = context.socket(zmq.PUSH)
+    push.connect(f"tcp://127.0.0.1:{port}")
+    try:
+        now = time.time()
+        for i in range(400):
+            push.send(json_util.dumps(dict(type="http", agent_id="a", method="GET", path=f"/p{i % 4}",
+                status=200, duration=0.01, time=now, pid=i % 3)) if i % 8 else b"{")
+        push.send(json_util.dumps(dict(type="worker_status", agent_id="a", workers={"1": {"pid": 1}})))
+        deadline = time.time() + 30
+        while collector.stats()["received"] < 401 and time.time() < deadline:
+            time.sleep(0.05)
+
+        stats = collector.stats()
+        assert stats["received"] == 401 and stats["rejected"] == {"invalid_json": 50}
+        rollup = state.rollups.aggregate(now - 60, now + 60)[()]
+        assert rollup.count == 350
+        assert sum(exporter._accum_total.values()) == 350
+        assert sum(exporter._accum_by_worker.values()) == 350
+        # The events buffer keeps a bounded sample, with hub-assigned cursors
+        events = state.get_http_events()
+        assert 0 < len(events) <= 350
+        assert [e["cursor"] for e in events] == sorted(e["cursor"] for e in events)
+        assert state.get_server_workers("a")["workers"] == {"1": {"pid": 1}}
+    finally:
+        push.close(linger=0)
+        context.term()
+        collector.stop()
@@ -0,0 +1,83 @@
+import asyncio
+import socket
+
+import pytest
+import zmq
+import zmq.asyncio
+
+from dashcorn.dashboard.metrics_collector import MetricsCollector
+from dashcorn.dashboard.process_manager import ProcessManager
+from dashcorn.dashboard.realtime_metrics import RealtimeState
+from dashcorn.dashboard.settings_publisher import SettingsPublisher
+from dashcorn.dashboard.settings_selector import SettingsSelector
+from dashcorn.hub.async_runtime import AsyncHubRuntime
+from dashcorn.utils import json_util
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _Elector:
+    def __init__(self):
+        self.rounds = 0
+
+    def elect_leaders(self):
+        self.rounds += 1
+        return [{"leader": self.rounds}]
+
+
+async def _until(predicate, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_services_run_as_coroutines_and_stop_cleanly(tmp_path):
+    metrics_port, control_port = _free_port(), _free_port()
+    state = RealtimeState()
+    collector = MetricsCollector(address=f"127.0.0.1:{metrics_port}", state_store=state)
+    publisher = SettingsPublisher(address=f"127.0.0.1:{control_port}", delay_before_send=0)
+    selector = SettingsSelector(interval=0.05, settings_publisher=publisher, state_store=_Elector())
+    manager = ProcessManager(address=str(tmp_path / "pm.sock"))
+    runtime = AsyncHubRuntime([collector, selector, manager])
+
+    context = zmq.asyncio.Context()
+    sub = context.socket(zmq.SUB)
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+    sub.connect(f"tcp://127.0.0.1:{control_port}")
+    push = context.socket(zmq.PUSH)
+    push.connect(f"tcp://127.0.0.1:{metrics_port}")
+    req = context.socket(zmq.REQ)
+    req.connect(manager.endpoint)
+    publisher.open()
+    await runtime.start()
+    try:
+        for i in range(600):
+            await push.send(json_util.dumps(dict(type="http", agent_id="a", method="GET",
+                path="/", status=200, duration=0.01)) if i % 100 else b"{")
+        await _until(lambda: collector.stats()["received"] == 600)
+        assert collector.stats()["rejected"] == {"invalid_json": 6}
+        assert len(state.get_http_events()) == 594
+
+        assert "leader" in await asyncio.wait_for(sub.recv_json(), 5)
+
+        await req.send_json({"cmd": "unknown"})
+        reply = await asyncio.wait_for(req.recv_json(), 5)
+        assert reply == {"status": "error", "message": "Unknown command: unknown"}
+    finally:
+        await runtime.stop()
+        publisher.close()
+        for sock in (sub, push, req):
+            sock.close(linger=0)
+        context.term()
+
+    assert not runtime.running
+    # Sockets are closed by the time stop() returns, so the address can be bound again
+    await runtime.start()
+    assert runtime.running
+    await runtime.stop()
@@ -42,3 +42,12 @@ def test_expiry_if_idle():
 
     time.sleep(1.2)  # idle > ttl
     assert len(d) == 0
+
+def test_snapshot_is_a_plain_copy():
+    d = ExpireIfIdleDict(ttl=0.1)
+    d["a"] = 1
+    snapshot = d.snapshot()
+    d["b"] = 2
+    assert snapshot == {"a": 1} and type(snapshot) is dict
+    time.sleep(0.15)
+    assert d.snapshot() == {}
@@ -23,3 +23,49 @@ def test_repr():
     q = ExpiringDeque(ttl=3)
     q.append("x")
     assert "ttl=3" in repr(q)
+
+def test_maxlen_and_appendleft_across_chunks():
+    q = ExpiringDeque(maxlen=600)
+    for i in range(1000):
+        q.append(i)
+    assert len(q) == 600
+    assert q.get_items() == list(range(400, 1000))
+
+    q.appendleft(-1)
+    assert q.get_items()[:2] == [-1, 400]
+    assert q.get_items()[-1] == 998
+    assert len(q) == 600
+
+def test_snapshot_view_is_stable():
+    q = ExpiringDeque(maxlen=300)
+    for i in range(300):
+        q.append(i)
+    view = q.snapshot()
+    for i in range(300, 700):
+        q.append(i)
+    q.appendleft("x")
+
+    assert len(view) == 300
+    assert list(view) == list(range(300))
+    assert view[0] == 0 and view[-1] == 299 and view[256] == 256
+    assert view[10:13] == [10, 11, 12]
+
+def test_appendleft_does_not_change_older_views():
+    q = ExpiringDeque()
+    for i in range(3):
+        q.append(i)
+    view = q.snapshot()
+    q.discard_oldest(1)
+    q.appendleft("X")
+
+    assert list(view) == [0, 1, 2]
+    assert q.get_items() == ["X", 1, 2]
+
+def test_whole_chunks_expire():
+    q = ExpiringDeque(ttl=0.2)
+    for i in range(1000):
+        q.append(i)
+    time.sleep(0.15)
+    q.append("late")
+    time.sleep(0.1)
+    assert q.get_items() == ["late"]
@@ -110,3 +110,48 @@ def test_maxlen_eviction():
 
     assert "a" not in cache
     assert expired == ["a"]
+
+def test_cleanup_stops_at_first_live_entry():
+    expired = []
+    cache = RefreshOnSetCache(ttl=0.2, on_expire=lambda k, v: expired.append(k))
+    cache["a"] = 1
+    cache["b"] = 2
+    time.sleep(0.25)
+    cache["c"] = 3
+    cache["a"] = 4  # re-set moves "a" behind "c"
+
+    assert list(cache) == ["c", "a"]
+    assert expired == ["b"]
+    assert cache.get_set_time("b") is None
+    assert cache.get_set_time("a") >= cache.get_set_time("c")
+
+def test_snapshot_is_a_plain_copy_of_live_entries():
+    cache = RefreshOnSetCache(ttl=0.1)
+    cache["old"] = 1
+    time.sleep(0.15)
+    cache["new"] = 2
+    snapshot = cache.snapshot()
+    assert snapshot == {"new": 2} and type(snapshot) is dict
+    cache["new"] = 3
+    assert snapshot == {"new": 2}
+
+def test_snapshot_while_expiring_from_another_thread():
+    import threading
+
+    cache = RefreshOnSetCache(ttl=0.001, cleanup_interval=0.001)
+    stop = threading.Event()
+
+    def expire():
+        while not stop.is_set():
+            cache._scheduled_cleanup()
+
+    thread = threading.Thread(target=expire)
+    thread.start()
+    try:
+        for i in range(2000):
+            cache[i % 50] = i
+            cache.snapshot()
+    finally:
+        stop.set()
+        thread.join()
+        cache.stop_auto_cleanup()
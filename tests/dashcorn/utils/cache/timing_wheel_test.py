@@ -0,0 +1,63 @@
+import time
+
+from dashcorn.utils.cache import ExpireIfIdleDict, ExpiringDeque
+from dashcorn.utils.cache.timing_wheel import TimingWheel
+
+def test_timers_fire_in_order_across_levels():
+    # A tiny wheel forces long timers through several cascades
+    wheel = TimingWheel(tick=0.01, wheel_size=4, levels=3)
+    fired = []
+    start = time.monotonic()
+    for delay in (0.4, 0.05, 0.2, 0.03):
+        wheel.schedule(delay, lambda delay=delay: fired.append((delay, time.monotonic() - start)))
+    cancelled = wheel.schedule(0.1, lambda: fired.append("cancelled"))
+    cancelled.cancel()
+
+    time.sleep(0.6)
+    assert [delay for delay, _ in fired] == [0.03, 0.05, 0.2, 0.4]
+    for delay, at in fired:
+        assert delay <= at < delay + 0.1
+    assert len(wheel) == 0
+
+def test_repeating_timer_until_cancelled():
+    wheel = TimingWheel(tick=0.01)
+    ticks = []
+    handle = wheel.schedule_repeating(0.05, lambda: ticks.append(1))
+    time.sleep(0.28)
+    handle.cancel()
+    count = len(ticks)
+    assert 3 <= count <= 6
+    time.sleep(0.15)
+    assert len(ticks) == count
+
+def test_idle_ticks_are_skipped():
+    wheel = TimingWheel(tick=0.01)
+    advanced = []
+    advance = wheel._advance
+    wheel._advance = lambda: advanced.append(1) or advance()
+    fired = []
+    wheel.schedule(0.3, lambda: fired.append(1))
+    time.sleep(0.4)
+    assert fired == [1]
+    # Woken for the one occupied slot, not every 10ms
+    assert len(advanced) == 1
+
+def test_expiring_deque_on_expire_without_access():
+    expired = []
+    q = ExpiringDeque(ttl=0.1, on_expire=expired.extend)
+    q.append("a")
+    q.append("b")
+    time.sleep(0.3)
+    assert expired == ["a", "b"]
+
+def test_expire_if_idle_dict_on_expire():
+    expired = []
+    d = ExpireIfIdleDict(ttl=0.15, on_expire=expired.append)
+    d["a"] = 1
+    time.sleep(0.1)
+    d["b"] = 2  # keeps the dict alive past the first deadline
+    time.sleep(0.1)
+    assert expired == []
+    time.sleep(0.2)
+    assert expired == [{"a": 1, "b": 2}]
+    assert len(d) == 0
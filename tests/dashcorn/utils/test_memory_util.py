@@ -0,0 +1,23 @@
+import sys
+
+import pytest
+
+from dashcorn.utils.memory_util import approx_size, parse_bytes
+
+
+def test_approx_size_counts_nested_values():
+    flat = dict(path="/a")
+    nested = dict(path="/a", extra=dict(user="x" * 1000))
+    assert approx_size(flat) == sys.getsizeof(flat) + sys.getsizeof("path") + sys.getsizeof("/a")
+    assert approx_size(nested) > approx_size(flat) + 1000
+    assert approx_size(nested, max_depth=1) < approx_size(flat) + 1000
+
+
+def test_parse_bytes():
+    assert parse_bytes("") is None
+    assert parse_bytes("65536") == 65536
+    assert parse_bytes("512K") == 512 * 1024
+    assert parse_bytes("64MB") == 64 << 20
+    assert parse_bytes("1.5 GiB") == 3 << 29
+    with pytest.raises(ValueError):
+        parse_bytes("lots")
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+from dashcorn.utils import snappy_util
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"x",
+    b"abcd" * 1000,
+    os.urandom(3000),
+    b"".join(b'uvicorn_requests_total{agent_id="agent-%d"} 1.0\n' % i for i in range(5000)),
+])
+def test_pure_python_round_trip(data):
+    compressed = snappy_util._compress(data)
+    assert snappy_util._decompress(compressed) == data
+
+
+def test_repetitive_payload_shrinks():
+    data = b'{__name__="uvicorn_requests_total",path="/items"}' * 2000
+    assert len(snappy_util._compress(data)) < len(data) // 10
+
+
+def test_decompress_known_vector():
+    # "aaaaaaaaaa": literal "a" followed by a copy of 9 bytes at offset 1
+    assert snappy_util._decompress(bytes([10, 0x00, ord("a"), 0x01 | (5 << 2), 0x01])) == b"a" * 10